@@ -1,18 +1,6 @@
 import argparse
 
-from lib.hybrid_search import (
-    HybridSearch
-)
-from lib.search_utils import (
-    load_movies,
-    RRF_K
-)
-from lib.augmented_generation import (
-    llm_augmented_gen,
-    llm_summary_gen,
-    llm_citation_gen,
-    llm_quesstion_answering_gen
-)
+from lib.search_client import run_operation
 
 def main():
     parser = argparse.ArgumentParser(description="Retrieval Augmented Generation CLI")
@@ -40,47 +28,26 @@ def main():
 
     match args.command:
         case "rag":
-            query = args.query
-            doc_list = run_hybrid_search(query, RRF_K, 5)
-            for doc in doc_list:
-                print(f"- {doc.get("title")}")
-            print()
-            print("RAG Response:")
-            print(llm_augmented_gen(query, doc_list))
+            result = run_operation("rag", mode="rag", query=args.query, limit=5)
+            print_rag_result(result, "RAG Response:")
         case "summarize":
-            query = args.query
-            limit = args.limit
-            doc_list = run_hybrid_search(query, RRF_K, limit)
-            for doc in doc_list:
-                print(f"- {doc.get("title")}")
-            print()
-            print("LLM Summary:")
-            print(llm_summary_gen(query, doc_list))
+            result = run_operation("rag", mode="summarize", query=args.query, limit=args.limit)
+            print_rag_result(result, "LLM Summary:")
         case "citations":
-            query = args.query
-            limit = args.limit
-            doc_list = run_hybrid_search(query, RRF_K, limit)
-            for doc in doc_list:
-                print(f"- {doc.get("title")}")
-            print()
-            print("LLM Answer:")
-            print(llm_citation_gen(query, doc_list))
+            result = run_operation("rag", mode="citations", query=args.query, limit=args.limit)
+            print_rag_result(result, "LLM Answer:")
         case "question":
-            question = args.question
-            limit = args.limit
-            doc_list = run_hybrid_search(question, RRF_K, limit)
-            for doc in doc_list:
-                print(f"- {doc.get("title")}")
-            print()
-            print("Answer:")
-            print(llm_quesstion_answering_gen(question, doc_list))
+            result = run_operation("rag", mode="question", query=args.question, limit=args.limit)
+            print_rag_result(result, "Answer:")
         case _:
             parser.print_help()
 
-def run_hybrid_search(query: str, k: int=RRF_K, limit: int=5) -> list[dict]:
-    movies = load_movies()
-    searcher = HybridSearch(movies)
-    return searcher.rrf_search(query, k ,limit=limit)
+def print_rag_result(result: dict, heading: str) -> None:
+    for doc in result["results"]:
+        print(f"- {doc.get("title")}")
+    print()
+    print(heading)
+    print(result["answer"])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from lib.semantic_search import SemanticSearch, normalize_embeddings, top_k_indices
+
+EMBEDDING_ROWS = 2000
+EMBEDDING_DIMENSIONS = 384
+
+
+@pytest.fixture(scope="session")
+def clustered_embeddings() -> tuple[np.ndarray, np.ndarray]:
+    """Unit-length rows scattered around 64 centers, and 50 queries that
+    each fall between two rows, so that their top results are close calls
+    """
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((64, EMBEDDING_DIMENSIONS))
+    embeddings = normalize_embeddings(
+        centers[rng.integers(len(centers), size=EMBEDDING_ROWS)]
+        + 0.9 * rng.standard_normal((EMBEDDING_ROWS, EMBEDDING_DIMENSIONS))
+    )
+    queries = normalize_embeddings(
+        embeddings[rng.choice(EMBEDDING_ROWS, size=50)]
+        + embeddings[rng.choice(EMBEDDING_ROWS, size=50)]
+    )
+    return embeddings, queries
+
+
+@pytest.fixture
+def load_searcher(tmp_path):
+    """Saves embeddings under tmp_path and returns a SemanticSearch over
+    them with the given storage and index options
+    """
+
+    def load(embeddings: np.ndarray, **options) -> SemanticSearch:
+        path = str(tmp_path / "embeddings.npy")
+        np.save(path, embeddings)
+        searcher = SemanticSearch(**options)
+        searcher.embeddings = searcher._load_storage(path, embeddings)
+        return searcher
+
+    return load
+
+
+@pytest.fixture
+def recall_at_k():
+    """Returns the share of the exact top k rows of every query that a
+    searcher finds
+    """
+
+    def recall(
+        searcher: SemanticSearch,
+        embeddings: np.ndarray,
+        queries: np.ndarray,
+        k: int = 10,
+    ) -> float:
+        found = 0
+        for query in queries:
+            exact = top_k_indices(embeddings @ query, k)
+            rows, _ = searcher.top_documents(query, k)
+            found += len(np.intersect1d(exact, rows))
+        return found / (k * len(queries))
+
+    return recall
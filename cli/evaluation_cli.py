@@ -1,6 +1,6 @@
 import argparse
 
-from lib.evaluation import evaluate_command
+from lib.search_client import run_operation
 
 
 def main() -> None:
@@ -13,7 +13,7 @@ def main() -> None:
     )
 
     args = parser.parse_args()
-    result = evaluate_command(args.limit)
+    result = run_operation("evaluate", limit=args.limit)
 
     print(f"k={args.limit}\n")
     for query, res in result["results"].items():
@@ -1,10 +1,6 @@
 import argparse
 
-from lib.hybrid_search import (
-    normalize_scores,
-    rrf_search_command,
-    weighted_search_command,
-)
+from lib.search_client import run_operation
 
 
 def main() -> None:
@@ -45,7 +41,7 @@ def main() -> None:
     rrf_parser.add_argument(
         "--enhance",
         type=str,
-        choices=["spell", "expand", "rewrite"],
+        choices=["spell", "fuzzy", "expand", "rewrite"],
         help="Query enhancement method",
     )
     rrf_parser.add_argument(
@@ -65,11 +61,16 @@ def main() -> None:
 
     match args.command:
         case "normalize":
+            # lib.hybrid_search loads the models, which normalizing never needs
+            from lib.hybrid_search import normalize_scores
+
             normalized = normalize_scores(args.scores)
             for score in normalized:
                 print(f"* {score:.4f}")
         case "weighted-search":
-            result = weighted_search_command(args.query, args.alpha, args.limit)
+            result = run_operation(
+                "weighted_search", query=args.query, alpha=args.alpha, limit=args.limit
+            )
 
             print(
                 f"Weighted Hybrid Search Results for '{result['query']}' (alpha={result['alpha']}):"
@@ -89,8 +90,14 @@ def main() -> None:
                 print()
         case "rrf-search":
 
-            result = rrf_search_command(
-                args.query, args.k, args.enhance, args.rerank_method, args.evaluate, args.limit
+            result = run_operation(
+                "rrf_search",
+                query=args.query,
+                k=args.k,
+                enhance=args.enhance,
+                rerank_method=args.rerank_method,
+                evaluate=args.evaluate,
+                limit=args.limit,
             )
 
             if result["enhanced_query"]:
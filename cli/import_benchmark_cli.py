@@ -0,0 +1,36 @@
+import argparse
+
+from lib.import_benchmark import BENCHMARKED_MODULES, import_benchmark_command
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import Time Benchmark CLI")
+    parser.add_argument(
+        "modules",
+        nargs="*",
+        help=f"Modules to import (default: {', '.join(BENCHMARKED_MODULES)})",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Fresh interpreters to import each module in (default=5)",
+    )
+
+    args = parser.parse_args()
+    results = import_benchmark_command(args.modules, args.runs)
+
+    print(f"Import times over {args.runs} runs:")
+    for result in results:
+        print(
+            f"  {result['module']:<26} median {result['median_ms']:8.1f} ms, "
+            f"min {result['min_ms']:8.1f} ms"
+        )
+        if result["heavy_modules"]:
+            print(f"    heavy imports: {', '.join(result['heavy_modules'])}")
+        if result["resources"]:
+            print(f"    resources loaded: {', '.join(result['resources'])}")
+
+
+if __name__ == "__main__":
+    main()
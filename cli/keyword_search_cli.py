@@ -3,26 +3,73 @@
 import argparse
 
 from lib.keyword_search import (
+    autocomplete_command,
     bm25_idf_command,
     bm25_tf_command,
+    bm25f_search_command,
     bm25search_command,
     build_command,
+    delete_command,
     idf_command,
+    merge_command,
+    phrase_command,
+    prefix_search_command,
     search_command,
     tf_command,
     tfidf_command,
+    update_command,
+)
+from lib.search_utils import (
+    BM25_B,
+    BM25_K1,
+    BM25F_DESCRIPTION_WEIGHT,
+    BM25F_TITLE_WEIGHT,
 )
-from lib.search_utils import BM25_B, BM25_K1
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Keyword Search CLI")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
-    subparsers.add_parser("build", help="Build the inverted index")
+    build_parser = subparsers.add_parser("build", help="Build the inverted index")
+    build_parser.add_argument(
+        "--k1", type=float, default=BM25_K1, help="BM25 K1 used for precomputed impacts"
+    )
+    build_parser.add_argument(
+        "--b", type=float, default=BM25_B, help="BM25 b used for precomputed impacts"
+    )
+    build_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to tokenize and invert the movies",
+    )
+    build_parser.add_argument(
+        "--positions",
+        action="store_true",
+        help="Also index word positions, needed for phrase queries",
+    )
+
+    subparsers.add_parser(
+        "update", help="Index new, changed and removed movies as a new segment"
+    )
+
+    delete_parser = subparsers.add_parser(
+        "delete", help="Remove movies from the inverted index"
+    )
+    delete_parser.add_argument("doc_ids", type=int, nargs="+", help="Document IDs")
 
-    search_parser = subparsers.add_parser("search", help="Search movies using BM25")
-    search_parser.add_argument("query", type=str, help="Search query")
+    subparsers.add_parser("merge", help="Compact the index segments into one")
+
+    search_parser = subparsers.add_parser(
+        "search", help="Find movies matching a boolean keyword query"
+    )
+    search_parser.add_argument(
+        "query",
+        type=str,
+        help="Search query, terms combined with AND, OR, NOT and parentheses; "
+        "* and ? are wildcards",
+    )
 
     tf_parser = subparsers.add_parser(
         "tf", help="Get term frequency for a given document ID and term"
@@ -65,16 +112,67 @@ def main() -> None:
     )
     bm25search_parser.add_argument("query", type=str, help="Search query")
 
+    bm25f_parser = subparsers.add_parser(
+        "bm25fsearch", help="Search movies with BM25F over title and description"
+    )
+    bm25f_parser.add_argument("query", type=str, help="Search query")
+    bm25f_parser.add_argument(
+        "--title-weight",
+        type=float,
+        default=BM25F_TITLE_WEIGHT,
+        help="Weight of term matches in the title",
+    )
+    bm25f_parser.add_argument(
+        "--description-weight",
+        type=float,
+        default=BM25F_DESCRIPTION_WEIGHT,
+        help="Weight of term matches in the description",
+    )
+
+    phrase_parser = subparsers.add_parser(
+        "phrase", help="Search movies containing an exact phrase"
+    )
+    phrase_parser.add_argument("query", type=str, help="Phrase to search for")
+    phrase_parser.add_argument(
+        "--within",
+        type=int,
+        default=0,
+        help="Instead match terms in any order, this many words from the first",
+    )
+
+    prefix_parser = subparsers.add_parser(
+        "prefix", help="BM25 search where * and ? words match every completion"
+    )
+    prefix_parser.add_argument("query", type=str, help="Search query, e.g. 'termin*'")
+
+    autocomplete_parser = subparsers.add_parser(
+        "autocomplete", help="Suggest movie titles for partially typed text"
+    )
+    autocomplete_parser.add_argument("text", type=str, help="Text typed so far")
+
     args = parser.parse_args()
 
     match args.command:
         case "build":
             print("Building inverted index...")
-            build_command()
+            build_command(args.k1, args.b, args.workers, args.positions)
             print("Inverted index built successfully.")
+        case "update":
+            upserted, deleted = update_command()
+            print(f"Indexed {upserted} new or changed movies, removed {deleted}.")
+        case "delete":
+            deleted = delete_command(args.doc_ids)
+            print(f"Removed {deleted} movies from the inverted index.")
+        case "merge":
+            print("Merging index segments...")
+            merge_command()
+            print("Index segments merged successfully.")
         case "search":
             print("Searching for:", args.query)
-            results = search_command(args.query)
+            try:
+                results = search_command(args.query)
+            except ValueError as e:
+                parser.error(str(e))
             for i, res in enumerate(results, 1):
                 print(f"{i}. ({res['id']}) {res['title']}")
         case "tf":
@@ -101,6 +199,31 @@ def main() -> None:
             results = bm25search_command(args.query)
             for i, res in enumerate(results, 1):
                 print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "bm25fsearch":
+            print("Searching for:", args.query)
+            results = bm25f_search_command(
+                args.query,
+                title_weight=args.title_weight,
+                description_weight=args.description_weight,
+            )
+            for i, res in enumerate(results, 1):
+                print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "phrase":
+            print("Searching for:", args.query)
+            try:
+                results = phrase_command(args.query, args.within)
+            except ValueError as e:
+                parser.error(str(e))
+            for i, res in enumerate(results, 1):
+                print(f"{i}. ({res['id']}) {res['title']} - Matches: {res['score']}")
+        case "prefix":
+            print("Searching for:", args.query)
+            results = prefix_search_command(args.query)
+            for i, res in enumerate(results, 1):
+                print(f"{i}. ({res['id']}) {res['title']} - Score: {res['score']:.2f}")
+        case "autocomplete":
+            for i, res in enumerate(autocomplete_command(args.text), 1):
+                print(f"{i}. ({res['id']}) {res['title']}")
         case _:
             parser.exit(2, parser.format_help())
 
@@ -1,13 +1,13 @@
 import json
-import os
-from dotenv import load_dotenv
-from google import genai
 
-api_key = os.getenv("GEMINI_API_KEY")
+from .document_store import load_document_store
+from .hybrid_search import HybridSearch
+from .resources import gemini_client
+from .search_utils import RRF_K
+
 model = "gemini-2.0-flash"
-client = genai.Client(api_key=api_key)
 def llm_generate(proompt: str) -> str:
-    resp = client.models.generate_content(model=model, contents=proompt)
+    resp = gemini_client().models.generate_content(model=model, contents=proompt)
     return (resp.text or "").strip()
 
 def llm_augmented_gen(query: str, docs: list[dict]) -> str:
@@ -103,3 +103,24 @@ Guidance on types of questions:
 Answer:"""
     return llm_generate(prompt)
 
+
+def rag_command(
+    mode: str, query: str, limit: int = 5, searcher: HybridSearch | None = None
+) -> dict:
+    if searcher is None:
+        searcher = HybridSearch(load_document_store())
+    docs = searcher.rrf_search(query, RRF_K, limit=limit)
+
+    match mode:
+        case "rag":
+            answer = llm_augmented_gen(query, docs)
+        case "summarize":
+            answer = llm_summary_gen(query, docs)
+        case "citations":
+            answer = llm_citation_gen(query, docs)
+        case "question":
+            answer = llm_quesstion_answering_gen(query, docs)
+        case _:
+            raise ValueError(f"unknown RAG mode: {mode}")
+
+    return {"query": query, "mode": mode, "results": docs, "answer": answer}
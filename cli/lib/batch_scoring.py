@@ -0,0 +1,117 @@
+import numpy as np
+
+from .postings import range_indices
+from .search_utils import BATCH_SCORES_MAX_CELLS
+
+
+class SparseMatrix:
+    """Minimal CSR matrix: row i holds indices/data[indptr[i]:indptr[i + 1]]"""
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        shape: tuple[int, int],
+    ) -> None:
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    @classmethod
+    def from_rows(
+        cls, rows: list[tuple[np.ndarray, np.ndarray]], column_count: int
+    ) -> "SparseMatrix":
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(indices) for indices, _ in rows], out=indptr[1:])
+        if rows:
+            indices = np.concatenate([indices for indices, _ in rows])
+            data = np.concatenate([data for _, data in rows])
+        else:
+            indices = np.array([], dtype=np.int64)
+            data = np.array([], dtype=np.float64)
+        return cls(
+            indptr,
+            indices.astype(np.int64),
+            data.astype(np.float64),
+            (len(rows), column_count),
+        )
+
+    def row_slice(self, start: int, end: int) -> "SparseMatrix":
+        first, last = self.indptr[start], self.indptr[end]
+        return SparseMatrix(
+            self.indptr[start : end + 1] - first,
+            self.indices[first:last],
+            self.data[first:last],
+            (end - start, self.shape[1]),
+        )
+
+
+def matmul_top_k(
+    queries: SparseMatrix,
+    weights: SparseMatrix,
+    tie_breakers: np.ndarray,
+    limit: int,
+) -> list[list[tuple[int, float]]]:
+    """Top columns of queries @ weights for every query row
+
+    Products are computed densely for as many query rows at a time as fit
+    in BATCH_SCORES_MAX_CELLS, with SciPy when it is installed. Only
+    positive scores are returned; ties go to the lower tie breaker.
+    """
+    column_count = weights.shape[1]
+    rows_per_chunk = max(1, BATCH_SCORES_MAX_CELLS // max(column_count, 1))
+    results = []
+    for start in range(0, queries.shape[0], rows_per_chunk):
+        end = min(start + rows_per_chunk, queries.shape[0])
+        scores = _dense_product(queries.row_slice(start, end), weights)
+        results.extend(_batched_top_k(scores, tie_breakers, limit))
+    return results
+
+
+def _dense_product(queries: SparseMatrix, weights: SparseMatrix) -> np.ndarray:
+    row_count, column_count = queries.shape[0], weights.shape[1]
+    # imported here rather than at module level, since loading scipy costs
+    # more than most keyword searches that never get this far
+    try:
+        from scipy import sparse
+    except ImportError:
+        sparse = None
+    if sparse is not None:
+        query_matrix = sparse.csr_matrix(
+            (queries.data, queries.indices, queries.indptr), shape=queries.shape
+        )
+        weight_matrix = sparse.csr_matrix(
+            (weights.data, weights.indices, weights.indptr), shape=weights.shape
+        )
+        return (query_matrix @ weight_matrix).toarray()
+
+    # expand every (query, term) entry into the term's row of weights
+    query_rows = np.repeat(np.arange(row_count), np.diff(queries.indptr))
+    row_lengths = np.diff(weights.indptr)[queries.indices]
+    positions = range_indices(weights.indptr[queries.indices], row_lengths)
+    cells = np.repeat(query_rows, row_lengths) * column_count
+    cells += weights.indices[positions]
+    values = np.repeat(queries.data, row_lengths) * weights.data[positions]
+    scores = np.bincount(cells, weights=values, minlength=row_count * column_count)
+    return scores.reshape(row_count, column_count)
+
+
+def _batched_top_k(
+    scores: np.ndarray, tie_breakers: np.ndarray, limit: int
+) -> list[list[tuple[int, float]]]:
+    k = min(limit, scores.shape[1])
+    if k == 0:
+        return [[] for _ in range(scores.shape[0])]
+    top_columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    kth_scores = np.take_along_axis(scores, top_columns, axis=1).min(axis=1)
+
+    results = []
+    for row_scores, kth_score in zip(scores, kth_scores):
+        # everything tied with the k-th score competes on the tie breaker
+        columns = np.flatnonzero(row_scores >= max(kth_score, np.finfo(float).tiny))
+        column_scores = row_scores[columns]
+        order = np.lexsort((tie_breakers[columns], -column_scores))[:limit]
+        results.append([(int(columns[i]), float(column_scores[i])) for i in order])
+    return results
@@ -0,0 +1,102 @@
+import re
+from collections.abc import Callable
+
+from .term_dictionary import is_wildcard
+
+QUERY_WORD_PATTERN = re.compile(r"\(|\)|[^\s()]+")
+
+# Parsed queries are nested tuples:
+#   ("term", token), ("wildcard", pattern), ("and", [nodes]), ("or", [nodes]),
+#   ("not", node)
+# Words that tokenize to nothing (stopwords) drop out of the query.
+QueryNode = tuple
+
+
+class BooleanQueryParser:
+    """Parser for AND / OR / NOT queries with parentheses
+
+    Operators must be upper case. NOT binds tightest, then AND, then OR;
+    words next to each other without an operator are OR-ed, except that a
+    NOT right after a word is AND-ed, so "a NOT b" means "a AND NOT b".
+    Words with a * or ? are wildcard patterns, normalized by
+    normalize_pattern.
+    """
+
+    def __init__(
+        self,
+        tokenize: Callable[[str], list[str]],
+        normalize_pattern: Callable[[str], str] = str.lower,
+    ) -> None:
+        self.tokenize = tokenize
+        self.normalize_pattern = normalize_pattern
+        self.words: list[str] = []
+        self.position = 0
+
+    def parse(self, query: str) -> QueryNode | None:
+        self.words = QUERY_WORD_PATTERN.findall(query)
+        self.position = 0
+        if not self.words:
+            return None
+        node = self.__or()
+        if self.position < len(self.words):
+            raise ValueError(f"unexpected '{self.words[self.position]}' in query")
+        return node
+
+    def __peek(self) -> str | None:
+        if self.position < len(self.words):
+            return self.words[self.position]
+        return None
+
+    def __or(self) -> QueryNode | None:
+        children = [self.__and()]
+        while (word := self.__peek()) is not None and word != ")":
+            if word == "OR":
+                self.position += 1
+            children.append(self.__and())
+        return combine("or", children)
+
+    def __and(self) -> QueryNode | None:
+        children = [self.__not()]
+        while (word := self.__peek()) in ("AND", "NOT"):
+            if word == "AND":
+                self.position += 1
+            children.append(self.__not())
+        return combine("and", children)
+
+    def __not(self) -> QueryNode | None:
+        if self.__peek() == "NOT":
+            self.position += 1
+            child = self.__not()
+            return None if child is None else ("not", child)
+        return self.__primary()
+
+    def __primary(self) -> QueryNode | None:
+        word = self.__peek()
+        if word is None or word in (")", "AND", "OR"):
+            raise ValueError("expected a term or '(' in query")
+        self.position += 1
+        if word == "(":
+            node = self.__or()
+            if self.__peek() != ")":
+                raise ValueError("missing ')' in query")
+            self.position += 1
+            return node
+        if is_wildcard(word):
+            return ("wildcard", self.normalize_pattern(word))
+        return combine("and", [("term", token) for token in self.tokenize(word)])
+
+
+def combine(kind: str, children: list[QueryNode | None]) -> QueryNode | None:
+    flat: list[QueryNode] = []
+    for child in children:
+        if child is None:
+            continue
+        if child[0] == kind:
+            flat.extend(child[1])
+        else:
+            flat.append(child)
+    if not flat:
+        return None
+    if len(flat) == 1:
+        return flat[0]
+    return (kind, flat)
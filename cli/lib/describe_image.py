@@ -1,23 +1,20 @@
-import os
-from google import genai
-from dotenv import load_dotenv
+from .resources import gemini_client
 
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
 model = "gemini-2.0-flash"
-client = genai.Client(api_key=api_key)
 
 def llm_generate_parts(proompt: str, img_bytes: bytes, mime: str, query: str=None) -> dict:
+    from google.genai import types
+
     sys_prompt = proompt
     content_parts = [
         sys_prompt,
-        genai.types.Part.from_bytes(data=img_bytes, mime_type=mime)
+        types.Part.from_bytes(data=img_bytes, mime_type=mime)
     ]
     if query is not None:
         content_parts.append(query.strip())
 
 
-    resp = client.models.generate_content(
+    resp = gemini_client().models.generate_content(
         model=model, 
         contents=content_parts
     )
@@ -0,0 +1,193 @@
+import fcntl
+import json
+import mmap
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import numpy as np
+
+from .search_utils import DOCUMENT_STORE_DIR, load_movies, source_fingerprint
+
+
+class DocumentStore:
+    """Append-only store of JSON documents addressed by dense ids
+
+    records.bin holds the encoded documents back to back and
+    record_offsets.npy where each one starts, so a document is only decoded
+    when it is asked for. A changed document is appended as a new record and
+    its old one stays, so the dense ids held by the index and the embeddings
+    never point at the wrong text. current_ids lists the dense ids of the
+    documents in movies.json, in order.
+    """
+
+    def __init__(self, store_dir: str = DOCUMENT_STORE_DIR) -> None:
+        self.store_dir = store_dir
+        self.meta_path = os.path.join(store_dir, "meta.json")
+        self.records_path = os.path.join(store_dir, "records.bin")
+        self.offsets_path = os.path.join(store_dir, "record_offsets.npy")
+        self.doc_ids_path = os.path.join(store_dir, "doc_ids.npy")
+        self.lock_path = os.path.join(store_dir, ".lock")
+        self.generation = 0
+        self.source: dict | None = None
+        self.records: mmap.mmap | bytes = b""
+        self.record_offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.array([], dtype=np.int32)
+        self.current_ids = np.array([], dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.current_ids)
+
+    def load(self) -> None:
+        try:
+            self.__load()
+        except FileNotFoundError:
+            # a writer replaced the current ids while we were reading them
+            self.__load()
+
+    def __load(self) -> None:
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        record_count = meta["record_count"]
+        current_ids = np.load(os.path.join(self.store_dir, meta["current_ids"]))
+        # records are only ever appended, so a newer table still fits
+        offsets = np.load(self.offsets_path, mmap_mode="r")[: record_count + 1]
+        doc_ids = np.load(self.doc_ids_path, mmap_mode="r")[:record_count]
+        with open(self.records_path, "rb") as f:
+            if offsets[-1] > 0:
+                self.records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.records = b""
+        self.generation = meta["generation"]
+        self.source = meta["source"]
+        self.record_offsets = offsets
+        self.doc_ids = doc_ids
+        self.current_ids = current_ids
+
+    def is_stale(self) -> bool:
+        return self.source != source_fingerprint()
+
+    def get(self, dense_id: int) -> dict:
+        start = int(self.record_offsets[dense_id])
+        end = int(self.record_offsets[dense_id + 1])
+        return json.loads(self.records[start:end])
+
+    def get_many(self, dense_ids: np.ndarray) -> list[dict]:
+        dense_ids = np.asarray(dense_ids, dtype=np.int64)
+        starts = self.record_offsets[dense_ids].tolist()
+        ends = self.record_offsets[dense_ids + 1].tolist()
+        return [json.loads(self.records[start:end]) for start, end in zip(starts, ends)]
+
+    def current_documents(self) -> Iterator[tuple[int, dict]]:
+        yield from zip(self.current_ids.tolist(), self.get_many(self.current_ids))
+
+    def sync(self, documents: list[dict], source: dict | None) -> np.ndarray:
+        """Make documents the current ones and return their dense ids
+
+        Documents whose record is unchanged keep their dense id.
+        """
+        encoded = [json.dumps(doc).encode() for doc in documents]
+        with self.__writer_lock():
+            self.__reload()
+            latest = dict(
+                zip(self.doc_ids[self.current_ids].tolist(), self.current_ids.tolist())
+            )
+            offsets = self.record_offsets.tolist()
+            dense_ids = np.empty(len(documents), dtype=np.int32)
+            new_records = []
+            next_id = len(self.doc_ids)
+            for i, (doc, record) in enumerate(zip(documents, encoded)):
+                dense_id = latest.get(doc["id"])
+                if (
+                    dense_id is None
+                    or self.records[offsets[dense_id] : offsets[dense_id + 1]] != record
+                ):
+                    dense_id = next_id + len(new_records)
+                    new_records.append((doc["id"], record))
+                dense_ids[i] = dense_id
+            self.__write(new_records, dense_ids, source)
+        return dense_ids
+
+    def append(self, documents: list[dict]) -> np.ndarray:
+        """Add documents without changing the current ones"""
+        with self.__writer_lock():
+            self.__reload()
+            first_id = len(self.doc_ids)
+            self.__write(
+                [(doc["id"], json.dumps(doc).encode()) for doc in documents],
+                self.current_ids,
+                self.source,
+            )
+        return np.arange(first_id, first_id + len(documents), dtype=np.int32)
+
+    def __reload(self) -> None:
+        if os.path.exists(self.meta_path):
+            self.load()
+
+    def __write(
+        self,
+        new_records: list[tuple[int, bytes]],
+        current_ids: np.ndarray,
+        source: dict | None,
+    ) -> None:
+        with open(self.records_path, "ab") as f:
+            # bytes past the last offset are left over from an interrupted write
+            f.truncate(int(self.record_offsets[-1]))
+            f.write(b"".join(record for _, record in new_records))
+        sizes = [len(record) for _, record in new_records]
+        offsets = np.concatenate(
+            [self.record_offsets, self.record_offsets[-1] + np.cumsum(sizes)]
+        ).astype(np.int64)
+        doc_ids = np.concatenate(
+            [self.doc_ids, [doc_id for doc_id, _ in new_records]]
+        ).astype(np.int32)
+        self.__save_array(self.offsets_path, offsets)
+        self.__save_array(self.doc_ids_path, doc_ids)
+
+        generation = self.generation + 1
+        current_name = f"current_ids_{generation:06d}.npy"
+        np.save(
+            os.path.join(self.store_dir, current_name),
+            np.asarray(current_ids, dtype=np.int32),
+        )
+        meta = {
+            "generation": generation,
+            "record_count": len(doc_ids),
+            "current_ids": current_name,
+            "source": source,
+        }
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+        for name in os.listdir(self.store_dir):
+            if name.startswith("current_ids_") and name != current_name:
+                os.remove(os.path.join(self.store_dir, name))
+        self.load()
+
+    def __save_array(self, path: str, array: np.ndarray) -> None:
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def __writer_lock(self) -> Iterator[None]:
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self.lock_path, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_document_store() -> DocumentStore:
+    """The shared document store, synced with movies.json if it changed"""
+    store = DocumentStore()
+    if os.path.exists(store.meta_path):
+        store.load()
+    if not os.path.exists(store.meta_path) or store.is_stale():
+        source = source_fingerprint()
+        store.sync(load_movies(), source)
+    return store
@@ -0,0 +1,148 @@
+import numpy as np
+
+from .postings import CompressedPostings
+
+
+class TermPostings:
+    def __init__(
+        self,
+        postings: CompressedPostings,
+        term_id: int,
+        impacts: np.ndarray,
+        block_max_impacts: np.ndarray,
+        weight: float,
+    ) -> None:
+        self.postings = postings
+        self.first_block, self.end_block = postings.term_blocks(term_id)
+        blocks = slice(self.first_block, self.end_block)
+        self.block_last_docs = postings.block_last_docs[blocks]
+        self.block_max_impacts = block_max_impacts[blocks]
+        self.impacts = impacts
+        self.weight = weight
+        self.max_score = float(self.block_max_impacts.max()) * weight
+        self.__positions: np.ndarray | None = None
+        self.__doc_ids: np.ndarray | None = None
+
+    @property
+    def doc_ids(self) -> np.ndarray:
+        if self.__doc_ids is None:
+            blocks = np.arange(self.first_block, self.end_block)
+            self.__positions, self.__doc_ids, _ = self.postings.decode(blocks)
+        return self.__doc_ids
+
+    def scores_at(self, doc_ids: np.ndarray) -> np.ndarray:
+        if self.__doc_ids is not None:
+            positions, decoded_docs = self.__positions, self.__doc_ids
+        else:
+            blocks = np.searchsorted(self.block_last_docs, doc_ids)
+            blocks = np.unique(blocks[blocks < len(self.block_last_docs)])
+            positions, decoded_docs, _ = self.postings.decode(blocks + self.first_block)
+        if len(decoded_docs) == 0:
+            return np.zeros(len(doc_ids))
+        found_at = np.searchsorted(decoded_docs, doc_ids)
+        found_at = np.minimum(found_at, len(decoded_docs) - 1)
+        found = decoded_docs[found_at] == doc_ids
+        impacts = self.impacts[positions[found_at]]
+        return np.where(found, impacts * self.weight, 0.0)
+
+    def block_max_scores_at(self, doc_ids: np.ndarray) -> np.ndarray:
+        blocks = np.searchsorted(self.block_last_docs, doc_ids)
+        inside = blocks < len(self.block_last_docs)
+        blocks = np.minimum(blocks, len(self.block_last_docs) - 1)
+        return np.where(inside, self.block_max_impacts[blocks] * self.weight, 0.0)
+
+
+def block_max_top_k(
+    postings: list[TermPostings],
+    limit: int,
+    deleted: np.ndarray | None = None,
+    tie_breakers: np.ndarray | None = None,
+) -> list[tuple[int, float]]:
+    """Exact top-k over impact postings using block-max MaxScore pruning
+
+    The postings of the highest-scoring term seed the top-k threshold. Terms
+    whose summed max scores cannot reach it become non-essential: their
+    postings are never scanned, only probed for candidates that still beat
+    the threshold after adding the non-essential block maxima. Docs flagged
+    in deleted are skipped; ties go to the lower tie breaker of a doc.
+    """
+    if not postings or limit <= 0:
+        return []
+    postings = sorted(postings, key=lambda p: p.max_score)
+
+    seed_docs = postings[-1].doc_ids
+    if deleted is not None:
+        seed_docs = seed_docs[~deleted[seed_docs]]
+    seed_scores = _exact_scores(postings, seed_docs)
+    threshold = _kth_score(seed_scores, limit)
+
+    essential_from = 0
+    non_essential_bound = 0.0
+    while (
+        essential_from < len(postings) - 1
+        and non_essential_bound + postings[essential_from].max_score < threshold
+    ):
+        non_essential_bound += postings[essential_from].max_score
+        essential_from += 1
+
+    essential = postings[essential_from:-1]
+    non_essential = postings[:essential_from]
+
+    if essential:
+        candidates = np.unique(np.concatenate([p.doc_ids for p in essential]))
+        candidates = np.setdiff1d(candidates, seed_docs, assume_unique=True)
+        if deleted is not None:
+            candidates = candidates[~deleted[candidates]]
+    else:
+        candidates = seed_docs[:0]
+
+    partial = np.zeros(len(candidates))
+    for p in essential:
+        partial += p.scores_at(candidates)
+    upper_bound = partial.copy()
+    for p in non_essential:
+        upper_bound += p.block_max_scores_at(candidates)
+    survivors = upper_bound >= threshold
+    candidates = candidates[survivors]
+    partial = partial[survivors]
+    for p in non_essential:
+        partial += p.scores_at(candidates)
+
+    doc_ids = np.concatenate([seed_docs, candidates])
+    scores = np.concatenate([seed_scores, partial])
+    if tie_breakers is not None:
+        tie_breakers = tie_breakers[doc_ids]
+    return select_top_k(doc_ids, scores, limit, tie_breakers)
+
+
+def _exact_scores(postings: list[TermPostings], doc_ids: np.ndarray) -> np.ndarray:
+    scores = np.zeros(len(doc_ids))
+    for p in postings:
+        scores += p.scores_at(doc_ids)
+    return scores
+
+
+def _kth_score(scores: np.ndarray, limit: int) -> float:
+    if len(scores) < limit:
+        return 0.0
+    return float(np.partition(scores, len(scores) - limit)[len(scores) - limit])
+
+
+def select_top_k(
+    doc_ids: np.ndarray,
+    scores: np.ndarray,
+    limit: int,
+    tie_breakers: np.ndarray | None = None,
+) -> list[tuple[int, float]]:
+    """The limit best docs, ties going to the lower tie breaker, which is
+    the doc id itself unless given
+    """
+    if tie_breakers is None:
+        tie_breakers = doc_ids
+    if len(doc_ids) > limit:
+        keep = scores >= _kth_score(scores, limit)
+        doc_ids = doc_ids[keep]
+        scores = scores[keep]
+        tie_breakers = tie_breakers[keep]
+    order = np.lexsort((tie_breakers, -scores))[:limit]
+    return [(int(doc_ids[i]), float(scores[i])) for i in order]
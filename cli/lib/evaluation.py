@@ -1,9 +1,8 @@
+from .document_store import load_document_store
 from .hybrid_search import HybridSearch
 from .search_utils import (
     load_golden_dataset,
-    load_movies,
 )
-from .semantic_search import SemanticSearch
 
 
 def precision_at_k(
@@ -27,14 +26,13 @@ def recall_at_k(
             relevant_count += 1
     return relevant_count / len(relevant_docs)
 
-def evaluate_command(limit: int = 5) -> dict:
-    movies = load_movies()
+def evaluate_command(limit: int = 5, searcher: HybridSearch | None = None) -> dict:
     golden_data = load_golden_dataset()
     test_cases = golden_data["test_cases"]
 
-    semantic_search = SemanticSearch()
-    semantic_search.load_or_create_embeddings(movies)
-    hybrid_search = HybridSearch(movies)
+    hybrid_search = searcher
+    if hybrid_search is None:
+        hybrid_search = HybridSearch(load_document_store())
 
     total_precision = 0
     results_by_query = {}
@@ -0,0 +1,291 @@
+import heapq
+import json
+import os
+
+import numpy as np
+
+from .search_utils import HNSW_EF_CONSTRUCTION, HNSW_M
+
+HNSW_MAX_LEVEL = 16
+FINGERPRINT_ROWS = 8
+
+
+class HNSWIndex:
+    """Hierarchical navigable small world graph over unit-length embeddings
+
+    Every row is a node on layer 0 and, with probability M^-l, on layers 1
+    to l as well. A search walks greedily down the sparse upper layers and
+    then runs a best-first search of width ef on layer 0. The graph holds
+    row numbers only, so similarities always come from the embeddings it
+    is searched with.
+
+    Links are stored padded with -1: neighbors holds 2M layer 0 links per
+    node, and a node on upper layers owns rows upper_starts[node] onwards
+    of upper_neighbors, one per layer. New rows are appended without
+    touching existing ones, which is what lets add() extend a saved graph.
+    """
+
+    ARRAY_NAMES = (
+        "levels",
+        "neighbors",
+        "upper_starts",
+        "upper_neighbors",
+        "fingerprint",
+    )
+
+    def __init__(
+        self,
+        index_dir: str,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+    ) -> None:
+        self.index_dir = index_dir
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        self.m = m
+        self.ef_construction = ef_construction
+        self.source_version: list[int] | None = None
+        self.entry_point = -1
+        self.max_level = 0
+        self.levels = np.array([], dtype=np.int8)
+        self.neighbors = np.empty((0, 2 * m), dtype=np.int32)
+        self.upper_starts = np.array([], dtype=np.int64)
+        self.upper_neighbors = np.empty((0, m), dtype=np.int32)
+        self.fingerprint = np.empty((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAY_NAMES)
+
+    def save(self) -> None:
+        # replaced rather than rewritten, so processes that have the old
+        # arrays memory-mapped keep reading them intact
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            path = os.path.join(self.index_dir, f"{name}.npy")
+            np.save(f"{path}.tmp.npy", getattr(self, name))
+            os.replace(f"{path}.tmp.npy", path)
+        meta = {
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "source_version": self.source_version,
+            "entry_point": self.entry_point,
+            "max_level": self.max_level,
+        }
+        with open(f"{self.meta_path}.tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(f"{self.meta_path}.tmp", self.meta_path)
+
+    def load(self) -> None:
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        for name in self.ARRAY_NAMES:
+            path = os.path.join(self.index_dir, f"{name}.npy")
+            setattr(self, name, np.load(path, mmap_mode="r"))
+        self.m = meta["m"]
+        self.ef_construction = meta["ef_construction"]
+        self.source_version = meta.get("source_version")
+        self.entry_point = meta["entry_point"]
+        self.max_level = meta["max_level"]
+
+    @classmethod
+    def load_or_create(
+        cls,
+        embeddings_path: str,
+        embeddings: np.ndarray,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+    ) -> "HNSWIndex":
+        """The graph saved next to embeddings_path, extended with any rows
+        appended to that file since, and rebuilt when the file has changed in
+        any other way or the graph was built with other parameters
+        """
+        index = cls(f"{os.path.splitext(embeddings_path)[0]}_hnsw", m, ef_construction)
+        stat = os.stat(embeddings_path)
+        version = [stat.st_mtime_ns, stat.st_size]
+        if os.path.exists(index.meta_path):
+            index.load()
+            if (index.m, index.ef_construction) != (m, ef_construction) or (
+                index.source_version != version
+                and not index.was_appended_to(version, embeddings)
+            ):
+                index = cls(index.index_dir, m, ef_construction)
+        if index.source_version != version:
+            index.add(embeddings)
+            index.source_version = version
+            index.save()
+        return index
+
+    def was_appended_to(self, version: list[int], embeddings: np.ndarray) -> bool:
+        """Whether the file at version holds the rows of the graph's source
+        file followed by new ones, judged by its size and a sample of rows
+        """
+        if self.source_version is None or version[1] <= self.source_version[1]:
+            return False
+        return self.indexes_prefix_of(embeddings)
+
+    def indexes_prefix_of(self, embeddings: np.ndarray) -> bool:
+        """Whether the graph was built from the first rows of embeddings,
+        judged by a sample of them
+        """
+        if len(self) > len(embeddings):
+            return False
+        sample = fingerprint_rows(len(self))
+        return self.fingerprint.shape == (len(sample), embeddings.shape[1]) and bool(
+            np.allclose(embeddings[sample], self.fingerprint, atol=1e-5)
+        )
+
+    def add(self, embeddings: np.ndarray) -> None:
+        """Insert the rows of embeddings past those already in the graph"""
+        start, count = len(self), len(embeddings)
+        rng = np.random.default_rng(start)
+        levels = np.minimum(
+            np.floor(-np.log(1 - rng.random(count - start)) / np.log(self.m)),
+            HNSW_MAX_LEVEL,
+        ).astype(np.int8)
+
+        self.levels = np.concatenate([self.levels, levels])
+        self.neighbors = np.concatenate(
+            [self.neighbors, np.full((count - start, 2 * self.m), -1, np.int32)]
+        )
+        upper_starts = len(self.upper_neighbors) + np.cumsum(levels) - levels
+        self.upper_starts = np.concatenate([self.upper_starts, upper_starts])
+        self.upper_neighbors = np.concatenate(
+            [self.upper_neighbors, np.full((levels.sum(), self.m), -1, np.int32)]
+        )
+        for node in range(start, count):
+            self.__insert(embeddings, node)
+        self.fingerprint = np.asarray(
+            embeddings[fingerprint_rows(count)], dtype=np.float32
+        )
+
+    def search(
+        self, embeddings: np.ndarray, query_embedding: np.ndarray, ef: int
+    ) -> np.ndarray:
+        """The ef rows found closest to the query, in ascending order"""
+        if self.entry_point < 0:
+            return np.array([], dtype=np.int64)
+        entry = [
+            (float(embeddings[self.entry_point] @ query_embedding), self.entry_point)
+        ]
+        for level in range(self.max_level, 0, -1):
+            entry = [
+                max(self.__search_layer(embeddings, query_embedding, entry, 1, level))
+            ]
+        found = self.__search_layer(embeddings, query_embedding, entry, ef, 0)
+        return np.sort(np.array([node for _, node in found], dtype=np.int64))
+
+    def __links(self, node: int, level: int) -> list[int]:
+        if level == 0:
+            links = self.neighbors[node]
+        else:
+            links = self.upper_neighbors[self.upper_starts[node] + level - 1]
+        return links[links >= 0].tolist()
+
+    def __set_links(self, node: int, level: int, links: list[int]) -> None:
+        if level == 0:
+            row = self.neighbors[node]
+        else:
+            row = self.upper_neighbors[self.upper_starts[node] + level - 1]
+        row[:] = -1
+        row[: len(links)] = links
+
+    def __search_layer(
+        self,
+        embeddings: np.ndarray,
+        query_embedding: np.ndarray,
+        entry: list[tuple[float, int]],
+        ef: int,
+        level: int,
+    ) -> list[tuple[float, int]]:
+        """Best-first search of one layer, returning up to ef (score, node)
+        pairs in no particular order
+        """
+        visited = {node for _, node in entry}
+        candidates = [(-score, node) for score, node in entry]
+        heapq.heapify(candidates)
+        found = list(entry)
+        heapq.heapify(found)
+        while candidates:
+            negated_score, node = heapq.heappop(candidates)
+            if len(found) >= ef and -negated_score < found[0][0]:
+                break
+            links = [link for link in self.__links(node, level) if link not in visited]
+            if not links:
+                continue
+            visited.update(links)
+            scores = embeddings[links] @ query_embedding
+            for link, score in zip(links, scores.tolist()):
+                if len(found) < ef or score > found[0][0]:
+                    heapq.heappush(candidates, (-score, link))
+                    heapq.heappush(found, (score, link))
+                    if len(found) > ef:
+                        heapq.heappop(found)
+        return found
+
+    def __select(
+        self, embeddings: np.ndarray, scored: list[tuple[float, int]], m: int
+    ) -> list[int]:
+        """Up to m of the scored nodes, best first, skipping any that is
+        closer to an already selected node than to the base, so that links
+        spread out in every direction instead of all into one cluster
+        """
+        scored = sorted(scored, reverse=True)
+        if len(scored) <= m:
+            return [node for _, node in scored]
+        nodes = np.array([node for _, node in scored])
+        scores = np.array([score for score, _ in scored])
+        vectors = np.asarray(embeddings[nodes], dtype=np.float32)
+        similarities = vectors @ vectors.T
+        selected: list[int] = []
+        for i in range(len(nodes)):
+            if not selected or similarities[i, selected].max() < scores[i]:
+                selected.append(i)
+                if len(selected) == m:
+                    break
+        return nodes[selected].tolist()
+
+    def __insert(self, embeddings: np.ndarray, node: int) -> None:
+        query_embedding = np.asarray(embeddings[node], dtype=np.float32)
+        level = int(self.levels[node])
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        entry = [
+            (float(embeddings[self.entry_point] @ query_embedding), self.entry_point)
+        ]
+        for layer in range(self.max_level, level, -1):
+            entry = [
+                max(self.__search_layer(embeddings, query_embedding, entry, 1, layer))
+            ]
+        for layer in range(min(level, self.max_level), -1, -1):
+            found = self.__search_layer(
+                embeddings, query_embedding, entry, self.ef_construction, layer
+            )
+            links = self.__select(embeddings, found, self.m)
+            self.__set_links(node, layer, links)
+            capacity = 2 * self.m if layer == 0 else self.m
+            for link in links:
+                link_links = self.__links(link, layer) + [node]
+                if len(link_links) > capacity:
+                    scores = embeddings[link_links] @ np.asarray(
+                        embeddings[link], dtype=np.float32
+                    )
+                    link_links = self.__select(
+                        embeddings, list(zip(scores.tolist(), link_links)), capacity
+                    )
+                self.__set_links(link, layer, link_links)
+            entry = found
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+
+def fingerprint_rows(count: int) -> np.ndarray:
+    """The rows sampled to recognize the embeddings a graph was built from"""
+    if count == 0:
+        return np.array([], dtype=np.int64)
+    return np.unique(np.linspace(0, count - 1, num=FINGERPRINT_ROWS).astype(np.int64))
@@ -1,7 +1,8 @@
 import os
 from typing import Optional
 
-from .keyword_search import InvertedIndex
+from .document_store import DocumentStore, load_document_store
+from .keyword_search import InvertedIndex, open_index
 from .query_enhancement import enhance_query
 from .reranking import rerank, llm_judge_query
 from .search_utils import (
@@ -16,19 +17,23 @@ from .semantic_search import ChunkedSemanticSearch
 
 
 class HybridSearch:
-    def __init__(self, documents: list[dict]) -> None:
+    def __init__(self, documents: DocumentStore) -> None:
         self.documents = documents
         self.semantic_search = ChunkedSemanticSearch()
         self.semantic_search.load_or_create_chunk_embeddings(documents)
 
-        self.idx = InvertedIndex()
-        if not os.path.exists(self.idx.index_path):
-            self.idx.build()
-            self.idx.save()
+        writer = InvertedIndex(documents)
+        if not os.path.exists(writer.index_path):
+            writer.build()
+        else:
+            with open_index() as idx:
+                stale = idx.is_stale()
+            if stale:
+                writer.update(load_movies())
 
     def _bm25_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
-        self.idx.load()
-        return self.idx.bm25_search(query, limit)
+        with open_index() as idx:
+            return idx.bm25_search(query, limit)
 
     def weighted_search(self, query: str, alpha: float, limit: int = 5) -> list[dict]:
         bm25_results = self._bm25_search(query, limit * 500)
@@ -181,10 +186,13 @@ def reciprocal_rank_fusion(
 
 
 def weighted_search_command(
-    query: str, alpha: float = DEFAULT_ALPHA, limit: int = DEFAULT_SEARCH_LIMIT
+    query: str,
+    alpha: float = DEFAULT_ALPHA,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    searcher: HybridSearch | None = None,
 ) -> dict:
-    movies = load_movies()
-    searcher = HybridSearch(movies)
+    if searcher is None:
+        searcher = HybridSearch(load_document_store())
 
     original_query = query
 
@@ -206,9 +214,10 @@ def rrf_search_command(
     rerank_method: Optional[str] = None,
     evaluate: Optional[bool] = None,
     limit: int = DEFAULT_SEARCH_LIMIT,
+    searcher: HybridSearch | None = None,
 ) -> dict:
-    movies = load_movies()
-    searcher = HybridSearch(movies)
+    if searcher is None:
+        searcher = HybridSearch(load_document_store())
 
     original_query = query
     enhanced_query = None
@@ -0,0 +1,66 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCHMARKED_MODULES = (
+    "lib.search_client",
+    "lib.keyword_search",
+    "lib.semantic_search",
+    "lib.query_enhancement",
+    "lib.reranking",
+    "lib.hybrid_search",
+    "lib.augmented_generation",
+    "lib.evaluation",
+)
+HEAVY_MODULES = ("torch", "sentence_transformers", "google.genai")
+
+CLI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+from lib.resources import registry
+print(json.dumps({{
+    "seconds": seconds,
+    "heavy_modules": [name for name in {heavy_modules!r} if name in sys.modules],
+    "resources": [repr(key) for key in registry.loaded()],
+}}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    """Import module in a fresh interpreter and report how long it took and
+    which heavy dependencies and resources it pulled in
+    """
+    probe = _PROBE.format(module=module, heavy_modules=HEAVY_MODULES)
+    completed = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=CLI_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def import_benchmark_command(
+    modules: list[str] | None = None, runs: int = 5
+) -> list[dict]:
+    results = []
+    for module in modules or BENCHMARKED_MODULES:
+        measurements = [measure_import(module) for _ in range(runs)]
+        results.append(
+            {
+                "module": module,
+                "median_ms": statistics.median(m["seconds"] for m in measurements)
+                * 1000,
+                "min_ms": min(m["seconds"] for m in measurements) * 1000,
+                "heavy_modules": measurements[-1]["heavy_modules"],
+                "resources": measurements[-1]["resources"],
+            }
+        )
+    return results
@@ -0,0 +1,142 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from .postings import range_indices
+from .search_utils import (
+    BATCH_SCORES_MAX_CELLS,
+    IVF_KMEANS_ITERATIONS,
+    IVF_LISTS_PER_SQRT_ROWS,
+    IVF_TRAIN_POINTS_PER_LIST,
+)
+
+
+class IVFIndex:
+    """Inverted-file index over unit-length embeddings
+
+    Spherical k-means places one centroid per list and every row joins the
+    list of its closest centroid. A query scores the centroids and then only
+    the rows of its nprobe closest lists. list_rows holds the rows of every
+    list in ascending order, list after list, and list_offsets marks where
+    each list begins, so the arrays can be memory-mapped as saved.
+    """
+
+    ARRAY_NAMES = ("centroids", "list_offsets", "list_rows")
+
+    def __init__(self, index_dir: str) -> None:
+        self.index_dir = index_dir
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        self.source_version: list[int] | None = None
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+        self.list_rows = np.array([], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.list_rows)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAY_NAMES)
+
+    def build(self, embeddings: np.ndarray, list_count: int | None = None) -> None:
+        if list_count is None:
+            list_count = round(IVF_LISTS_PER_SQRT_ROWS * math.sqrt(len(embeddings)))
+        list_count = min(max(list_count, 1), len(embeddings))
+        if list_count == 0:
+            self.centroids = np.empty((0, embeddings.shape[1]), dtype=np.float32)
+            self.list_offsets = np.zeros(1, dtype=np.int64)
+            self.list_rows = np.array([], dtype=np.int64)
+            return
+
+        self.centroids = spherical_kmeans(embeddings, list_count)
+        assignments = nearest_centroids(embeddings, self.centroids)
+        self.list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.list_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(assignments, minlength=list_count)))
+        ).astype(np.int64)
+
+    def save(self) -> None:
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(self.index_dir, f"{name}.npy"), getattr(self, name))
+        with open(self.meta_path, "w") as f:
+            json.dump({"source_version": self.source_version}, f, indent=2)
+
+    def load(self) -> None:
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        for name in self.ARRAY_NAMES:
+            path = os.path.join(self.index_dir, f"{name}.npy")
+            setattr(self, name, np.load(path, mmap_mode="r"))
+        self.source_version = meta["source_version"]
+
+    @classmethod
+    def load_or_create(cls, embeddings_path: str, embeddings: np.ndarray) -> "IVFIndex":
+        """The index saved next to embeddings_path, rebuilt when that file
+        has changed since
+        """
+        index = cls(f"{os.path.splitext(embeddings_path)[0]}_ivf")
+        stat = os.stat(embeddings_path)
+        version = [stat.st_mtime_ns, stat.st_size]
+        if os.path.exists(index.meta_path):
+            index.load()
+        if index.source_version != version:
+            index.build(embeddings)
+            index.source_version = version
+            index.save()
+        return index
+
+    def probe(self, query_embedding: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows of the nprobe lists whose centroids are closest to the query,
+        in ascending order
+        """
+        list_count = len(self.centroids)
+        if nprobe >= list_count:
+            return np.arange(len(self.list_rows))
+        lists = np.argpartition(-(self.centroids @ query_embedding), nprobe - 1)
+        starts = self.list_offsets[lists[:nprobe]]
+        ends = self.list_offsets[lists[:nprobe] + 1]
+        return np.sort(self.list_rows[range_indices(starts, ends - starts)])
+
+
+def spherical_kmeans(
+    embeddings: np.ndarray,
+    k: int,
+    iterations: int = IVF_KMEANS_ITERATIONS,
+    seed: int = 0,
+) -> np.ndarray:
+    """k unit-length centroids for unit-length rows, clustered by cosine
+    similarity on a sample of IVF_TRAIN_POINTS_PER_LIST rows per centroid
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(embeddings), k * IVF_TRAIN_POINTS_PER_LIST)
+    sample = np.sort(rng.choice(len(embeddings), size=sample_size, replace=False))
+    vectors = np.asarray(embeddings[sample], dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)]
+
+    for _ in range(iterations):
+        assignments = nearest_centroids(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        clusters, starts = np.unique(assignments[order], return_index=True)
+        sums = np.zeros_like(centroids)
+        sums[clusters] = np.add.reduceat(vectors[order], starts)
+        # an empty list starts over from a random row
+        empty = np.setdiff1d(np.arange(k), clusters)
+        sums[empty] = vectors[rng.choice(len(vectors), size=len(empty))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0, 1, norms)
+    return centroids.astype(np.float32)
+
+
+def nearest_centroids(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid to every row, BATCH_SCORES_MAX_CELLS
+    similarities at a time
+    """
+    assignments = np.empty(len(embeddings), dtype=np.int64)
+    block_rows = max(1, BATCH_SCORES_MAX_CELLS // len(centroids))
+    for start in range(0, len(embeddings), block_rows):
+        block = np.asarray(embeddings[start : start + block_rows], dtype=np.float32)
+        assignments[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
@@ -1,143 +1,1183 @@
+import fcntl
+import json
 import math
 import os
-import pickle
+import shutil
 import string
+import tempfile
+import threading
 from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 
-from nltk.stem import PorterStemmer
+import numpy as np
 
+from .batch_scoring import SparseMatrix, matmul_top_k
+from .boolean_query import BooleanQueryParser, QueryNode
+from .document_store import DocumentStore
+from .dynamic_pruning import TermPostings, block_max_top_k, select_top_k
+from .positions import (
+    PostingPositions,
+    phrase_starts,
+    position_keys,
+    proximity_anchors,
+)
+from .postings import (
+    CompressedPostings,
+    intersect_sorted,
+    range_indices,
+    subtract_sorted,
+)
+from .resources import porter_stemmer
 from .search_utils import (
+    AUTOCOMPLETE_MAX_EXPANSIONS,
     BM25_B,
     BM25_K1,
-    CACHE_DIR,
+    BM25_PRUNING_MAX_LIMIT,
+    BM25F_DESCRIPTION_B,
+    BM25F_DESCRIPTION_WEIGHT,
+    BM25F_TITLE_B,
+    BM25F_TITLE_WEIGHT,
+    BUILD_SHARDS_PER_WORKER,
     DEFAULT_SEARCH_LIMIT,
+    INVERTED_INDEX_DIR,
+    MAX_INDEX_SEGMENTS,
+    STEM_CACHE_SIZE,
     format_search_result,
     load_movies,
     load_stopwords,
+    source_fingerprint,
 )
+from .term_dictionary import WILDCARD_CHARACTERS, TermDictionary, is_wildcard
 
+INDEX_FORMAT_VERSION = 6
+SEGMENT_ARRAYS = (
+    "term_offsets",
+    "postings_impacts",
+    "impact_scales",
+    "block_max_impacts",
+    "doc_ids",
+    "store_ids",
+    "doc_lengths",
+    "title_tfs",
+    "title_lengths",
+)
 
-class InvertedIndex:
-    def __init__(self) -> None:
-        self.index = defaultdict(set)
-        self.docmap: dict[int, dict] = {}
-        self.index_path = os.path.join(CACHE_DIR, "index.pkl")
-        self.docmap_path = os.path.join(CACHE_DIR, "docmap.pkl")
-        self.tf_path = os.path.join(CACHE_DIR, "term_frequencies.pkl")
-        self.doc_lengths_path = os.path.join(CACHE_DIR, "doc_lengths.pkl")
-        self.term_frequencies = defaultdict(Counter)
-        self.doc_lengths = {}
-
-    def build(self) -> None:
-        movies = load_movies()
-        for m in movies:
-            doc_id = m["id"]
-            doc_description = f"{m['title']} {m['description']}"
-            self.docmap[doc_id] = m
-            self.__add_document(doc_id, doc_description)
+
+class IndexSegment:
+    def __init__(self, segment_dir: str) -> None:
+        self.segment_dir = segment_dir
+        self.name = os.path.basename(segment_dir)
+        self.meta_path = os.path.join(segment_dir, "meta.json")
+        self.terms = TermDictionary.encode([])
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.postings = CompressedPostings.encode(
+            self.term_offsets,
+            np.array([], dtype=np.int32),
+            np.array([], dtype=np.int32),
+        )
+        self.postings_impacts = np.array([], dtype=np.uint8)
+        self.impact_scales = np.array([], dtype=np.float64)
+        self.block_max_impacts = np.array([], dtype=np.uint8)
+        self.doc_ids = np.array([], dtype=np.int32)
+        self.store_ids = np.array([], dtype=np.int32)
+        self.doc_order: np.ndarray | None = None
+        self.doc_lengths = np.array([], dtype=np.int32)
+        self.title_tfs = np.array([], dtype=np.uint8)
+        self.title_lengths = np.array([], dtype=np.int32)
+        self.avg_doc_length = 0.0
+        self.impact_params = (BM25_K1, BM25_B)
+        self.has_positions = False
+        self.positions: PostingPositions | None = None
+
+    def build(
+        self,
+        documents: list[dict],
+        store_ids: np.ndarray,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        workers: int = 1,
+        positions: bool = False,
+    ) -> None:
+        fields = [(doc["title"], doc["description"]) for doc in documents]
+        shard_count = workers * BUILD_SHARDS_PER_WORKER if workers > 1 else 1
+        shard_size = max(1, -(-len(fields) // shard_count))
+        shards = [
+            (start, fields[start : start + shard_size], positions)
+            for start in range(0, max(len(fields), 1), shard_size)
+        ]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                partials = list(executor.map(invert_shard, shards))
+        else:
+            partials = [invert_shard(shard) for shard in shards]
+        doc_ids = np.array([doc["id"] for doc in documents], dtype=np.int32)
+        self.build_from_shards(doc_ids, store_ids, partials, k1, b)
+
+    def build_from_shards(
+        self,
+        doc_ids: np.ndarray,
+        store_ids: np.ndarray,
+        shards: list[dict],
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ) -> None:
+        merged = merge_shards(shards)
+        tfs = merged["tfs"]
+        doc_lengths = merged["doc_lengths"]
+        self.terms = TermDictionary.encode(merged["terms"])
+        self.term_offsets = merged["term_offsets"]
+        self.postings = CompressedPostings.encode(
+            self.term_offsets, merged["doc_numbers"], tfs
+        )
+        self.has_positions = "positions" in merged
+        if self.has_positions:
+            self.positions = PostingPositions.encode(
+                self.postings, tfs, merged["positions"]
+            )
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.store_ids = np.asarray(store_ids, dtype=np.int32)
+        self.doc_order = None
+        self.doc_lengths = doc_lengths
+        self.title_tfs = merged["title_tfs"]
+        self.title_lengths = merged["title_lengths"]
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self.build_impacts(k1, b)
+
+    def build_impacts(self, k1: float = BM25_K1, b: float = BM25_B) -> None:
+        max_impact = np.iinfo(np.uint8).max
+        doc_freqs = np.diff(self.term_offsets)
+        idfs = bm25_idf(len(self.doc_ids), doc_freqs)
+
+        all_blocks = np.arange(len(self.postings.block_last_docs))
+        _, doc_numbers, tfs = self.postings.decode(all_blocks)
+        scores = bm25_tf(tfs, self.doc_lengths[doc_numbers], self.avg_doc_length, k1, b)
+        scores *= np.repeat(idfs, doc_freqs)
+
+        if len(scores):
+            max_scores = np.maximum.reduceat(scores, self.term_offsets[:-1])
+        else:
+            max_scores = np.array([], dtype=np.float64)
+        self.impact_scales = max_scores / max_impact
+        quantized = np.rint(scores / np.repeat(self.impact_scales, doc_freqs))
+        self.postings_impacts = np.clip(quantized, 1, max_impact).astype(np.uint8)
+        if len(all_blocks):
+            self.block_max_impacts = np.maximum.reduceat(
+                self.postings_impacts, self.postings.block_posting_offsets[:-1]
+            )
+        else:
+            self.block_max_impacts = np.array([], dtype=np.uint8)
+        self.impact_params = (k1, b)
 
     def save(self) -> None:
-        os.makedirs(CACHE_DIR, exist_ok=True)
-        with open(self.index_path, "wb") as f:
-            pickle.dump(self.index, f)
-        with open(self.docmap_path, "wb") as f:
-            pickle.dump(self.docmap, f)
-        with open(self.tf_path, "wb") as f:
-            pickle.dump(self.term_frequencies, f)
-        with open(self.doc_lengths_path, "wb") as f:
-            pickle.dump(self.doc_lengths, f)
+        os.makedirs(self.segment_dir, exist_ok=True)
+        for name in SEGMENT_ARRAYS:
+            path = os.path.join(self.segment_dir, f"{name}.npy")
+            np.save(path, getattr(self, name))
+        self.terms.save(self.segment_dir)
+        self.postings.save(self.segment_dir)
+        if self.positions is not None:
+            self.positions.save(self.segment_dir)
+        k1, b = self.impact_params
+        with open(self.meta_path, "w") as f:
+            json.dump(
+                {
+                    "format_version": INDEX_FORMAT_VERSION,
+                    "doc_count": len(self.doc_ids),
+                    "term_count": len(self.terms),
+                    "avg_doc_length": self.avg_doc_length,
+                    "k1": k1,
+                    "b": b,
+                    "positions": self.has_positions,
+                },
+                f,
+                indent=2,
+            )
+
+    def load(self) -> None:
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError("inverted index format is outdated, rebuild the index")
+        for name in SEGMENT_ARRAYS:
+            path = os.path.join(self.segment_dir, f"{name}.npy")
+            setattr(self, name, np.load(path, mmap_mode="r"))
+        self.terms = TermDictionary.load(self.segment_dir)
+        self.postings = CompressedPostings.load(self.segment_dir)
+        self.avg_doc_length = meta["avg_doc_length"]
+        self.impact_params = (meta["k1"], meta["b"])
+        self.has_positions = meta.get("positions", False)
+        # mapped now rather than by the first phrase query: a merge may
+        # remove the segment directory while this snapshot is still in use,
+        # and mapped files stay readable after they are unlinked
+        self.positions = (
+            PostingPositions.load(self.segment_dir) if self.has_positions else None
+        )
+        self.doc_order = None
+
+    def get_positions(self) -> PostingPositions:
+        if self.positions is None:
+            raise ValueError(
+                "inverted index has no positions, rebuild it with --positions"
+            )
+        return self.positions
+
+    def term_id(self, token: str) -> int | None:
+        return self.terms.term_id(token)
+
+    def doc_number(self, doc_id: int) -> int | None:
+        doc_number = int(self.doc_numbers(np.array([doc_id]))[0])
+        if doc_number < len(self.doc_ids) and self.doc_ids[doc_number] == doc_id:
+            return doc_number
+        return None
+
+    def doc_numbers(self, doc_ids: np.ndarray) -> np.ndarray:
+        """Doc numbers of movie ids; ids missing from the segment map to junk"""
+        if self.doc_order is None:
+            self.doc_order = np.argsort(self.doc_ids, kind="stable")
+        ranks = np.searchsorted(self.doc_ids, doc_ids, sorter=self.doc_order)
+        if len(self.doc_order) == 0:
+            return ranks
+        return self.doc_order[np.minimum(ranks, len(self.doc_order) - 1)]
+
+    def doc_freq(self, term_id: int) -> int:
+        return int(self.term_offsets[term_id + 1] - self.term_offsets[term_id])
+
+    def get_tf(self, doc_number: int, term_id: int) -> int:
+        first_block, end_block = self.postings.term_blocks(term_id)
+        block_last_docs = self.postings.block_last_docs[first_block:end_block]
+        block = first_block + int(np.searchsorted(block_last_docs, doc_number))
+        if block >= end_block:
+            return 0
+        _, docs, tfs = self.postings.decode(np.array([block]))
+        position = int(np.searchsorted(docs, doc_number))
+        if docs[position] == doc_number:
+            return int(tfs[position])
+        return 0
+
+    def live_shard(self, deleted: np.ndarray, first_doc_number: int) -> dict:
+        """Postings of the documents that are not deleted, renumbered from
+        first_doc_number, in the shape produced by invert_shard
+        """
+        live = ~deleted
+        new_numbers = np.cumsum(live, dtype=np.int64) - 1 + first_doc_number
+        all_blocks = np.arange(len(self.postings.block_last_docs))
+        _, doc_numbers, tfs = self.postings.decode(all_blocks)
+        keep = live[doc_numbers]
+        posting_terms = np.repeat(
+            np.arange(len(self.terms)), np.diff(self.term_offsets)
+        )[keep]
+        doc_freqs = np.bincount(posting_terms, minlength=len(self.terms))
+        present = doc_freqs > 0
+        shard = {
+            "terms": [
+                term for term, keep in zip(self.terms.terms(), present.tolist()) if keep
+            ],
+            "doc_freqs": doc_freqs[present].astype(np.int64),
+            "doc_numbers": new_numbers[doc_numbers[keep]].astype(np.int32),
+            "tfs": tfs[keep],
+            "title_tfs": np.asarray(self.title_tfs)[keep],
+            "doc_lengths": np.asarray(self.doc_lengths)[live],
+            "title_lengths": np.asarray(self.title_lengths)[live],
+        }
+        if self.has_positions:
+            positions = self.get_positions()
+            starts = positions.posting_starts(self.postings, all_blocks, tfs)
+            shard["positions"] = positions.take(starts[keep], tfs[keep])
+        return shard
+
+    def title_postings(
+        self, tokens: list[str]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Postings of all tokens, decoded together
+
+        Returns, for every posting, the index of its token in tokens, the doc
+        number and the term frequency in the title.
+        """
+        term_ids = self.terms.term_ids(tokens)
+        rows = np.flatnonzero(term_ids >= 0)
+        term_ids = term_ids[rows]
+        first_blocks = self.postings.term_block_offsets[term_ids]
+        block_counts = self.postings.term_block_offsets[term_ids + 1] - first_blocks
+        positions, doc_numbers, _ = self.postings.decode(
+            range_indices(first_blocks, block_counts)
+        )
+        doc_freqs = self.term_offsets[term_ids + 1] - self.term_offsets[term_ids]
+        return np.repeat(rows, doc_freqs), doc_numbers, self.title_tfs[positions]
+
+    def decode_candidates(
+        self, term_id: int, candidates: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Decode the term's blocks that can hold any of the candidate docs
+
+        Block last docs act as skip pointers, so a short candidate list only
+        pays for the blocks it lands in. Returns the blocks, doc numbers and
+        term frequencies; the docs still have to be intersected.
+        """
+        first_block, end_block = self.postings.term_blocks(term_id)
+        if candidates is None:
+            blocks = np.arange(first_block, end_block)
+        else:
+            block_last_docs = self.postings.block_last_docs[first_block:end_block]
+            blocks = first_block + np.unique(
+                np.searchsorted(block_last_docs, candidates)
+            )
+            blocks = blocks[blocks < end_block]
+        _, doc_numbers, tfs = self.postings.decode(blocks)
+        return blocks, doc_numbers, tfs
+
+    def match(
+        self, node: QueryNode, candidates: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Sorted doc numbers matching a parsed boolean query
+
+        When candidates is given, only those docs are considered.
+        """
+        match node[0]:
+            case "term":
+                term_id = self.term_id(node[1])
+                if term_id is None:
+                    return np.array([], dtype=np.int32)
+                return self.__term_matches(term_id, candidates)
+            case "wildcard":
+                matches = [
+                    self.__term_matches(term_id, candidates)
+                    for term_id in self.terms.expand(node[1]).tolist()
+                ]
+                if not matches:
+                    return np.array([], dtype=np.int32)
+                return np.unique(np.concatenate(matches))
+            case "and":
+                # rarest first, so every later child only probes the survivors
+                excluded = [child[1] for child in node[1] if child[0] == "not"]
+                required = sorted(
+                    (child for child in node[1] if child[0] != "not"),
+                    key=self.__estimate_matches,
+                )
+                if not required:
+                    candidates = self.__all_docs(candidates)
+                for child in required:
+                    candidates = self.match(child, candidates)
+                    if len(candidates) == 0:
+                        return candidates
+                for child in excluded:
+                    candidates = subtract_sorted(
+                        candidates, self.match(child, candidates)
+                    )
+                return candidates
+            case "or":
+                matches = [self.match(child, candidates) for child in node[1]]
+                return np.unique(np.concatenate(matches))
+            case "not":
+                candidates = self.__all_docs(candidates)
+                return subtract_sorted(candidates, self.match(node[1], candidates))
+        raise ValueError(f"unknown query node {node[0]!r}")
+
+    def __term_matches(self, term_id: int, candidates: np.ndarray | None) -> np.ndarray:
+        _, doc_numbers, _ = self.decode_candidates(term_id, candidates)
+        if candidates is None:
+            return doc_numbers
+        return intersect_sorted(candidates, doc_numbers)
+
+    def __all_docs(self, candidates: np.ndarray | None) -> np.ndarray:
+        if candidates is None:
+            return np.arange(len(self.doc_ids), dtype=np.int32)
+        return candidates
+
+    def __estimate_matches(self, node: QueryNode) -> int:
+        match node[0]:
+            case "term":
+                term_id = self.term_id(node[1])
+                return 0 if term_id is None else self.doc_freq(term_id)
+            case "wildcard":
+                term_ids = self.terms.expand(node[1])
+                doc_freqs = (
+                    self.term_offsets[term_ids + 1] - self.term_offsets[term_ids]
+                )
+                return int(doc_freqs.sum())
+            case "and":
+                return min(self.__estimate_matches(child) for child in node[1])
+            case "or":
+                return sum(self.__estimate_matches(child) for child in node[1])
+        return len(self.doc_ids) - self.__estimate_matches(node[1])
+
+    def phrase_counts(
+        self, tokens: list[str], offsets: list[int], within: int = 0
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Doc numbers holding the phrase, with how often each holds it
+
+        With within > 0 the terms may appear in any order, each no more than
+        within words away from an occurrence of the first term.
+        """
+        positions = self.get_positions()
+        no_matches = np.array([], dtype=np.int64)
+        term_ids = [self.term_id(token) for token in tokens]
+        if any(term_id is None for term_id in term_ids):
+            return no_matches, no_matches
+
+        decoded = {}
+        candidates = None
+        for term_id in sorted(set(term_ids), key=self.doc_freq):
+            blocks, doc_numbers, tfs = self.decode_candidates(term_id, candidates)
+            if candidates is None:
+                candidates = doc_numbers
+            else:
+                candidates = intersect_sorted(candidates, doc_numbers)
+            decoded[term_id] = (blocks, doc_numbers, tfs)
+
+        term_keys = {}
+        for term_id, (blocks, doc_numbers, tfs) in decoded.items():
+            keep = np.isin(doc_numbers, candidates, assume_unique=True)
+            starts = positions.posting_starts(self.postings, blocks, tfs)[keep]
+            term_keys[term_id] = position_keys(
+                np.repeat(doc_numbers[keep], tfs[keep]),
+                positions.take(starts, tfs[keep]),
+            )
+        keys = [term_keys[term_id] for term_id in term_ids]
+        if within > 0:
+            matches = proximity_anchors(keys, within)
+        else:
+            matches = phrase_starts(keys, offsets)
+        return np.unique(matches >> 32, return_counts=True)
+
+    def impact_top_k(
+        self,
+        term_weights: dict[int, float],
+        limit: int,
+        deleted: np.ndarray | None = None,
+    ) -> list[tuple[int, float]]:
+        """Doc numbers with the highest sums of impact times term weight
+
+        Docs flagged in deleted are skipped, and ties go to the lower movie
+        id, as they do across segments.
+        """
+        if limit <= BM25_PRUNING_MAX_LIMIT:
+            return self.__pruned_top_k(term_weights, limit, deleted)
+        return self.__taat_top_k(term_weights, limit, deleted)
+
+    def idf_ratio(self, term_id: int, doc_count: int, doc_freq: int) -> float:
+        """What turns this segment's impacts of a term into BM25 with the IDF
+        of doc_count docs, doc_freq of them holding the term
+        """
+        segment_idf = bm25_idf(len(self.doc_ids), self.doc_freq(term_id))
+        return float(bm25_idf(doc_count, doc_freq) / segment_idf)
+
+    def __pruned_top_k(
+        self,
+        term_weights: dict[int, float],
+        limit: int,
+        deleted: np.ndarray | None,
+    ) -> list[tuple[int, float]]:
+        postings = [
+            TermPostings(
+                self.postings,
+                term_id,
+                self.postings_impacts,
+                self.block_max_impacts,
+                weight,
+            )
+            for term_id, weight in term_weights.items()
+        ]
+        return block_max_top_k(postings, limit, deleted, self.doc_ids)
+
+    def __taat_top_k(
+        self,
+        term_weights: dict[int, float],
+        limit: int,
+        deleted: np.ndarray | None,
+    ) -> list[tuple[int, float]]:
+        scores = np.zeros(len(self.doc_ids))
+        matched = []
+        for term_id, weight in term_weights.items():
+            positions, doc_numbers, _ = self.postings.decode_term(term_id)
+            scores[doc_numbers] += self.postings_impacts[positions] * weight
+            matched.append(doc_numbers)
+
+        if not matched:
+            return []
+
+        candidates = np.unique(np.concatenate(matched))
+        if deleted is not None:
+            candidates = candidates[~deleted[candidates]]
+        return select_top_k(
+            candidates, scores[candidates], limit, self.doc_ids[candidates]
+        )
+
+
+class InvertedIndex:
+    """Keyword index made of immutable segments
+
+    Every build, update or merge writes new segment directories and then
+    atomically replaces manifest.json, which lists the live segments and
+    their tombstone files. Readers never lock: they load whatever manifest is
+    current. Writers serialize on a lock file.
+    """
+
+    def __init__(
+        self, store: DocumentStore | None = None, read_only: bool = False
+    ) -> None:
+        self.store = store if store is not None else DocumentStore()
+        self.read_only = read_only
+        self.index_dir = INVERTED_INDEX_DIR
+        self.index_path = os.path.join(self.index_dir, "manifest.json")
+        self.lock_path = os.path.join(self.index_dir, ".lock")
+        self.generation = 0
+        self.source: dict | None = None
+        self.impact_params = (BM25_K1, BM25_B)
+        self.has_positions = False
+        self.segments: list[IndexSegment] = []
+        self.deleted: list[np.ndarray] = []
+        self.doc_count = 0
+        self.avg_doc_length = 0.0
+        self.avg_title_length = 0.0
+        self.avg_description_length = 0.0
+
+    def build(
+        self,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        workers: int = 1,
+        positions: bool = False,
+    ) -> None:
+        with self.__writer_lock():
+            if os.path.exists(self.index_path):
+                try:
+                    self.load()
+                except ValueError:
+                    # an outdated index: none of its segments can be kept
+                    self.segments = [
+                        IndexSegment(os.path.join(self.index_dir, name))
+                        for name in os.listdir(self.index_dir)
+                        if name.startswith("segment_")
+                    ]
+            stale_segments = self.segments
+            self.source = source_fingerprint()
+            documents = load_movies()
+            store_ids = self.store.sync(documents, self.source)
+            segment = self.__new_segment()
+            segment.build(documents, store_ids, k1, b, workers, positions)
+            segment.save()
+            self.impact_params = (k1, b)
+            self.has_positions = positions
+            self.__commit([segment], [np.zeros(len(segment.doc_ids), dtype=bool)])
+            self.__remove_segments(stale_segments)
 
     def load(self) -> None:
-        with open(self.index_path, "rb") as f:
-            self.index = pickle.load(f)
-        with open(self.docmap_path, "rb") as f:
-            self.docmap = pickle.load(f)
-        with open(self.tf_path, "rb") as f:
-            self.term_frequencies = pickle.load(f)
-        with open(self.doc_lengths_path, "rb") as f:
-            self.doc_lengths = pickle.load(f)
+        try:
+            self.__load()
+        except FileNotFoundError:
+            # a writer replaced the manifest while we were reading it
+            self.__load()
+
+    def __load(self) -> None:
+        with open(self.index_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError("inverted index format is outdated, rebuild the index")
+        segments, deleted = [], []
+        for entry in manifest["segments"]:
+            segment = IndexSegment(os.path.join(self.index_dir, entry["name"]))
+            segment.load()
+            mask = np.zeros(len(segment.doc_ids), dtype=bool)
+            if entry["deletes"] is not None:
+                mask[np.load(os.path.join(segment.segment_dir, entry["deletes"]))] = 1
+            segments.append(segment)
+            deleted.append(mask)
+
+        self.generation = manifest["generation"]
+        self.source = manifest["source"]
+        self.impact_params = (manifest["k1"], manifest["b"])
+        self.has_positions = manifest.get("positions", False)
+        # records are appended before the manifest that refers to them
+        self.store.load()
+        self.__set_segments(segments, deleted)
+
+    def __set_segments(
+        self, segments: list[IndexSegment], deleted: list[np.ndarray]
+    ) -> None:
+        self.segments = segments
+        self.deleted = deleted
+        self.doc_count = sum(int((~mask).sum()) for mask in deleted)
+        total_length = sum(
+            int(segment.doc_lengths[~mask].sum())
+            for segment, mask in zip(segments, deleted)
+        )
+        total_title_length = sum(
+            int(segment.title_lengths[~mask].sum())
+            for segment, mask in zip(segments, deleted)
+        )
+        if self.doc_count:
+            self.avg_doc_length = total_length / self.doc_count
+            self.avg_title_length = total_title_length / self.doc_count
+        else:
+            self.avg_doc_length = self.avg_title_length = 0.0
+        self.avg_description_length = self.avg_doc_length - self.avg_title_length
+
+    def is_stale(self) -> bool:
+        return self.source != source_fingerprint()
+
+    def update(self, documents: list[dict]) -> tuple[int, int]:
+        """Bring the index in line with documents
+
+        New and changed documents are indexed into a fresh segment and their
+        previous versions, like documents that are gone, are tombstoned.
+        Returns the number of upserted and deleted documents.
+        """
+        with self.__writer_lock():
+            self.load()
+            self.source = source_fingerprint()
+            store_ids = self.store.sync(documents, self.source)
+            # unchanged documents keep their record, and so their dense id
+            live = self.__live_store_ids()
+            changed = [
+                i
+                for i, (doc, store_id) in enumerate(zip(documents, store_ids.tolist()))
+                if live.get(doc["id"]) != store_id
+            ]
+            current_ids = {doc["id"] for doc in documents}
+            deletes = [doc_id for doc_id in live if doc_id not in current_ids]
+            self.__apply([documents[i] for i in changed], store_ids[changed], deletes)
+        self.__maybe_merge()
+        return len(changed), len(deletes)
+
+    def upsert(self, documents: list[dict]) -> None:
+        with self.__writer_lock():
+            self.load()
+            store_ids = self.store.append(documents)
+            self.__apply(documents, store_ids, [])
+        self.__maybe_merge()
+
+    def delete(self, doc_ids: Iterable[int]) -> int:
+        with self.__writer_lock():
+            self.load()
+            deleted = self.__apply([], np.array([], dtype=np.int32), doc_ids)
+        self.__maybe_merge()
+        return deleted
+
+    def __apply(
+        self, upserts: list[dict], store_ids: np.ndarray, deletes: Iterable[int]
+    ) -> int:
+        deleted = [mask.copy() for mask in self.deleted]
+        deleted_count = 0
+        for doc_id in [doc["id"] for doc in upserts] + list(deletes):
+            location = self.__locate(doc_id, deleted)
+            if location is not None:
+                segment_index, doc_number = location
+                deleted[segment_index][doc_number] = True
+                deleted_count += 1
+
+        segments = list(self.segments)
+        if upserts:
+            segment = self.__new_segment()
+            k1, b = self.impact_params
+            segment.build(upserts, store_ids, k1, b, positions=self.has_positions)
+            segment.save()
+            segments.append(segment)
+            deleted.append(np.zeros(len(upserts), dtype=bool))
+        self.__commit(segments, deleted)
+        return deleted_count
+
+    def merge(self) -> None:
+        """Compact all segments into one, dropping tombstoned documents
+
+        The merged segment is built without holding the writer lock; updates
+        that land in the meantime are carried over when it is swapped in.
+        """
+        self.load()
+        if len(self.segments) <= 1 and not any(mask.any() for mask in self.deleted):
+            return
+
+        shards, doc_ids, store_ids, renumberings = [], [], [], []
+        doc_count = 0
+        for segment, mask in zip(self.segments, self.deleted):
+            shards.append(segment.live_shard(mask, doc_count))
+            renumbering = np.full(len(mask), -1, dtype=np.int64)
+            renumbering[~mask] = np.arange(doc_count, doc_count + (~mask).sum())
+            renumberings.append(renumbering)
+            doc_ids.append(segment.doc_ids[~mask])
+            store_ids.append(segment.store_ids[~mask])
+            doc_count += int((~mask).sum())
+        merged = self.__new_segment()
+        k1, b = self.impact_params
+        merged.build_from_shards(
+            np.concatenate(doc_ids), np.concatenate(store_ids), shards, k1, b
+        )
+        merged.save()
+
+        snapshot = list(zip(self.segments, self.deleted, renumberings))
+        with self.__writer_lock():
+            self.load()
+            names = [segment.name for segment in self.segments]
+            if names[: len(snapshot)] != [segment.name for segment, _, _ in snapshot]:
+                # another merge got there first
+                self.__remove_segments([merged])
+                return
+            merged_deleted = np.zeros(doc_count, dtype=bool)
+            for (_, old_mask, renumbering), mask in zip(snapshot, self.deleted):
+                merged_deleted[renumbering[mask & ~old_mask]] = True
+            self.__commit(
+                [merged] + self.segments[len(snapshot) :],
+                [merged_deleted] + self.deleted[len(snapshot) :],
+            )
+        self.__remove_segments([segment for segment, _, _ in snapshot])
+
+    def __maybe_merge(self) -> None:
+        if len(self.segments) > MAX_INDEX_SEGMENTS:
+            merge_in_background()
+
+    def __live_store_ids(self) -> dict[int, int]:
+        live = {}
+        for segment, mask in zip(self.segments, self.deleted):
+            live.update(
+                zip(segment.doc_ids[~mask].tolist(), segment.store_ids[~mask].tolist())
+            )
+        return live
+
+    def __locate(
+        self, doc_id: int, deleted: list[np.ndarray] | None = None
+    ) -> tuple[int, int] | None:
+        if deleted is None:
+            deleted = self.deleted
+        for segment_index in reversed(range(len(self.segments))):
+            doc_number = self.segments[segment_index].doc_number(doc_id)
+            if doc_number is not None and not deleted[segment_index][doc_number]:
+                return segment_index, doc_number
+        return None
+
+    def __new_segment(self) -> IndexSegment:
+        os.makedirs(self.index_dir, exist_ok=True)
+        return IndexSegment(tempfile.mkdtemp(prefix="segment_", dir=self.index_dir))
+
+    def __commit(self, segments: list[IndexSegment], deleted: list[np.ndarray]) -> None:
+        self.generation += 1
+        entries = []
+        for segment, mask in zip(segments, deleted):
+            deletes = None
+            if mask.any():
+                deletes = f"deletes_{self.generation:06d}.npy"
+                path = os.path.join(segment.segment_dir, deletes)
+                np.save(path, np.flatnonzero(mask).astype(np.int32))
+            entries.append({"name": segment.name, "deletes": deletes})
+
+        k1, b = self.impact_params
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "generation": self.generation,
+            "source": self.source,
+            "k1": k1,
+            "b": b,
+            "positions": self.has_positions,
+            "segments": entries,
+        }
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+        self.__set_segments(segments, deleted)
+
+        for segment, entry in zip(segments, entries):
+            for name in os.listdir(segment.segment_dir):
+                if name.startswith("deletes_") and name != entry["deletes"]:
+                    os.remove(os.path.join(segment.segment_dir, name))
+
+    def __remove_segments(self, segments: list[IndexSegment]) -> None:
+        for segment in segments:
+            shutil.rmtree(segment.segment_dir, ignore_errors=True)
+
+    @contextmanager
+    def __writer_lock(self) -> Iterator[None]:
+        if self.read_only:
+            raise RuntimeError("cannot modify a read-only index")
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(self.lock_path, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get_document(self, doc_id: int) -> dict | None:
+        location = self.__locate(doc_id)
+        if location is None:
+            return None
+        return self.__stored_document(*location)
+
+    def __stored_document(self, segment_index: int, doc_number: int) -> dict:
+        segment = self.segments[segment_index]
+        return self.store.get(int(segment.store_ids[doc_number]))
 
     def get_documents(self, term: str) -> list[int]:
-        doc_ids = self.index.get(term, set())
-        return sorted(list(doc_ids))
+        doc_ids = []
+        for segment, mask in zip(self.segments, self.deleted):
+            term_id = segment.term_id(term)
+            if term_id is None:
+                continue
+            _, doc_numbers, _ = segment.postings.decode_term(term_id)
+            doc_ids.extend(segment.doc_ids[doc_numbers[~mask[doc_numbers]]].tolist())
+        return sorted(doc_ids)
 
-    def __add_document(self, doc_id: int, text: str) -> None:
-        tokens = tokenize_text(text)
-        for token in set(tokens):
-            self.index[token].add(doc_id)
-        self.term_frequencies[doc_id].update(tokens)
-        self.doc_lengths[doc_id] = len(tokens)
+    def __doc_freq(self, token: str) -> int:
+        doc_freq = 0
+        for segment, mask in zip(self.segments, self.deleted):
+            term_id = segment.term_id(token)
+            if term_id is None:
+                continue
+            if not mask.any():
+                doc_freq += segment.doc_freq(term_id)
+                continue
+            _, doc_numbers, _ = segment.postings.decode_term(term_id)
+            doc_freq += int((~mask[doc_numbers]).sum())
+        return doc_freq
 
     def get_tf(self, doc_id: int, term: str) -> int:
         tokens = tokenize_text(term)
         if len(tokens) != 1:
             raise ValueError("term must be a single token")
-        token = tokens[0]
-        return self.term_frequencies[doc_id][token]
+        location = self.__locate(doc_id)
+        if location is None:
+            return 0
+        segment = self.segments[location[0]]
+        term_id = segment.term_id(tokens[0])
+        if term_id is None:
+            return 0
+        return segment.get_tf(location[1], term_id)
 
     def get_idf(self, term: str) -> float:
         tokens = tokenize_text(term)
         if len(tokens) != 1:
             raise ValueError("term must be a single token")
-        token = tokens[0]
-        doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
-        return math.log((doc_count + 1) / (term_doc_count + 1))
+        term_doc_count = self.__doc_freq(tokens[0])
+        return math.log((self.doc_count + 1) / (term_doc_count + 1))
 
     def get_bm25_idf(self, term: str) -> float:
         tokens = tokenize_text(term)
         if len(tokens) != 1:
             raise ValueError("term must be a single token")
-        token = tokens[0]
-        doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
-        return math.log((doc_count - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
+        return float(bm25_idf(self.doc_count, self.__doc_freq(tokens[0])))
 
     def get_bm25_tf(
         self, doc_id: int, term: str, k1: float = BM25_K1, b: float = BM25_B
     ) -> float:
         tf = self.get_tf(doc_id, term)
-        doc_length = self.doc_lengths.get(doc_id, 0)
-        avg_doc_length = self.__get_avg_doc_length()
-        if avg_doc_length > 0:
-            length_norm = 1 - b + b * (doc_length / avg_doc_length)
+        location = self.__locate(doc_id)
+        if location is None:
+            doc_length = self.avg_doc_length
         else:
-            length_norm = 1
-        return (tf * (k1 + 1)) / (tf + k1 * length_norm)
+            segment_index, doc_number = location
+            doc_length = self.segments[segment_index].doc_lengths[doc_number]
+        return float(bm25_tf(tf, doc_length, self.avg_doc_length, k1, b))
 
     def get_tf_idf(self, doc_id: int, term: str) -> float:
         tf = self.get_tf(doc_id, term)
         idf = self.get_idf(term)
         return tf * idf
 
-    def __get_avg_doc_length(self) -> float:
-        if not self.doc_lengths or len(self.doc_lengths) == 0:
-            return 0.0
-        total_length = 0
-        for length in self.doc_lengths.values():
-            total_length += length
-        return total_length / len(self.doc_lengths)
-
     def bm25(self, doc_id: int, term: str) -> float:
         tf_component = self.get_bm25_tf(doc_id, term)
         idf_component = self.get_bm25_idf(term)
         return tf_component * idf_component
 
     def bm25_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
-        query_tokens = tokenize_text(query)
+        """Movies ranked by BM25, as read from the quantized impacts
+
+        Every segment is scored from its own impacts, with each term's IDF
+        taken over the live movies of the whole index. Each term so adds its
+        BM25 rounded to one of 255 levels, with the length normalized by the
+        average of the movie's segment. Updates elsewhere in the index only
+        move a movie's score through the IDF.
+        """
+        query_terms = Counter(tokenize_text(query))
+        return self.__format_results(self.__bm25_top_docs(query_terms, limit))
+
+    def prefix_search(
+        self, query: str, limit: int = DEFAULT_SEARCH_LIMIT
+    ) -> list[dict]:
+        """bm25_search where words with a * or ? are OR-ed expansions"""
+        query_terms: Counter = Counter()
+        for word in query.split():
+            if is_wildcard(word):
+                query_terms.update(self.expand_terms(word))
+            else:
+                query_terms.update(tokenize_text(word))
+        return self.__format_results(self.__bm25_top_docs(query_terms, limit))
+
+    def expand_terms(self, pattern: str, limit: int | None = None) -> list[str]:
+        """Index terms matching a wildcard pattern, most frequent first
+
+        With a limit, only that many of the most frequent terms are kept.
+        """
+        pattern = preprocess_pattern(pattern)
+        doc_freqs: Counter = Counter()
+        for segment in self.segments:
+            term_ids = segment.terms.expand(pattern)
+            if not len(term_ids):
+                continue
+            first, end = int(term_ids[0]), int(term_ids[-1]) + 1
+            terms = segment.terms.terms(first, end)
+            for term_id, doc_freq in zip(
+                term_ids.tolist(),
+                (
+                    segment.term_offsets[term_ids + 1] - segment.term_offsets[term_ids]
+                ).tolist(),
+            ):
+                doc_freqs[terms[term_id - first]] += doc_freq
+        return [term for term, _ in doc_freqs.most_common(limit)]
+
+    def autocomplete(self, text: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
+        """Movies whose titles match text as it is being typed
+
+        Every finished word has to be in the title. Unless text ends with a
+        space, its last word is unfinished and stands for its
+        AUTOCOMPLETE_MAX_EXPANSIONS most common completions, one of which has
+        to be in the title. Titles are ranked by title-only BM25, counting
+        the best completion.
+        """
+        words = text.split()
+        partial = ""
+        if words and not text[-1].isspace():
+            partial = preprocess_text(words.pop())
+        groups = [[token] for token in dict.fromkeys(tokenize_text(" ".join(words)))]
+        if partial:
+            groups.append(self.expand_terms(f"{partial}*", AUTOCOMPLETE_MAX_EXPANSIONS))
+        if not groups or not all(groups) or limit <= 0:
+            return []
+
+        # live title postings of every term, and their global doc freqs
+        vocabulary = list(dict.fromkeys(token for group in groups for token in group))
+        doc_freqs = np.zeros(len(vocabulary), dtype=np.int64)
+        title_postings = []
+        for segment, mask in zip(self.segments, self.deleted):
+            rows, doc_numbers, title_tfs = segment.title_postings(vocabulary)
+            live = ~mask[doc_numbers]
+            doc_freqs += np.bincount(rows[live], minlength=len(vocabulary))
+            keep = live & (title_tfs > 0)
+            title_postings.append((rows[keep], doc_numbers[keep], title_tfs[keep]))
+
+        k1 = self.impact_params[0]
+        idfs = bm25_idf(self.doc_count, doc_freqs)
+        group_rows = [[vocabulary.index(token) for token in group] for group in groups]
+        top_docs = []
+        for segment_index, (rows, doc_numbers, title_tfs) in enumerate(title_postings):
+            segment = self.segments[segment_index]
+            title_lengths = segment.title_lengths[doc_numbers]
+            scores = idfs[rows] * bm25_tf(
+                title_tfs, title_lengths, self.avg_title_length, k1, BM25F_TITLE_B
+            )
+            candidates, totals = None, None
+            for group in group_rows:
+                # a group counts once per doc, with its best term
+                in_group = np.isin(rows, group)
+                group_docs, group_scores = max_per_doc(
+                    doc_numbers[in_group], scores[in_group]
+                )
+                if candidates is None:
+                    candidates, totals = group_docs, group_scores
+                    continue
+                candidates, kept, matched = np.intersect1d(
+                    candidates, group_docs, assume_unique=True, return_indices=True
+                )
+                totals = totals[kept] + group_scores[matched]
+            top_docs.extend(
+                (segment_index, doc_id, score)
+                for doc_id, score in select_top_k(
+                    segment.doc_ids[candidates], totals, limit
+                )
+            )
+
+        top_docs.sort(key=lambda top_doc: (-top_doc[2], top_doc[1]))
+        return self.__format_results(top_docs[:limit])
+
+    def __bm25_top_docs(
+        self, query_terms: Counter, limit: int
+    ) -> list[tuple[int, int, float]]:
+        if limit <= 0 or not self.segments:
+            return []
+        top_docs = []
+        for segment_index, (segment, mask, term_weights) in enumerate(
+            zip(self.segments, self.deleted, self.__impact_weights(query_terms))
+        ):
+            top_docs.extend(
+                (segment_index, int(segment.doc_ids[doc_number]), score)
+                for doc_number, score in segment.impact_top_k(
+                    term_weights, limit, mask if mask.any() else None
+                )
+            )
+        top_docs.sort(key=lambda top_doc: (-top_doc[2], top_doc[1]))
+        return top_docs[:limit]
+
+    def __impact_weights(self, query_terms: Counter) -> list[dict[int, float]]:
+        """For every segment, what to multiply the impacts of each query term
+        found in it by
+
+        A segment's impacts were quantized with the IDF of the segment alone,
+        which the weights trade for the IDF over the live movies of the index.
+        """
+        term_ids = [
+            {token: segment.term_id(token) for token in query_terms}
+            for segment in self.segments
+        ]
+        doc_freqs: Counter = Counter()
+        for segment, mask, segment_term_ids in zip(
+            self.segments, self.deleted, term_ids
+        ):
+            for token, term_id in segment_term_ids.items():
+                if term_id is None:
+                    continue
+                if mask.any():
+                    _, doc_numbers, _ = segment.postings.decode_term(term_id)
+                    doc_freqs[token] += int((~mask[doc_numbers]).sum())
+                else:
+                    doc_freqs[token] += segment.doc_freq(term_id)
+
+        weights = []
+        for segment, segment_term_ids in zip(self.segments, term_ids):
+            weights.append(
+                {
+                    term_id: query_terms[token]
+                    * float(segment.impact_scales[term_id])
+                    * segment.idf_ratio(term_id, self.doc_count, doc_freqs[token])
+                    for token, term_id in segment_term_ids.items()
+                    if term_id is not None
+                }
+            )
+        return weights
+
+    def bm25_search_many(
+        self, queries: list[str], limit: int = DEFAULT_SEARCH_LIMIT
+    ) -> list[list[dict]]:
+        """bm25_search for a batch of queries
 
-        scores = {}
-        for doc_id in self.docmap:
-            score = 0.0
-            for token in query_tokens:
-                score += self.bm25(doc_id, token)
-            scores[doc_id] = score
+        Scores every query at once as a sparse product of a query-term matrix
+        with the BM25 weights of the batch's terms (one row per term, one
+        column per doc of every segment), and returns the same results as
+        calling bm25_search for each query.
+        """
+        if limit <= 0 or not self.segments:
+            return [[] for _ in queries]
+        query_terms = [Counter(tokenize_text(query)) for query in queries]
+        vocabulary = sorted(set().union(*query_terms))
+        term_rows = {token: row for row, token in enumerate(vocabulary)}
+        query_matrix = SparseMatrix.from_rows(
+            [
+                (
+                    np.array([term_rows[token] for token in terms], dtype=np.int64),
+                    np.array(list(terms.values()), dtype=np.float64),
+                )
+                for terms in query_terms
+            ],
+            len(vocabulary),
+        )
 
-        sorted_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        column_offsets = np.zeros(len(self.segments) + 1, dtype=np.int64)
+        np.cumsum(
+            [len(segment.doc_ids) for segment in self.segments],
+            out=column_offsets[1:],
+        )
+        weight_matrix = SparseMatrix.from_rows(
+            [self.__term_weights(token, column_offsets) for token in vocabulary],
+            int(column_offsets[-1]),
+        )
+        tie_breakers = np.concatenate([segment.doc_ids for segment in self.segments])
 
         results = []
-        for doc_id, score in sorted_docs[:limit]:
-            doc = self.docmap[doc_id]
+        for top_columns in matmul_top_k(
+            query_matrix, weight_matrix, tie_breakers, limit
+        ):
+            top_docs = []
+            for column, score in top_columns:
+                segment_index = (
+                    int(np.searchsorted(column_offsets, column, "right")) - 1
+                )
+                doc_number = column - column_offsets[segment_index]
+                doc_id = int(self.segments[segment_index].doc_ids[doc_number])
+                top_docs.append((segment_index, doc_id, score))
+            results.append(self.__format_results(top_docs))
+        return results
+
+    def __term_weights(
+        self, token: str, column_offsets: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Columns and BM25 weights of the live docs containing token, from
+        the same impacts and IDF bm25_search ranks them by
+        """
+        live_postings = []
+        for segment_index, (segment, mask) in enumerate(
+            zip(self.segments, self.deleted)
+        ):
+            term_id = segment.term_id(token)
+            if term_id is None:
+                continue
+            positions, doc_numbers, _ = segment.postings.decode_term(term_id)
+            live = ~mask[doc_numbers]
+            live_postings.append(
+                (segment_index, term_id, positions[live], doc_numbers[live])
+            )
+        if not live_postings:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+        doc_freq = sum(len(doc_numbers) for _, _, _, doc_numbers in live_postings)
+        columns, weights = [], []
+        for segment_index, term_id, positions, doc_numbers in live_postings:
+            segment = self.segments[segment_index]
+            weight = float(segment.impact_scales[term_id]) * segment.idf_ratio(
+                term_id, self.doc_count, doc_freq
+            )
+            columns.append(column_offsets[segment_index] + doc_numbers)
+            weights.append(segment.postings_impacts[positions] * weight)
+        return np.concatenate(columns), np.concatenate(weights)
+
+    def bm25f_search(
+        self,
+        query: str,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+        title_weight: float = BM25F_TITLE_WEIGHT,
+        description_weight: float = BM25F_DESCRIPTION_WEIGHT,
+        title_b: float = BM25F_TITLE_B,
+        description_b: float = BM25F_DESCRIPTION_B,
+        k1: float = BM25_K1,
+    ) -> list[dict]:
+        """BM25 over per-field term frequencies and length norms
+
+        Field weights and length normalization are applied at query time, so
+        they can be tuned without rebuilding the index.
+        """
+        query_terms = Counter(tokenize_text(query))
+        if limit <= 0 or not self.segments:
+            return []
+
+        def term_scores(
+            segment: IndexSegment,
+            postings: np.ndarray,
+            doc_numbers: np.ndarray,
+            tfs: np.ndarray,
+        ) -> np.ndarray:
+            title_tfs = segment.title_tfs[postings].astype(np.float64)
+            title_lengths = segment.title_lengths[doc_numbers]
+            description_lengths = segment.doc_lengths[doc_numbers] - title_lengths
+            weighted_tfs = title_weight * title_tfs / length_norms(
+                title_lengths, self.avg_title_length, title_b
+            ) + description_weight * (tfs - title_tfs) / length_norms(
+                description_lengths, self.avg_description_length, description_b
+            )
+            return (weighted_tfs * (k1 + 1)) / (weighted_tfs + k1)
+
+        top_docs = self.__segmented_top_k(query_terms, limit, term_scores)
+        return self.__format_results(top_docs)
+
+    def __format_results(self, top_docs: list[tuple[int, int, float]]) -> list[dict]:
+        segment_indices = np.array([top_doc[0] for top_doc in top_docs], dtype=int)
+        doc_ids = np.array([top_doc[1] for top_doc in top_docs], dtype=np.int64)
+        dense_ids = np.zeros(len(top_docs), dtype=np.int64)
+        for segment_index, segment in enumerate(self.segments):
+            rows = np.flatnonzero(segment_indices == segment_index)
+            if len(rows):
+                doc_numbers = segment.doc_numbers(doc_ids[rows])
+                dense_ids[rows] = segment.store_ids[doc_numbers]
+
+        results = []
+        for (_, _, score), doc in zip(top_docs, self.store.get_many(dense_ids)):
             formatted_result = format_search_result(
                 doc_id=doc["id"],
                 title=doc["title"],
@@ -148,55 +1188,440 @@ class InvertedIndex:
 
         return results
 
+    def __segmented_top_k(
+        self,
+        query_terms: Counter,
+        limit: int,
+        term_scores: Callable[
+            [IndexSegment, np.ndarray, np.ndarray, np.ndarray], np.ndarray
+        ],
+    ) -> list[tuple[int, int, float]]:
+        """Exhaustive top-k with global statistics, over every live posting
+
+        term_scores gets a segment and the live postings of one query term
+        (posting positions, doc numbers and term frequencies) and returns
+        their scores before the IDF.
+        """
+        doc_freqs: Counter = Counter()
+        matches = []
+        for segment, mask in zip(self.segments, self.deleted):
+            segment_matches = []
+            for token, query_tf in query_terms.items():
+                term_id = segment.term_id(token)
+                if term_id is None:
+                    continue
+                postings, doc_numbers, tfs = segment.postings.decode_term(term_id)
+                live = ~mask[doc_numbers]
+                segment_matches.append(
+                    (token, query_tf, postings[live], doc_numbers[live], tfs[live])
+                )
+                doc_freqs[token] += int(live.sum())
+            matches.append(segment_matches)
+
+        top_docs = []
+        for segment_index, segment_matches in enumerate(matches):
+            segment = self.segments[segment_index]
+            scores = np.zeros(len(segment.doc_ids))
+            matched = []
+            for token, query_tf, postings, doc_numbers, tfs in segment_matches:
+                idf = bm25_idf(self.doc_count, doc_freqs[token])
+                scores[doc_numbers] += (query_tf * idf) * term_scores(
+                    segment, postings, doc_numbers, tfs
+                )
+                matched.append(doc_numbers)
+            if not matched:
+                continue
+            candidates = np.unique(np.concatenate(matched))
+            # ties go to the lower movie id, wherever the movies live
+            top_docs.extend(
+                (segment_index, doc_id, score)
+                for doc_id, score in select_top_k(
+                    segment.doc_ids[candidates], scores[candidates], limit
+                )
+            )
+
+        top_docs.sort(key=lambda top_doc: (-top_doc[2], top_doc[1]))
+        return top_docs[:limit]
+
+    def boolean_search(
+        self, query: str, limit: int = DEFAULT_SEARCH_LIMIT
+    ) -> list[dict]:
+        node = BooleanQueryParser(tokenize_text, preprocess_pattern).parse(query)
+        if node is None or limit <= 0:
+            return []
+
+        matches = []
+        for segment_index, (segment, mask) in enumerate(
+            zip(self.segments, self.deleted)
+        ):
+            doc_numbers = segment.match(node)
+            doc_numbers = doc_numbers[~mask[doc_numbers]]
+            # only the lowest limit movie ids of each segment can make the cut
+            order = np.argsort(segment.doc_ids[doc_numbers], kind="stable")[:limit]
+            matches.extend(
+                (int(segment.doc_ids[doc_number]), segment_index, int(doc_number))
+                for doc_number in doc_numbers[order]
+            )
+        matches.sort()
+        return [
+            self.__stored_document(segment_index, doc_number)
+            for _, segment_index, doc_number in matches[:limit]
+        ]
+
+    def phrase_search(
+        self, query: str, within: int = 0, limit: int = DEFAULT_SEARCH_LIMIT
+    ) -> list[dict]:
+        tokens, positions = get_tokenizer().tokenize_positions(query)
+        if not tokens or limit <= 0:
+            return []
+        offsets = [position - positions[0] for position in positions]
+
+        doc_ids, counts, locations = [], [], {}
+        for segment_index, (segment, mask) in enumerate(
+            zip(self.segments, self.deleted)
+        ):
+            doc_numbers, phrase_counts = segment.phrase_counts(tokens, offsets, within)
+            live = ~mask[doc_numbers]
+            segment_doc_ids = segment.doc_ids[doc_numbers[live]]
+            for doc_id, doc_number in zip(
+                segment_doc_ids.tolist(), doc_numbers[live].tolist()
+            ):
+                locations[doc_id] = (segment_index, doc_number)
+            doc_ids.append(segment_doc_ids)
+            counts.append(phrase_counts[live])
+        if not locations:
+            return []
+
+        results = []
+        for doc_id, count in select_top_k(
+            np.concatenate(doc_ids), np.concatenate(counts), limit
+        ):
+            doc = self.__stored_document(*locations[doc_id])
+            formatted_result = format_search_result(
+                doc_id=doc["id"],
+                title=doc["title"],
+                document=doc["description"],
+                score=int(count),
+            )
+            results.append(formatted_result)
+
+        return results
+
+
+def bm25_idf(doc_count: int, doc_freqs: np.ndarray | int) -> np.ndarray:
+    return np.log((doc_count - doc_freqs + 0.5) / (doc_freqs + 0.5) + 1)
+
+
+def bm25_tf(
+    tfs: np.ndarray | int,
+    doc_lengths: np.ndarray | int,
+    avg_doc_length: float,
+    k1: float = BM25_K1,
+    b: float = BM25_B,
+) -> np.ndarray:
+    tfs = np.asarray(tfs, dtype=np.float64)
+    return (tfs * (k1 + 1)) / (tfs + k1 * length_norms(doc_lengths, avg_doc_length, b))
+
+
+def length_norms(
+    doc_lengths: np.ndarray | int, avg_doc_length: float, b: float = BM25_B
+) -> np.ndarray:
+    if avg_doc_length <= 0:
+        return np.ones(np.shape(doc_lengths))
+    return 1 - b + b * (np.asarray(doc_lengths) / avg_doc_length)
+
+
+def max_per_doc(
+    doc_numbers: np.ndarray, scores: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Sorted unique doc numbers with the highest of their scores"""
+    order = np.lexsort((-scores, doc_numbers))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = doc_numbers[order[1:]] != doc_numbers[order[:-1]]
+    return doc_numbers[order[first]], scores[order[first]]
+
+
+class SharedIndex:
+    """A read-only InvertedIndex loaded from one version of manifest.json"""
+
+    def __init__(self, version: tuple[int, int, int] | None) -> None:
+        self.version = version
+        self.references = 0
+        self.index = InvertedIndex(read_only=True)
+        self.index.load()
+
+    def close(self) -> None:
+        # drop the memmaps now instead of whenever the snapshot is collected
+        self.index.segments, self.index.deleted = [], []
+
+
+_shared_index: SharedIndex | None = None
+_shared_index_lock = threading.Lock()
+
+
+@contextmanager
+def open_index() -> Iterator[InvertedIndex]:
+    """The process-wide read-only index, reopened when manifest.json changes
+
+    Readers keep the snapshot they opened even if a writer commits in the
+    meantime; a replaced snapshot is closed once its last reader is done.
+    Its decoded term blocks, impacts and doc order survive across queries.
+    """
+    global _shared_index
+    with _shared_index_lock:
+        version = manifest_version()
+        if _shared_index is None or _shared_index.version != version:
+            previous = _shared_index
+            _shared_index = SharedIndex(version)
+            if previous is not None and previous.references == 0:
+                previous.close()
+        shared = _shared_index
+        shared.references += 1
+    try:
+        yield shared.index
+    finally:
+        with _shared_index_lock:
+            shared.references -= 1
+            if shared.references == 0 and shared is not _shared_index:
+                shared.close()
+
+
+def manifest_version() -> tuple[int, int, int] | None:
+    # manifest.json is replaced, never rewritten, so any commit changes this
+    try:
+        stat = os.stat(os.path.join(INVERTED_INDEX_DIR, "manifest.json"))
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
 
-def build_command() -> None:
+def merge_in_background() -> threading.Thread:
+    # a separate handle, so the caller's index is never mutated mid-query
+    thread = threading.Thread(target=InvertedIndex().merge, name="index-merge")
+    thread.start()
+    return thread
+
+
+def build_command(
+    k1: float = BM25_K1, b: float = BM25_B, workers: int = 1, positions: bool = False
+) -> None:
+    idx = InvertedIndex()
+    idx.build(k1, b, workers, positions)
+
+
+def update_command() -> tuple[int, int]:
+    idx = InvertedIndex()
+    if not os.path.exists(idx.index_path):
+        idx.build()
+        return idx.doc_count, 0
+    return idx.update(load_movies())
+
+
+def delete_command(doc_ids: list[int]) -> int:
+    idx = InvertedIndex()
+    return idx.delete(doc_ids)
+
+
+def merge_command() -> None:
     idx = InvertedIndex()
-    idx.build()
-    idx.save()
+    idx.merge()
+
+
+def invert_shard(shard: tuple[int, list[tuple[str, str]], bool]) -> dict:
+    first_doc_number, fields, with_positions = shard
+    tokenizer = get_tokenizer()
+    postings: defaultdict[str, list[tuple[int, int, int]]] = defaultdict(list)
+    positions: defaultdict[str, list[int]] = defaultdict(list)
+    doc_lengths, title_lengths = [], []
+    for doc_number, (title, description) in enumerate(fields, start=first_doc_number):
+        text = f"{title} {description}"
+        # the title's tokens are the first ones of the combined text
+        title_length = len(tokenizer.tokenize(title))
+        if with_positions:
+            tokens, token_positions = tokenizer.tokenize_positions(text)
+            doc_positions: defaultdict[str, list[int]] = defaultdict(list)
+            for token, position in zip(tokens, token_positions):
+                doc_positions[token].append(position)
+        else:
+            tokens = tokenizer.tokenize(text)
+        title_tfs = Counter(tokens[:title_length])
+        for token, tf in Counter(tokens).items():
+            postings[token].append((doc_number, tf, title_tfs[token]))
+            if with_positions:
+                positions[token].extend(doc_positions[token])
+        doc_lengths.append(len(tokens))
+        title_lengths.append(title_length)
+
+    terms = sorted(postings)
+    flat_postings = [posting for term in terms for posting in postings[term]]
+    flat_array = np.array(flat_postings, dtype=np.int32).reshape(-1, 3)
+    shard = {
+        "terms": terms,
+        "doc_freqs": np.array([len(postings[term]) for term in terms], np.int64),
+        "doc_numbers": flat_array[:, 0],
+        "tfs": flat_array[:, 1],
+        "title_tfs": np.minimum(flat_array[:, 2], np.iinfo(np.uint8).max).astype(
+            np.uint8
+        ),
+        "doc_lengths": np.array(doc_lengths, dtype=np.int32),
+        "title_lengths": np.array(title_lengths, dtype=np.int32),
+    }
+    if with_positions:
+        shard["positions"] = np.array(
+            [position for term in terms for position in positions[term]],
+            dtype=np.int32,
+        )
+    return shard
+
+
+def merge_shards(shards: list[dict]) -> dict:
+    terms = sorted(set().union(*(shard["terms"] for shard in shards)))
+    term_ids = {term: term_id for term_id, term in enumerate(terms)}
+
+    posting_terms = []
+    for shard in shards:
+        shard_term_ids = np.array(
+            [term_ids[term] for term in shard["terms"]], dtype=np.int64
+        )
+        posting_terms.append(np.repeat(shard_term_ids, shard["doc_freqs"]))
+    posting_terms = np.concatenate(posting_terms)
+
+    # shards cover ascending doc ranges, so a stable sort keeps docs sorted
+    order = np.argsort(posting_terms, kind="stable")
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(posting_terms, minlength=len(terms)), out=term_offsets[1:])
+    merged = {"terms": terms, "term_offsets": term_offsets}
+    for name in ("doc_numbers", "tfs", "title_tfs"):
+        merged[name] = np.concatenate([shard[name] for shard in shards])[order]
+    for name in ("doc_lengths", "title_lengths"):
+        merged[name] = np.concatenate([shard[name] for shard in shards])
+
+    if all("positions" in shard for shard in shards):
+        shard_tfs = np.concatenate([shard["tfs"] for shard in shards])
+        shard_positions = np.concatenate([shard["positions"] for shard in shards])
+        starts = np.cumsum(shard_tfs, dtype=np.int64) - shard_tfs
+        merged["positions"] = shard_positions[
+            range_indices(starts[order], merged["tfs"])
+        ]
+    return merged
 
 
 def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
     idx = InvertedIndex()
     idx.load()
-    query_tokens = tokenize_text(query)
-    seen, results = set(), []
-    for query_token in query_tokens:
-        matching_doc_ids = idx.get_documents(query_token)
-        for doc_id in matching_doc_ids:
-            if doc_id in seen:
-                continue
-            seen.add(doc_id)
-            doc = idx.docmap[doc_id]
-            results.append(doc)
-            if len(results) >= limit:
-                return results
+    return idx.boolean_search(query, limit)
 
-    return results
+
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+
+PATTERN_PUNCTUATION_TABLE = str.maketrans(
+    "",
+    "",
+    "".join(c for c in string.punctuation if c not in WILDCARD_CHARACTERS),
+)
 
 
 def preprocess_text(text: str) -> str:
     text = text.lower()
-    text = text.translate(str.maketrans("", "", string.punctuation))
+    text = text.translate(PUNCTUATION_TABLE)
     return text
 
 
+def preprocess_pattern(pattern: str) -> str:
+    """preprocess_text for wildcard patterns, which match stemmed terms
+
+    The literal part of a prefix pattern is cut back to where its stem
+    departs from it, so "terminator*" becomes "termin*".
+    """
+    pattern = pattern.lower().translate(PATTERN_PUNCTUATION_TABLE)
+    prefix = pattern[:-1]
+    if pattern.endswith("*") and prefix and not is_wildcard(prefix):
+        stem = get_tokenizer().stem(prefix)
+        pattern = f"{os.path.commonprefix([prefix, stem])}*"
+    return pattern
+
+
+class Tokenizer:
+    def __init__(
+        self,
+        stopwords: Iterable[str] | None = None,
+        stem_cache_size: int = STEM_CACHE_SIZE,
+    ) -> None:
+        if stopwords is None:
+            stopwords = load_stopwords()
+        self.stopwords = frozenset(stopwords)
+        self.stemmer = porter_stemmer()
+        self.stem = lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
+
+    def tokenize(self, text: str) -> list[str]:
+        stopwords = self.stopwords
+        stem = self.stem
+        return [
+            stem(word)
+            for word in preprocess_text(text).split()
+            if word not in stopwords
+        ]
+
+    def tokenize_many(self, texts: Iterable[str]) -> list[list[str]]:
+        return [self.tokenize(text) for text in texts]
+
+    def tokenize_positions(self, text: str) -> tuple[list[str], list[int]]:
+        """Tokens with their word positions, counting the dropped stopwords"""
+        stopwords = self.stopwords
+        stem = self.stem
+        tokens, positions = [], []
+        for position, word in enumerate(preprocess_text(text).split()):
+            if word in stopwords:
+                continue
+            tokens.append(stem(word))
+            positions.append(position)
+        return tokens, positions
+
+
+_default_tokenizer: Tokenizer | None = None
+
+
+def get_tokenizer() -> Tokenizer:
+    global _default_tokenizer
+    if _default_tokenizer is None:
+        _default_tokenizer = Tokenizer()
+    return _default_tokenizer
+
+
 def tokenize_text(text: str) -> list[str]:
-    text = preprocess_text(text)
-    tokens = text.split()
-    valid_tokens = []
-    for token in tokens:
-        if token:
-            valid_tokens.append(token)
-    stop_words = load_stopwords()
-    filtered_words = []
-    for word in valid_tokens:
-        if word not in stop_words:
-            filtered_words.append(word)
-    stemmer = PorterStemmer()
-    stemmed_words = []
-    for word in filtered_words:
-        stemmed_words.append(stemmer.stem(word))
-    return stemmed_words
+    return get_tokenizer().tokenize(text)
+
+
+def bm25f_search_command(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    title_weight: float = BM25F_TITLE_WEIGHT,
+    description_weight: float = BM25F_DESCRIPTION_WEIGHT,
+) -> list[dict]:
+    idx = InvertedIndex()
+    idx.load()
+    return idx.bm25f_search(query, limit, title_weight, description_weight)
+
+
+def prefix_search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
+    idx = InvertedIndex()
+    idx.load()
+    return idx.prefix_search(query, limit)
+
+
+def autocomplete_command(text: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
+    idx = InvertedIndex()
+    idx.load()
+    return idx.autocomplete(text, limit)
+
+
+def phrase_command(
+    query: str, within: int = 0, limit: int = DEFAULT_SEARCH_LIMIT
+) -> list[dict]:
+    idx = InvertedIndex()
+    idx.load()
+    return idx.phrase_search(query, within, limit)
 
 
 def tf_command(doc_id: int, term: str) -> int:
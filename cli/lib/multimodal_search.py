@@ -1,11 +1,11 @@
 from PIL import Image
-from sentence_transformers import SentenceTransformer
+from lib.resources import sentence_transformer
 from lib.semantic_search import cosine_similarity
 # from transformers import AutoModel
 
 class MultimodalSearch():
     def __init__(self, model_name="clip-ViT-B-32", docs: list[dict]=[]):
-        self.model = SentenceTransformer(model_name)
+        self.model = sentence_transformer(model_name)
         self.documents = docs
         self.texts: list[str] = []
 
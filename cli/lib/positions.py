@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+
+from .postings import CompressedPostings, intersect_sorted, range_indices
+
+
+class PostingPositions:
+    """Word positions of every posting, stored in posting order
+
+    A posting has as many positions as its term frequency, so only block
+    boundaries are recorded; positions inside a block follow from the
+    block's decoded term frequencies.
+    """
+
+    ARRAY_NAMES = ("block_position_offsets", "positions")
+
+    def __init__(self, block_position_offsets: np.ndarray, positions: np.ndarray):
+        self.block_position_offsets = block_position_offsets
+        self.positions = positions
+
+    @classmethod
+    def encode(
+        cls, postings: CompressedPostings, tfs: np.ndarray, positions: np.ndarray
+    ) -> "PostingPositions":
+        posting_offsets = np.zeros(len(tfs) + 1, dtype=np.int64)
+        np.cumsum(tfs, out=posting_offsets[1:])
+        return cls(
+            block_position_offsets=posting_offsets[postings.block_posting_offsets],
+            positions=np.asarray(positions, dtype=np.int32),
+        )
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str) -> "PostingPositions":
+        arrays = {}
+        for name in cls.ARRAY_NAMES:
+            path = os.path.join(directory, f"{name}.npy")
+            arrays[name] = np.load(path, mmap_mode="r")
+        return cls(**arrays)
+
+    def posting_starts(
+        self, postings: CompressedPostings, blocks: np.ndarray, tfs: np.ndarray
+    ) -> np.ndarray:
+        """Offset into positions of every posting decoded from blocks"""
+        block_lengths = (
+            postings.block_posting_offsets[blocks + 1]
+            - postings.block_posting_offsets[blocks]
+        )
+        before = np.cumsum(tfs, dtype=np.int64) - tfs
+        block_starts = np.cumsum(block_lengths) - block_lengths
+        return before + np.repeat(
+            self.block_position_offsets[blocks] - before[block_starts], block_lengths
+        )
+
+    def take(self, starts: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+        return self.positions[range_indices(starts, tfs)]
+
+
+def position_keys(doc_numbers: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    return (doc_numbers.astype(np.int64) << 32) + positions
+
+
+def phrase_starts(keys: list[np.ndarray], offsets: list[int]) -> np.ndarray:
+    """Start keys of the places where every term sits at its phrase offset
+
+    keys are position_keys of each phrase term; matching the rarest term
+    first keeps the intermediate result small.
+    """
+    order = np.argsort([len(term_keys) for term_keys in keys], kind="stable")
+    matches = keys[order[0]] - offsets[order[0]]
+    for i in order[1:]:
+        matches = intersect_sorted(matches, keys[i] - offsets[i])
+    return matches
+
+
+def proximity_anchors(keys: list[np.ndarray], within: int) -> np.ndarray:
+    """Keys of the first term that have every other term within reach"""
+    anchors = keys[0]
+    for term_keys in sorted(keys[1:], key=len):
+        if len(anchors) == 0 or len(term_keys) == 0:
+            return anchors[:0]
+        after = np.minimum(np.searchsorted(term_keys, anchors), len(term_keys) - 1)
+        before = np.maximum(after - 1, 0)
+        near = (np.abs(term_keys[after] - anchors) <= within) | (
+            np.abs(term_keys[before] - anchors) <= within
+        )
+        anchors = anchors[near]
+    return anchors
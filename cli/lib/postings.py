@@ -0,0 +1,255 @@
+import os
+
+import numpy as np
+
+from .search_utils import POSTINGS_BLOCK_SIZE
+
+
+class CompressedPostings:
+    """Block-packed postings lists
+
+    Each term's postings are cut into blocks of POSTINGS_BLOCK_SIZE. Inside a
+    block, doc numbers are stored as bit-packed deltas from the block's first
+    doc and term frequencies as bit-packed `tf - 1`, each with the smallest
+    bit width that fits the block. Blocks that share a length and bit widths
+    are decoded together with a handful of vectorized NumPy operations.
+    """
+
+    ARRAY_NAMES = (
+        "term_block_offsets",
+        "block_posting_offsets",
+        "block_data_offsets",
+        "block_first_docs",
+        "block_last_docs",
+        "block_doc_bits",
+        "block_tf_bits",
+        "postings_data",
+    )
+
+    def __init__(
+        self,
+        term_block_offsets: np.ndarray,
+        block_posting_offsets: np.ndarray,
+        block_data_offsets: np.ndarray,
+        block_first_docs: np.ndarray,
+        block_last_docs: np.ndarray,
+        block_doc_bits: np.ndarray,
+        block_tf_bits: np.ndarray,
+        postings_data: np.ndarray,
+    ) -> None:
+        self.term_block_offsets = term_block_offsets
+        self.block_posting_offsets = block_posting_offsets
+        self.block_data_offsets = block_data_offsets
+        self.block_first_docs = block_first_docs
+        self.block_last_docs = block_last_docs
+        self.block_doc_bits = block_doc_bits
+        self.block_tf_bits = block_tf_bits
+        self.postings_data = postings_data
+
+    @classmethod
+    def encode(
+        cls, term_offsets: np.ndarray, doc_numbers: np.ndarray, tfs: np.ndarray
+    ) -> "CompressedPostings":
+        doc_freqs = np.diff(term_offsets)
+        blocks_per_term = -(-doc_freqs // POSTINGS_BLOCK_SIZE)
+        term_block_offsets = _offsets(blocks_per_term)
+        block_terms = np.repeat(np.arange(len(doc_freqs)), blocks_per_term)
+        block_ranks = (
+            np.arange(term_block_offsets[-1]) - term_block_offsets[block_terms]
+        )
+        block_starts = term_offsets[block_terms] + block_ranks * POSTINGS_BLOCK_SIZE
+        block_posting_offsets = np.append(block_starts, len(doc_numbers)).astype(
+            np.int64
+        )
+        block_lengths = np.diff(block_posting_offsets)
+
+        doc_numbers = np.asarray(doc_numbers, dtype=np.int64)
+        deltas = np.diff(doc_numbers, prepend=0)
+        deltas[block_starts] = 0
+        tf_values = np.asarray(tfs, dtype=np.int64) - 1
+
+        if len(block_starts):
+            block_doc_bits = _bit_width(np.maximum.reduceat(deltas, block_starts))
+            block_tf_bits = _bit_width(np.maximum.reduceat(tf_values, block_starts))
+        else:
+            block_doc_bits = np.array([], dtype=np.uint8)
+            block_tf_bits = np.array([], dtype=np.uint8)
+
+        doc_bytes = _packed_size(block_lengths, block_doc_bits)
+        tf_bytes = _packed_size(block_lengths, block_tf_bits)
+        block_data_offsets = _offsets(doc_bytes + tf_bytes)
+        postings_data = np.zeros(block_data_offsets[-1], dtype=np.uint8)
+
+        for blocks, length, doc_bits, tf_bits in _block_groups(
+            block_lengths, block_doc_bits, block_tf_bits
+        ):
+            rows = block_starts[blocks, None] + np.arange(length)
+            packed = np.concatenate(
+                [
+                    _pack(deltas[rows], doc_bits),
+                    _pack(tf_values[rows], tf_bits),
+                ],
+                axis=1,
+            )
+            columns = np.arange(packed.shape[1])
+            postings_data[block_data_offsets[blocks, None] + columns] = packed
+
+        return cls(
+            term_block_offsets=term_block_offsets,
+            block_posting_offsets=block_posting_offsets,
+            block_data_offsets=block_data_offsets,
+            block_first_docs=doc_numbers[block_starts].astype(np.int32),
+            block_last_docs=doc_numbers[block_posting_offsets[1:] - 1].astype(np.int32),
+            block_doc_bits=block_doc_bits,
+            block_tf_bits=block_tf_bits,
+            postings_data=postings_data,
+        )
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str) -> "CompressedPostings":
+        arrays = {}
+        for name in cls.ARRAY_NAMES:
+            path = os.path.join(directory, f"{name}.npy")
+            arrays[name] = np.load(path, mmap_mode="r")
+        return cls(**arrays)
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAY_NAMES)
+
+    def term_blocks(self, term_id: int) -> tuple[int, int]:
+        return (
+            int(self.term_block_offsets[term_id]),
+            int(self.term_block_offsets[term_id + 1]),
+        )
+
+    def decode_term(self, term_id: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        first_block, end_block = self.term_blocks(term_id)
+        return self.decode(np.arange(first_block, end_block))
+
+    def decode(self, blocks: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Decode the given blocks, in order
+
+        Returns the global posting positions (to index per-posting columns
+        such as impacts), the doc numbers and the term frequencies.
+        """
+        blocks = np.asarray(blocks, dtype=np.int64)
+        block_starts = self.block_posting_offsets[blocks]
+        block_lengths = self.block_posting_offsets[blocks + 1] - block_starts
+
+        doc_numbers = np.zeros((len(blocks), POSTINGS_BLOCK_SIZE), dtype=np.int32)
+        tfs = np.zeros((len(blocks), POSTINGS_BLOCK_SIZE), dtype=np.int32)
+        for group, length, doc_bits, tf_bits in _block_groups(
+            block_lengths,
+            self.block_doc_bits[blocks],
+            self.block_tf_bits[blocks],
+        ):
+            group_blocks = blocks[group]
+            doc_size = (length * doc_bits + 7) // 8
+            tf_size = (length * tf_bits + 7) // 8
+            columns = np.arange(doc_size + tf_size)
+            packed = self.postings_data[
+                self.block_data_offsets[group_blocks, None] + columns
+            ]
+            deltas = _unpack(packed[:, :doc_size], length, doc_bits)
+            np.cumsum(deltas, axis=1, out=deltas)
+            deltas += self.block_first_docs[group_blocks, None]
+            doc_numbers[group, :length] = deltas
+            tfs[group, :length] = _unpack(packed[:, doc_size:], length, tf_bits) + 1
+
+        positions = block_starts[:, None] + np.arange(POSTINGS_BLOCK_SIZE)
+        if np.all(block_lengths == POSTINGS_BLOCK_SIZE):
+            return positions.ravel(), doc_numbers.ravel(), tfs.ravel()
+        valid = np.arange(POSTINGS_BLOCK_SIZE) < block_lengths[:, None]
+        return positions[valid], doc_numbers[valid], tfs[valid]
+
+
+def range_indices(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + length) for every range"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    shifts = np.repeat(np.asarray(starts, dtype=np.int64) - (ends - lengths), lengths)
+    return np.arange(ends[-1] if len(ends) else 0) + shifts
+
+
+def intersect_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Values present in both sorted, duplicate-free arrays
+
+    The smaller array is searched into the larger one, so the cost follows
+    the rarer side, as with galloping intersection.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return a
+    found = np.searchsorted(b, a)
+    found[found == len(b)] = len(b) - 1
+    return a[b[found] == a]
+
+
+def subtract_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Values of sorted, duplicate-free a that are missing from sorted b"""
+    if len(a) == 0 or len(b) == 0:
+        return a
+    found = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[found] != a]
+
+
+def _offsets(sizes: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    return offsets
+
+
+def _bit_width(values: np.ndarray) -> np.ndarray:
+    widths = np.floor(np.log2(np.maximum(values, 1))) + 1
+    return np.where(values > 0, widths, 0).astype(np.uint8)
+
+
+def _packed_size(lengths: np.ndarray, bits: np.ndarray) -> np.ndarray:
+    return (lengths * bits.astype(np.int64) + 7) // 8
+
+
+def _block_groups(lengths: np.ndarray, doc_bits: np.ndarray, tf_bits: np.ndarray):
+    if len(lengths) == 0:
+        return
+    keys = (lengths * 64 + doc_bits.astype(np.int64)) * 64 + tf_bits
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(unique_keys) + 1))
+    for i, key in enumerate(unique_keys.tolist()):
+        group = order[bounds[i] : bounds[i + 1]]
+        yield group, key // 4096, (key // 64) % 64, key % 64
+
+
+def _pack(values: np.ndarray, bits: int) -> np.ndarray:
+    if bits == 0:
+        return np.zeros((len(values), 0), dtype=np.uint8)
+    rows, length = values.shape
+    bit_matrix = (values[:, :, None] >> np.arange(bits)) & 1
+    return np.packbits(
+        bit_matrix.astype(np.uint8).reshape(rows, length * bits),
+        axis=1,
+        bitorder="little",
+    )
+
+
+def _unpack(packed: np.ndarray, length: int, bits: int) -> np.ndarray:
+    if bits == 0:
+        return np.zeros((len(packed), length), dtype=np.int32)
+    word_type = np.dtype("<u4") if bits <= 25 else np.dtype("<u8")
+    padded = np.zeros(
+        (len(packed), packed.shape[1] + word_type.itemsize), dtype=np.uint8
+    )
+    padded[:, : packed.shape[1]] = packed
+    bit_offsets = np.arange(length) * bits
+    byte_columns = (bit_offsets >> 3)[:, None] + np.arange(word_type.itemsize)
+    words = np.ascontiguousarray(padded[:, byte_columns]).view(word_type)[..., 0]
+    shifts = (bit_offsets & 7).astype(word_type)
+    mask = word_type.type((1 << bits) - 1)
+    values = (words >> shifts) & mask
+    return values.astype(np.int32 if bits <= 25 else np.int64)
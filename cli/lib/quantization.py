@@ -0,0 +1,379 @@
+import os
+
+import numpy as np
+
+from .search_utils import (
+    BINARY_RESCORE_MULTIPLIER,
+    BINARY_SCAN_BLOCK_ROWS,
+    EMBEDDING_RESCORE_MULTIPLIER,
+    EMBEDDING_SCAN_BLOCK_ROWS,
+    PQ_KMEANS_ITERATIONS,
+    PQ_RESCORE_MULTIPLIER,
+    PQ_SCAN_BLOCK_ROWS,
+    PQ_SUBQUANTIZERS,
+    PQ_TRAIN_ROWS,
+)
+
+EMBEDDING_STORAGES = ("float32", "float16", "int8", "pq", "binary")
+
+
+class QuantizedEmbeddings:
+    """Embeddings stored as float16, or as int8 with one scale per dimension
+
+    An int8 code is round(x / scale), where scale is the dimension's largest
+    magnitude over 127, so codes @ (query * scales) approximates the float32
+    scores at a quarter of the size. Scans convert EMBEDDING_SCAN_BLOCK_ROWS
+    rows at a time to float32 for BLAS and never hold a full-size copy.
+    """
+
+    # candidates per result that exact rescoring looks at
+    rescore_multiplier = EMBEDDING_RESCORE_MULTIPLIER
+
+    def __init__(self, storage: str, codes: np.ndarray, scales: np.ndarray) -> None:
+        self.storage = storage
+        self.codes = codes
+        self.scales = scales
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    @classmethod
+    def quantize(cls, embeddings: np.ndarray, storage: str) -> "QuantizedEmbeddings":
+        dimensions = embeddings.shape[1]
+        if storage == "float16":
+            codes = np.empty(embeddings.shape, dtype=np.float16)
+            scales = np.ones(dimensions, dtype=np.float32)
+        elif storage == "int8":
+            codes = np.empty(embeddings.shape, dtype=np.int8)
+            scales = np.zeros(dimensions, dtype=np.float32)
+            for start in range(0, len(embeddings), EMBEDDING_SCAN_BLOCK_ROWS):
+                block = embeddings[start : start + EMBEDDING_SCAN_BLOCK_ROWS]
+                np.maximum(scales, np.abs(block).max(axis=0), out=scales)
+            scales = np.where(scales > 0, scales / 127, 1).astype(np.float32)
+        else:
+            raise ValueError(f"unknown embedding storage: {storage}")
+
+        for start in range(0, len(embeddings), EMBEDDING_SCAN_BLOCK_ROWS):
+            block = np.asarray(embeddings[start : start + EMBEDDING_SCAN_BLOCK_ROWS])
+            if storage == "int8":
+                block = np.clip(np.rint(block / scales), -127, 127)
+            codes[start : start + len(block)] = block
+        return cls(storage, codes, scales)
+
+    @classmethod
+    def load_or_create(
+        cls, embeddings_path: str, embeddings: np.ndarray, storage: str
+    ) -> "QuantizedEmbeddings":
+        """The cached quantization of the embeddings at embeddings_path,
+        redone when it is older than them
+        """
+        codes_path = quantized_path(embeddings_path, storage)
+        scales_path = quantized_path(embeddings_path, f"{storage}_scales")
+        if (
+            os.path.exists(scales_path)
+            and os.path.getmtime(scales_path) >= os.path.getmtime(embeddings_path)
+            and os.path.exists(codes_path)
+        ):
+            return cls(storage, np.load(codes_path), np.load(scales_path))
+
+        quantized = cls.quantize(embeddings, storage)
+        np.save(codes_path, quantized.codes)
+        # written last, so a complete scales file means complete codes
+        np.save(scales_path, quantized.scales)
+        return quantized
+
+    def scores(
+        self, query_embedding: np.ndarray, rows: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Approximate dot product of every row, or of the given rows, with
+        the query
+        """
+        return blockwise_scores(self.codes, query_embedding * self.scales, rows)
+
+
+class ProductQuantizer:
+    """Embeddings product-quantized to one byte per subspace
+
+    The dimensions are split into PQ_SUBQUANTIZERS equal subspaces, each
+    with a codebook of 256 centroids learned by k-means, and a row is stored
+    as the number of its closest centroid in every subspace. A query is not
+    quantized: its dot products with every centroid form an asymmetric
+    distance table, and a row's score is the sum of its entries in it.
+    codes is stored subspace-major, (subspaces, rows), so each lookup pass
+    reads one contiguous byte per row.
+    """
+
+    storage = "pq"
+    # scores are coarser than scalar quantization's, so rescoring looks deeper
+    rescore_multiplier = PQ_RESCORE_MULTIPLIER
+
+    def __init__(self, codebooks: np.ndarray, codes: np.ndarray) -> None:
+        self.codebooks = codebooks
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    @classmethod
+    def quantize(
+        cls, embeddings: np.ndarray, subquantizers: int = PQ_SUBQUANTIZERS
+    ) -> "ProductQuantizer":
+        rows, dimensions = embeddings.shape
+        if dimensions % subquantizers:
+            raise ValueError(
+                f"{dimensions} dimensions do not split into {subquantizers} subspaces"
+            )
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, size=min(rows, PQ_TRAIN_ROWS), replace=False))
+        vectors = np.asarray(embeddings[sample], dtype=np.float32).reshape(
+            len(sample), subquantizers, -1
+        )
+        codebooks = np.stack([kmeans(vectors[:, j], 256) for j in range(subquantizers)])
+
+        codes = np.empty((subquantizers, rows), dtype=np.uint8)
+        for start in range(0, rows, EMBEDDING_SCAN_BLOCK_ROWS):
+            block = np.asarray(
+                embeddings[start : start + EMBEDDING_SCAN_BLOCK_ROWS],
+                dtype=np.float32,
+            ).reshape(-1, subquantizers, dimensions // subquantizers)
+            for j in range(subquantizers):
+                codes[j, start : start + len(block)] = nearest_centroids(
+                    block[:, j], codebooks[j]
+                )
+        return cls(codebooks, codes)
+
+    @classmethod
+    def load_or_create(
+        cls, embeddings_path: str, embeddings: np.ndarray
+    ) -> "ProductQuantizer":
+        """The cached codes of the embeddings at embeddings_path, redone when
+        they are older than them or were made with other subspaces
+        """
+        codes_path = quantized_path(embeddings_path, "pq")
+        codebooks_path = quantized_path(embeddings_path, "pq_codebooks")
+        if (
+            os.path.exists(codebooks_path)
+            and os.path.getmtime(codebooks_path) >= os.path.getmtime(embeddings_path)
+            and os.path.exists(codes_path)
+        ):
+            codebooks = np.load(codebooks_path)
+            if len(codebooks) == PQ_SUBQUANTIZERS:
+                return cls(codebooks, np.load(codes_path))
+
+        quantized = cls.quantize(embeddings)
+        np.save(codes_path, quantized.codes)
+        # written last, so a complete codebooks file means complete codes
+        np.save(codebooks_path, quantized.codebooks)
+        return quantized
+
+    def distance_table(self, query_embedding: np.ndarray) -> np.ndarray:
+        """The query's dot product with every centroid, (subspaces, 256)"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        return np.einsum(
+            "jcd,jd->jc", self.codebooks, query.reshape(len(self.codebooks), -1)
+        )
+
+    def scores(
+        self, query_embedding: np.ndarray, rows: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Approximate dot product of every row, or of the given rows, with
+        the query
+        """
+        table = self.distance_table(query_embedding)
+        count = len(self) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, PQ_SCAN_BLOCK_ROWS):
+            if rows is None:
+                block = self.codes[:, start : start + PQ_SCAN_BLOCK_ROWS]
+            else:
+                block = self.codes[:, rows[start : start + PQ_SCAN_BLOCK_ROWS]]
+            block_scores = np.zeros(block.shape[1], dtype=np.float32)
+            for j, codes in enumerate(block):
+                block_scores += table[j][codes]
+            scores[start : start + len(block_scores)] = block_scores
+        return scores
+
+
+class BinaryEmbeddings:
+    """Embeddings reduced to one sign bit per dimension, 64 to a uint64
+
+    Bits are taken after subtracting the mean embedding, so that a
+    dimension that is positive for nearly every row still splits them. The
+    Hamming distance between a row's bits and the query's, an XOR and a
+    popcount per word, estimates the angle between them, so
+    1 - 2 * distance / bits stands in for the score at 1/32 of the size.
+    codes is stored word-major, (words, rows), so a scan runs down one
+    contiguous array per word; it is only good for picking candidates.
+    """
+
+    storage = "binary"
+    # sign bits rank coarsely, so rescoring looks deeper still
+    rescore_multiplier = BINARY_RESCORE_MULTIPLIER
+
+    def __init__(self, codes: np.ndarray, center: np.ndarray) -> None:
+        self.codes = codes
+        self.center = center
+
+    def __len__(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.center.nbytes
+
+    @classmethod
+    def quantize(cls, embeddings: np.ndarray) -> "BinaryEmbeddings":
+        center = np.zeros(embeddings.shape[1], dtype=np.float64)
+        for start in range(0, len(embeddings), EMBEDDING_SCAN_BLOCK_ROWS):
+            block = embeddings[start : start + EMBEDDING_SCAN_BLOCK_ROWS]
+            center += np.sum(block, axis=0, dtype=np.float64)
+        center = (center / max(len(embeddings), 1)).astype(np.float32)
+
+        words = -(-embeddings.shape[1] // 64)
+        codes = np.empty((words, len(embeddings)), dtype=np.uint64)
+        for start in range(0, len(embeddings), EMBEDDING_SCAN_BLOCK_ROWS):
+            block = embeddings[start : start + EMBEDDING_SCAN_BLOCK_ROWS]
+            codes[:, start : start + len(block)] = sign_bits(block - center).T
+        return cls(codes, center)
+
+    @classmethod
+    def load_or_create(
+        cls, embeddings_path: str, embeddings: np.ndarray
+    ) -> "BinaryEmbeddings":
+        """The cached sign bits of the embeddings at embeddings_path, redone
+        when they are older than them
+        """
+        codes_path = quantized_path(embeddings_path, "binary")
+        center_path = quantized_path(embeddings_path, "binary_center")
+        if (
+            os.path.exists(center_path)
+            and os.path.getmtime(center_path) >= os.path.getmtime(embeddings_path)
+            and os.path.exists(codes_path)
+        ):
+            return cls(np.load(codes_path), np.load(center_path))
+
+        quantized = cls.quantize(embeddings)
+        np.save(codes_path, quantized.codes)
+        # written last, so a complete center file means complete codes
+        np.save(center_path, quantized.center)
+        return quantized
+
+    def distances(
+        self, query_embedding: np.ndarray, rows: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Hamming distance from the query's sign bits to those of every row,
+        or of the given rows
+        """
+        query_bits = sign_bits(query_embedding[None, :] - self.center)[0]
+        count = len(self) if rows is None else len(rows)
+        distances = np.empty(count, dtype=np.uint16)
+        for start in range(0, count, BINARY_SCAN_BLOCK_ROWS):
+            if rows is None:
+                block = self.codes[:, start : start + BINARY_SCAN_BLOCK_ROWS]
+            else:
+                block = self.codes[:, rows[start : start + BINARY_SCAN_BLOCK_ROWS]]
+            block_distances = np.zeros(block.shape[1], dtype=np.uint16)
+            for word, bits in zip(block, query_bits):
+                block_distances += np.bitwise_count(word ^ bits)
+            distances[start : start + len(block_distances)] = block_distances
+        return distances
+
+    def scores(
+        self, query_embedding: np.ndarray, rows: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Approximate similarity of every row, or of the given rows, with the
+        query
+        """
+        bits = 64 * len(self.codes)
+        distances = self.distances(query_embedding, rows)
+        return 1 - distances.astype(np.float32) * np.float32(2 / bits)
+
+
+def load_quantized(
+    embeddings_path: str, embeddings: np.ndarray, storage: str
+) -> QuantizedEmbeddings | ProductQuantizer | BinaryEmbeddings:
+    """The cached quantization of the embeddings at embeddings_path in the
+    given storage
+    """
+    if storage == "pq":
+        return ProductQuantizer.load_or_create(embeddings_path, embeddings)
+    if storage == "binary":
+        return BinaryEmbeddings.load_or_create(embeddings_path, embeddings)
+    return QuantizedEmbeddings.load_or_create(embeddings_path, embeddings, storage)
+
+
+def kmeans(
+    vectors: np.ndarray, k: int, iterations: int = PQ_KMEANS_ITERATIONS
+) -> np.ndarray:
+    """k centroids of the vectors by Euclidean k-means; with fewer than k
+    distinct vectors some centroids repeat
+    """
+    rng = np.random.default_rng(0)
+    if len(vectors) == 0:
+        return np.zeros((k, vectors.shape[1]), dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=len(vectors) < k)]
+    for _ in range(iterations):
+        assignments = nearest_centroids(vectors, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.stack(
+            [
+                np.bincount(assignments, weights=column, minlength=k)
+                for column in vectors.T
+            ],
+            axis=1,
+        )
+        # an empty cluster starts over from a random vector
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=empty.sum())]
+        counts[empty] = 1
+        centroids = (sums / counts[:, None]).astype(np.float32)
+    return centroids
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the Euclidean-closest centroid to every vector"""
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, and |x|^2 is the same for every c
+    half_norms = (centroids * centroids).sum(axis=1) / 2
+    return np.argmax(vectors @ centroids.T - half_norms, axis=1)
+
+
+def sign_bits(embeddings: np.ndarray) -> np.ndarray:
+    """Each row's positive dimensions as set bits, packed into uint64 words
+    and padded with clear bits
+    """
+    packed = np.packbits(np.asarray(embeddings) > 0, axis=1)
+    packed = np.pad(packed, ((0, 0), (0, -packed.shape[1] % 8)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def quantized_path(embeddings_path: str, suffix: str) -> str:
+    base, extension = os.path.splitext(embeddings_path)
+    return f"{base}.{suffix}{extension}"
+
+
+def blockwise_scores(
+    matrix: np.ndarray, vector: np.ndarray, rows: np.ndarray | None = None
+) -> np.ndarray:
+    """matrix @ vector, or matrix[rows] @ vector, in float32 and a block of
+    rows at a time
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    count = len(matrix) if rows is None else len(rows)
+    scores = np.empty(count, dtype=np.float32)
+    for start in range(0, count, EMBEDDING_SCAN_BLOCK_ROWS):
+        if rows is None:
+            block = matrix[start : start + EMBEDDING_SCAN_BLOCK_ROWS]
+        else:
+            block = matrix[rows[start : start + EMBEDDING_SCAN_BLOCK_ROWS]]
+        scores[start : start + len(block)] = (
+            block.astype(np.float32, copy=False) @ vector
+        )
+    return scores
@@ -1,12 +1,8 @@
-import os
 from typing import Optional
 
-from dotenv import load_dotenv
-from google import genai
+from .resources import gemini_client
+from .spell_correction import load_spelling_index
 
-load_dotenv()
-api_key = os.getenv("gemini_api_key")
-client = genai.Client(api_key=api_key)
 model = "gemini-2.0-flash"
 
 
@@ -20,11 +16,19 @@ Query: "{query}"
 If no errors, return the original query.
 Corrected:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = gemini_client().models.generate_content(model=model, contents=prompt)
     corrected = (response.text or "").strip().strip('"')
     return corrected if corrected else query
 
 
+def fuzzy_correct(query: str) -> str:
+    """Correct typos against the movie vocabulary, asking the LLM only when
+    a correction is not clear-cut
+    """
+    corrected, confident = load_spelling_index().correct(query)
+    return corrected if confident else spell_correct(query)
+
+
 def rewrite_query(query: str) -> str:
     prompt = f"""Rewrite this movie search query to be more specific and searchable.
 
@@ -45,7 +49,7 @@ Examples:
 
 Rewritten query:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = gemini_client().models.generate_content(model=model, contents=prompt)
     rewritten = (response.text or "").strip().strip('"')
     return rewritten if rewritten else query
 
@@ -66,7 +70,7 @@ Examples:
 Query: "{query}"
 """
 
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = gemini_client().models.generate_content(model=model, contents=prompt)
     expanded_terms = (response.text or "").strip().strip('"')
 
     return f"{query} {expanded_terms}"
@@ -76,6 +80,8 @@ def enhance_query(query: str, method: Optional[str] = None) -> str:
     match method:
         case "spell":
             return spell_correct(query)
+        case "fuzzy":
+            return fuzzy_correct(query)
         case "rewrite":
             return rewrite_query(query)
         case "expand":
@@ -1,16 +1,9 @@
 import json
-import os
 from time import sleep
 
-from dotenv import load_dotenv
-from google import genai
-from sentence_transformers import CrossEncoder
+from .resources import cross_encoder, gemini_client
 
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
 model = "gemini-2.0-flash"
-cross_encoder = CrossEncoder("cross-encoder/ms-marco-TinyBERT-L2-v2")
 
 
 def llm_judge_query(query: str, results: list[dict], limit: int=5):
@@ -40,7 +33,7 @@ Do NOT give any numbers out than 0, 1, 2, or 3.
 Return ONLY the scores in the same order you were given the documents. Return a valid JSON list, nothing else. For example:
 
 [2, 0, 3, 2, 0, 1]"""
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = gemini_client().models.generate_content(model=model, contents=prompt)
     ranking_text = (response.text or "").strip()
 
     parsed_ids = json.loads(ranking_text)
@@ -75,7 +68,7 @@ Give me ONLY the number in your response, no other text or explanation.
 
 Score:"""
 
-        response = client.models.generate_content(model=model, contents=prompt)
+        response = gemini_client().models.generate_content(model=model, contents=prompt)
         score_text = (response.text or "").strip()
         score = int(score_text)
         scored_docs.append({**doc, "individual_score": score})
@@ -112,7 +105,7 @@ Return ONLY the IDs in order of relevance (best match first). Return a valid JSO
 [75, 12, 34, 2, 1]
 """
 
-    response = client.models.generate_content(model=model, contents=prompt)
+    response = gemini_client().models.generate_content(model=model, contents=prompt)
     ranking_text = (response.text or "").strip()
 
     parsed_ids = json.loads(ranking_text)
@@ -132,7 +125,7 @@ def cross_encoder_rerank(
     for doc in documents:
         pairs.append([query, f"{doc.get('title', '')} - {doc.get('document', '')}"])
 
-    scores = cross_encoder.predict(pairs)
+    scores = cross_encoder().predict(pairs)
 
     for doc, score in zip(documents, scores):
         doc["crossencoder_score"] = float(score)
@@ -0,0 +1,81 @@
+import os
+import threading
+from collections.abc import Callable, Hashable
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from .search_utils import CROSS_ENCODER_MODEL
+
+if TYPE_CHECKING:
+    from google import genai
+    from nltk.stem import PorterStemmer
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+T = TypeVar("T")
+
+
+class ResourceRegistry:
+    """Models and API clients, each created on first use and then shared
+
+    Creating one imports torch or the Gemini SDK and may load weights, so
+    nothing is created at import time and a command only pays for what it
+    uses.
+    """
+
+    def __init__(self) -> None:
+        self.__resources: dict[Hashable, Any] = {}
+        self.__lock = threading.RLock()
+
+    def get(self, key: Hashable, factory: Callable[[], T]) -> T:
+        with self.__lock:
+            if key not in self.__resources:
+                self.__resources[key] = factory()
+            return self.__resources[key]
+
+    def loaded(self) -> list[Hashable]:
+        with self.__lock:
+            return list(self.__resources)
+
+
+registry = ResourceRegistry()
+
+
+def gemini_client() -> "genai.Client":
+    return registry.get("gemini_client", _create_gemini_client)
+
+
+def sentence_transformer(model_name: str) -> "SentenceTransformer":
+    def create() -> "SentenceTransformer":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(model_name)
+
+    return registry.get(("sentence_transformer", model_name), create)
+
+
+def cross_encoder(model_name: str = CROSS_ENCODER_MODEL) -> "CrossEncoder":
+    def create() -> "CrossEncoder":
+        from sentence_transformers import CrossEncoder
+
+        return CrossEncoder(model_name)
+
+    return registry.get(("cross_encoder", model_name), create)
+
+
+def porter_stemmer() -> "PorterStemmer":
+    def create() -> "PorterStemmer":
+        # importing nltk also imports scipy.stats, which takes about a second
+        from nltk.stem import PorterStemmer
+
+        return PorterStemmer()
+
+    return registry.get("porter_stemmer", create)
+
+
+def _create_gemini_client() -> "genai.Client":
+    from dotenv import load_dotenv
+    from google import genai
+
+    load_dotenv()
+    # query enhancement used to read the key under its lowercase name
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("gemini_api_key")
+    return genai.Client(api_key=api_key)
@@ -0,0 +1,47 @@
+import json
+import socket
+from typing import Any
+
+from .search_utils import SEARCH_DAEMON_SOCKET_PATH
+
+
+class SearchDaemonUnavailable(ConnectionError):
+    pass
+
+
+def request(
+    operation: str, socket_path: str = SEARCH_DAEMON_SOCKET_PATH, **args: Any
+) -> Any:
+    """Run an operation on the search daemon and return its result
+
+    Raises SearchDaemonUnavailable when no daemon is listening on socket_path.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise SearchDaemonUnavailable(socket_path) from e
+        message = {"operation": operation, "args": args}
+        conn.sendall(json.dumps(message).encode() + b"\n")
+        with conn.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise SearchDaemonUnavailable(f"{socket_path} closed without replying")
+    reply = json.loads(line)
+    if "error" in reply:
+        raise RuntimeError(f"search daemon: {reply['error']}")
+    return reply["result"]
+
+
+def run_operation(operation: str, **args: Any) -> Any:
+    """Run an operation on the search daemon, or in this process when none is
+    running
+    """
+    try:
+        return request(operation, **args)
+    except SearchDaemonUnavailable:
+        pass
+    # imported only now so that talking to a daemon never loads the models
+    from .search_daemon import SearchService
+
+    return SearchService().run(operation, **args)
@@ -0,0 +1,165 @@
+import json
+import os
+import socketserver
+import time
+from typing import Any
+
+import numpy as np
+
+from .augmented_generation import rag_command
+from .document_store import DocumentStore, load_document_store
+from .evaluation import evaluate_command
+from .hybrid_search import HybridSearch, rrf_search_command, weighted_search_command
+from .keyword_search import open_index
+from .reranking import rerank
+from .resources import cross_encoder
+from .search_client import SearchDaemonUnavailable, request
+from .search_utils import (
+    DEFAULT_ALPHA,
+    DEFAULT_SEARCH_LIMIT,
+    RRF_K,
+    SEARCH_DAEMON_SOCKET_PATH,
+)
+
+
+class SearchService:
+    """The search operations, run against a searcher that is kept warm
+
+    The embedding model, chunk embeddings, index and document store are
+    loaded by the first operation that needs them and reused until
+    movies.json changes.
+    """
+
+    def __init__(self) -> None:
+        self.store: DocumentStore | None = None
+        self.searcher: HybridSearch | None = None
+
+    def hybrid_search(self) -> HybridSearch:
+        if self.store is None or self.searcher is None or self.store.is_stale():
+            self.store = load_document_store()
+            self.searcher = HybridSearch(self.store)
+        return self.searcher
+
+    def warm_up(self) -> None:
+        """Load everything an operation can need before the first request"""
+        searcher = self.hybrid_search()
+        searcher.semantic_search.generate_embedding("warm up")
+        cross_encoder()
+
+    def run(self, operation: str, **args: Any) -> Any:
+        limit = args.get("limit", DEFAULT_SEARCH_LIMIT)
+        match operation:
+            case "keyword":
+                # only the shared index snapshot, not the embedding model
+                with open_index() as idx:
+                    return idx.bm25_search(args["query"], limit)
+            case "semantic":
+                return self.hybrid_search().semantic_search.search_chunks(
+                    args["query"], limit
+                )
+            case "weighted_search":
+                return weighted_search_command(
+                    args["query"],
+                    args.get("alpha", DEFAULT_ALPHA),
+                    limit,
+                    searcher=self.hybrid_search(),
+                )
+            case "rrf_search":
+                return rrf_search_command(
+                    args["query"],
+                    args.get("k", RRF_K),
+                    args.get("enhance"),
+                    args.get("rerank_method"),
+                    args.get("evaluate"),
+                    limit,
+                    searcher=self.hybrid_search(),
+                )
+            case "rerank":
+                return rerank(
+                    args["query"], args["documents"], method=args["method"], limit=limit
+                )
+            case "rag":
+                return rag_command(
+                    args["mode"], args["query"], limit, searcher=self.hybrid_search()
+                )
+            case "evaluate":
+                return evaluate_command(limit, searcher=self.hybrid_search())
+            case _:
+                raise ValueError(f"unknown operation: {operation}")
+
+
+class SearchDaemon(socketserver.UnixStreamServer):
+    """Serves SearchService operations on a Unix socket, one at a time
+
+    Each connection carries one JSON request line, {"operation": ...,
+    "args": {...}}, and gets back one JSON line holding either "result" or
+    "error".
+    """
+
+    def __init__(self, socket_path: str = SEARCH_DAEMON_SOCKET_PATH) -> None:
+        self.socket_path = socket_path
+        self.service = SearchService()
+        self.started_at = time.time()
+        self.stopping = False
+        super().__init__(socket_path, SearchRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def serve(self) -> None:
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            self.server_close()
+            os.remove(self.socket_path)
+
+
+class SearchRequestHandler(socketserver.StreamRequestHandler):
+    server: SearchDaemon
+
+    def handle(self) -> None:
+        try:
+            message = json.loads(self.rfile.readline())
+            reply = {"result": self.__run(message["operation"], message["args"])}
+        except Exception as e:  # noqa: BLE001
+            # operations reach the Gemini client and the model loaders, which
+            # raise errors of their own types; whatever one request raises is
+            # reported to its client so the daemon carries on serving others
+            reply = {"error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(reply, default=_json_default).encode() + b"\n")
+
+    def __run(self, operation: str, args: dict) -> Any:
+        match operation:
+            case "ping":
+                return {
+                    "pid": os.getpid(),
+                    "uptime": time.time() - self.server.started_at,
+                }
+            case "stop":
+                self.server.stopping = True
+                return {"pid": os.getpid()}
+            case _:
+                return self.server.service.run(operation, **args)
+
+
+def serve_command(socket_path: str = SEARCH_DAEMON_SOCKET_PATH) -> None:
+    try:
+        status = request("ping", socket_path=socket_path)
+        raise RuntimeError(f"search daemon already running (pid {status['pid']})")
+    except SearchDaemonUnavailable:
+        pass
+    if os.path.exists(socket_path):
+        # left behind by a daemon that did not shut down cleanly
+        os.remove(socket_path)
+
+    daemon = SearchDaemon(socket_path)
+    daemon.service.warm_up()
+    print(f"Search daemon listening on {socket_path} (pid {os.getpid()})")
+    daemon.serve()
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
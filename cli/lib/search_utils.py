@@ -12,6 +12,22 @@ SCORE_PRECISION = 3
 
 BM25_K1 = 1.5
 BM25_B = 0.75
+BM25_PRUNING_MAX_LIMIT = 100
+BM25F_TITLE_WEIGHT = 3.0
+BM25F_DESCRIPTION_WEIGHT = 1.0
+BM25F_TITLE_B = 0.5
+BM25F_DESCRIPTION_B = 0.75
+POSTINGS_BLOCK_SIZE = 128
+TERM_BLOCK_SIZE = 16
+AUTOCOMPLETE_MAX_EXPANSIONS = 32
+SPELLING_MAX_EDIT_DISTANCE = 2
+SPELLING_PREFIX_LENGTH = 7
+SPELLING_MIN_WORD_LENGTH = 3
+SPELLING_CONFIDENCE_RATIO = 2.0
+STEM_CACHE_SIZE = 100_000
+BUILD_SHARDS_PER_WORKER = 4
+MAX_INDEX_SEGMENTS = 8
+BATCH_SCORES_MAX_CELLS = 4_000_000
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 DATA_PATH = os.path.join(PROJECT_ROOT, "data", "movies.json")
@@ -19,13 +35,41 @@ STOPWORDS_PATH = os.path.join(PROJECT_ROOT, "data", "stopwords.txt")
 GOLDEN_DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "golden_dataset.json")
 
 CACHE_DIR = os.path.join(PROJECT_ROOT, "cache")
+INVERTED_INDEX_DIR = os.path.join(CACHE_DIR, "inverted_index")
+DOCUMENT_STORE_DIR = os.path.join(CACHE_DIR, "documents")
+SPELLING_DIR = os.path.join(CACHE_DIR, "spelling")
+SEARCH_DAEMON_SOCKET_PATH = os.path.join(CACHE_DIR, "search_daemon.sock")
+
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-TinyBERT-L2-v2"
 
 DEFAULT_CHUNK_SIZE = 200
 DEFAULT_CHUNK_OVERLAP = 1
 DEFAULT_SEMANTIC_CHUNK_SIZE = 4
+EMBEDDING_NORM_SAMPLE = 1000
+EMBEDDING_STORAGE = "float32"
+EMBEDDING_RESCORE_MULTIPLIER = 4
+EMBEDDING_SCAN_BLOCK_ROWS = 1024
+PQ_SUBQUANTIZERS = 48
+PQ_TRAIN_ROWS = 65_536
+PQ_KMEANS_ITERATIONS = 20
+PQ_SCAN_BLOCK_ROWS = 8192
+PQ_RESCORE_MULTIPLIER = 16
+BINARY_SCAN_BLOCK_ROWS = 16_384
+BINARY_RESCORE_MULTIPLIER = 32
+DEFAULT_RECALL_QUERIES = 100
+VECTOR_INDEX = "flat"
+IVF_LISTS_PER_SQRT_ROWS = 4
+IVF_TRAIN_POINTS_PER_LIST = 64
+IVF_KMEANS_ITERATIONS = 20
+IVF_NPROBE = 32
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 100
+HNSW_EF_SEARCH = 64
 
 MOVIE_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "movie_embeddings.npy")
 CHUNK_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "chunk_embeddings.npy")
+CHUNK_MOVIE_IDS_PATH = os.path.join(CACHE_DIR, "chunk_movie_ids.npy")
+# superseded by CHUNK_MOVIE_IDS_PATH; migrated on load
 CHUNK_METADATA_PATH = os.path.join(CACHE_DIR, "chunk_metadata.json")
 
 
@@ -35,6 +79,14 @@ def load_movies() -> list[dict]:
     return data["movies"]
 
 
+def source_fingerprint() -> dict | None:
+    try:
+        stat = os.stat(DATA_PATH)
+    except FileNotFoundError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
 def load_stopwords() -> list[str]:
     with open(STOPWORDS_PATH, "r") as f:
         return f.read().splitlines()
@@ -1,62 +1,183 @@
 import json
 import os
 import re
+import time
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
+from .document_store import DocumentStore, load_document_store
+from .hnsw_index import HNSWIndex
+from .ivf_index import IVFIndex
+from .postings import range_indices
+from .quantization import (
+    EMBEDDING_STORAGES,
+    BinaryEmbeddings,
+    ProductQuantizer,
+    QuantizedEmbeddings,
+    blockwise_scores,
+    load_quantized,
+)
+from .resources import sentence_transformer
 from .search_utils import (
     CHUNK_EMBEDDINGS_PATH,
     CHUNK_METADATA_PATH,
+    CHUNK_MOVIE_IDS_PATH,
     DEFAULT_CHUNK_OVERLAP,
     DEFAULT_CHUNK_SIZE,
+    DEFAULT_RECALL_QUERIES,
     DEFAULT_SEARCH_LIMIT,
     DEFAULT_SEMANTIC_CHUNK_SIZE,
     DOCUMENT_PREVIEW_LENGTH,
+    EMBEDDING_NORM_SAMPLE,
+    EMBEDDING_RESCORE_MULTIPLIER,
+    EMBEDDING_STORAGE,
+    HNSW_EF_SEARCH,
+    IVF_NPROBE,
     MOVIE_EMBEDDINGS_PATH,
+    VECTOR_INDEX,
     format_search_result,
-    load_movies,
 )
 
+VECTOR_INDEXES = ("flat", "ivf", "hnsw")
+
 
 class SemanticSearch:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    """Semantic search over one embedding per movie
+
+    With a float16, int8, product-quantized ("pq") or sign-bit ("binary")
+    storage, queries scan the quantized embeddings and, when rescore is
+    set, rescore the best candidates exactly against the float32
+    embeddings, which then stay memory-mapped on disk. The "ivf" index
+    narrows the scan to the rows of the nprobe closest IVF lists, and the
+    "hnsw" index to the rows an HNSW graph search of width ef_search finds.
+    """
+
+    def __init__(
+        self,
+        model_name="all-MiniLM-L6-v2",
+        storage: str = EMBEDDING_STORAGE,
+        rescore: bool = True,
+        index: str = VECTOR_INDEX,
+        nprobe: int = IVF_NPROBE,
+        ef_search: int = HNSW_EF_SEARCH,
+    ):
+        if storage not in EMBEDDING_STORAGES:
+            raise ValueError(f"unknown embedding storage: {storage}")
+        if index not in VECTOR_INDEXES:
+            raise ValueError(f"unknown vector index: {index}")
+        self.model_name = model_name
+        self.storage = storage
+        self.rescore = rescore
+        self.index = index
+        self.nprobe = nprobe
+        self.ef_search = ef_search
         self.embeddings = None
-        self.documents = None
-        self.document_map = {}
+        self.quantized: (
+            QuantizedEmbeddings | ProductQuantizer | BinaryEmbeddings | None
+        ) = None
+        self.ivf: IVFIndex | None = None
+        self.hnsw: HNSWIndex | None = None
+        self.documents: DocumentStore | None = None
+
+    @property
+    def model(self):
+        return sentence_transformer(self.model_name)
 
     def generate_embedding(self, text):
         if not text or not text.strip():
             raise ValueError("cannot generate embedding for empty text")
         return self.model.encode([text])[0]
 
-    def build_embeddings(self, documents):
+    def embed_query(self, query: str) -> np.ndarray:
+        """The query's unit-length embedding, so that a dot product with the
+        stored embeddings is their cosine similarity
+        """
+        return normalize_embeddings(self.generate_embedding(query)[None, :])[0]
+
+    def build_embeddings(self, documents: DocumentStore):
         self.documents = documents
-        self.document_map = {}
         movie_strings = []
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
+        for _, doc in documents.current_documents():
             movie_strings.append(f"{doc['title']}: {doc['description']}")
-        self.embeddings = self.model.encode(movie_strings, show_progress_bar=True)
+        self.embeddings = normalize_embeddings(
+            self.model.encode(movie_strings, show_progress_bar=True)
+        )
 
         os.makedirs(os.path.dirname(MOVIE_EMBEDDINGS_PATH), exist_ok=True)
         np.save(MOVIE_EMBEDDINGS_PATH, self.embeddings)
+        self.embeddings = self._load_storage(MOVIE_EMBEDDINGS_PATH, self.embeddings)
         return self.embeddings
 
-    def load_or_create_embeddings(self, documents):
+    def load_or_create_embeddings(self, documents: DocumentStore):
         self.documents = documents
-        self.document_map = {}
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
 
         if os.path.exists(MOVIE_EMBEDDINGS_PATH):
-            self.embeddings = np.load(MOVIE_EMBEDDINGS_PATH)
-            if len(self.embeddings) == len(documents):
+            embeddings = load_normalized_embeddings(
+                MOVIE_EMBEDDINGS_PATH, mmap=self.storage != "float32"
+            )
+            if len(embeddings) == len(documents):
+                self.embeddings = self._load_storage(MOVIE_EMBEDDINGS_PATH, embeddings)
                 return self.embeddings
 
         return self.build_embeddings(documents)
 
+    def _load_storage(self, path: str, embeddings: np.ndarray) -> np.ndarray:
+        """Load or create the quantized copy and the index of the embeddings
+        saved at path, returning the float32 embeddings to keep for rescoring
+        """
+        self.ivf = (
+            IVFIndex.load_or_create(path, embeddings) if self.index == "ivf" else None
+        )
+        self.hnsw = (
+            HNSWIndex.load_or_create(path, embeddings) if self.index == "hnsw" else None
+        )
+        if self.storage == "float32":
+            self.quantized = None
+            return embeddings
+        self.quantized = load_quantized(path, embeddings, self.storage)
+        return np.load(path, mmap_mode="r")
+
+    def _candidates(
+        self, embeddings: np.ndarray, query_embedding: np.ndarray, count: int
+    ) -> tuple[np.ndarray | None, np.ndarray]:
+        """The rows the first stage scores, None when it scans them all, and
+        their scores, which are approximate when quantized; an HNSW search
+        finds at least count rows when there are that many
+        """
+        rows = None
+        if self.ivf is not None:
+            rows = self.ivf.probe(query_embedding, self.nprobe)
+        elif self.hnsw is not None:
+            ef = max(self.ef_search, count)
+            rows = self.hnsw.search(embeddings, query_embedding, ef)
+        if self.quantized is not None:
+            return rows, self.quantized.scores(query_embedding, rows)
+        if rows is None:
+            return None, embeddings @ query_embedding
+        return rows, blockwise_scores(embeddings, query_embedding, rows)
+
+    def _rescore_multiplier(self) -> int:
+        if self.quantized is None:
+            return EMBEDDING_RESCORE_MULTIPLIER
+        return self.quantized.rescore_multiplier
+
+    def top_documents(
+        self, query_embedding: np.ndarray, limit: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Positions among the current documents of the limit movies closest to
+        the query, and their scores
+        """
+        rows, scores = self._candidates(self.embeddings, query_embedding, limit)
+        if self.quantized is None or not self.rescore:
+            top = top_k_indices(scores, limit)
+            return (top if rows is None else rows[top]), scores[top]
+
+        candidates = top_k_indices(scores, limit * self._rescore_multiplier())
+        candidates = np.sort(candidates if rows is None else rows[candidates])
+        exact = self.embeddings[candidates] @ query_embedding
+        top = top_k_indices(exact, limit)
+        return candidates[top], exact[top]
+
     def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
         if self.embeddings is None or self.embeddings.size == 0:
             raise ValueError(
@@ -68,20 +189,15 @@ class SemanticSearch:
                 "No documents loaded. Call `load_or_create_embeddings` first."
             )
 
-        query_embedding = self.generate_embedding(query)
-
-        similarities = []
-        for i, doc_embedding in enumerate(self.embeddings):
-            similarity = cosine_similarity(query_embedding, doc_embedding)
-            similarities.append((similarity, self.documents[i]))
-
-        similarities.sort(key=lambda x: x[0], reverse=True)
+        top, scores = self.top_documents(self.embed_query(query), limit)
 
         results = []
-        for score, doc in similarities[:limit]:
+        for score, doc in zip(
+            scores, self.documents.get_many(self.documents.current_ids[top])
+        ):
             results.append(
                 {
-                    "score": score,
+                    "score": float(score),
                     "title": doc["title"],
                     "description": doc["description"],
                 }
@@ -101,6 +217,36 @@ def cosine_similarity(vec1, vec2):
     return dot_product / (norm1 * norm2)
 
 
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length; all-zero rows stay zero"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def load_normalized_embeddings(path: str, mmap: bool = False) -> np.ndarray:
+    """Load embeddings, normalizing and re-saving ones cached before they
+    were stored unit-length; with mmap they stay on disk and are read as used
+    """
+    mmap_mode = "r" if mmap else None
+    embeddings = np.load(path, mmap_mode=mmap_mode)
+    sample = np.linalg.norm(embeddings[:EMBEDDING_NORM_SAMPLE], axis=1)
+    if not np.all((np.abs(sample - 1) < 1e-3) | (sample == 0)):
+        np.save(f"{path}.tmp.npy", normalize_embeddings(embeddings))
+        os.replace(f"{path}.tmp.npy", path)
+        embeddings = np.load(path, mmap_mode=mmap_mode)
+    return embeddings
+
+
+def top_k_indices(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the limit highest scores, best first, ties by index"""
+    limit = min(limit, len(scores))
+    if limit <= 0:
+        return np.array([], dtype=np.int64)
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    return top[np.lexsort((top, -scores[top]))]
+
+
 def verify_model():
     search_instance = SemanticSearch()
     print(f"Model loaded: {search_instance.model}")
@@ -117,7 +263,7 @@ def embed_text(text):
 
 def verify_embeddings():
     search_instance = SemanticSearch()
-    documents = load_movies()
+    documents = load_document_store()
     embeddings = search_instance.load_or_create_embeddings(documents)
     print(f"Number of docs:   {len(documents)}")
     print(
@@ -133,9 +279,23 @@ def embed_query_text(query):
     print(f"Shape: {embedding.shape}")
 
 
-def semantic_search(query, limit=DEFAULT_SEARCH_LIMIT):
-    search_instance = SemanticSearch()
-    documents = load_movies()
+def semantic_search(
+    query,
+    limit=DEFAULT_SEARCH_LIMIT,
+    storage=EMBEDDING_STORAGE,
+    rescore=True,
+    index=VECTOR_INDEX,
+    nprobe=IVF_NPROBE,
+    ef_search=HNSW_EF_SEARCH,
+):
+    search_instance = SemanticSearch(
+        storage=storage,
+        rescore=rescore,
+        index=index,
+        nprobe=nprobe,
+        ef_search=ef_search,
+    )
+    documents = load_document_store()
     search_instance.load_or_create_embeddings(documents)
 
     results = search_instance.search(query, limit)
@@ -230,22 +390,36 @@ def semantic_chunk_text(
 
 
 class ChunkedSemanticSearch(SemanticSearch):
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
-        super().__init__(model_name)
+    """Semantic search over description chunks, scored per movie by its best
+    chunk
+
+    Chunks are stored sorted by movie, with chunk_movie_ids holding each
+    chunk's movie as a dense id, so every movie's chunks form one run that
+    np.maximum.reduceat can fold.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        storage: str = EMBEDDING_STORAGE,
+        rescore: bool = True,
+        index: str = VECTOR_INDEX,
+        nprobe: int = IVF_NPROBE,
+        ef_search: int = HNSW_EF_SEARCH,
+    ) -> None:
+        super().__init__(model_name, storage, rescore, index, nprobe, ef_search)
         self.chunk_embeddings = None
-        self.chunk_metadata = None
+        self.chunk_movie_ids = np.array([], dtype=np.int32)
+        self.movie_chunk_starts = np.array([], dtype=np.int64)
 
-    def build_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
+    def build_chunk_embeddings(self, documents: DocumentStore) -> np.ndarray:
         self.documents = documents
 
-        self.document_map = {}
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
-
         all_chunks = []
-        chunk_metadata = []
+        chunk_movie_ids = []
 
-        for idx, doc in enumerate(documents):
+        # movie_idx is the movie's dense id in the document store
+        for idx, doc in documents.current_documents():
             text = doc.get("description", "")
             if not text.strip():
                 continue
@@ -255,96 +429,275 @@ class ChunkedSemanticSearch(SemanticSearch):
                 max_chunk_size=DEFAULT_SEMANTIC_CHUNK_SIZE,
                 overlap=DEFAULT_CHUNK_OVERLAP,
             )
+            all_chunks.extend(chunks)
+            chunk_movie_ids.extend([idx] * len(chunks))
 
-            for i, chunk in enumerate(chunks):
-                all_chunks.append(chunk)
-                chunk_metadata.append(
-                    {"movie_idx": idx, "chunk_idx": i, "total_chunks": len(chunks)}
-                )
-
-        self.chunk_embeddings = self.model.encode(all_chunks, show_progress_bar=True)
-        self.chunk_metadata = chunk_metadata
+        chunk_movie_ids = np.array(chunk_movie_ids, dtype=np.int32)
+        order = np.argsort(chunk_movie_ids, kind="stable")
+        embeddings = self.model.encode(
+            [all_chunks[i] for i in order.tolist()], show_progress_bar=True
+        )
+        self.__set_chunks(normalize_embeddings(embeddings), chunk_movie_ids[order])
 
         os.makedirs(os.path.dirname(CHUNK_EMBEDDINGS_PATH), exist_ok=True)
         np.save(CHUNK_EMBEDDINGS_PATH, self.chunk_embeddings)
-        with open(CHUNK_METADATA_PATH, "w") as f:
-            json.dump(
-                {"chunks": chunk_metadata, "total_chunks": len(all_chunks)}, f, indent=2
-            )
+        np.save(CHUNK_MOVIE_IDS_PATH, self.chunk_movie_ids)
+        self.chunk_embeddings = self._load_storage(
+            CHUNK_EMBEDDINGS_PATH, self.chunk_embeddings
+        )
 
         return self.chunk_embeddings
 
-    def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
+    def load_or_create_chunk_embeddings(self, documents: DocumentStore) -> np.ndarray:
         self.documents = documents
-        self.document_map = {}
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
 
-        if os.path.exists(CHUNK_EMBEDDINGS_PATH) and os.path.exists(
+        if not os.path.exists(CHUNK_EMBEDDINGS_PATH):
+            return self.build_chunk_embeddings(documents)
+        if not os.path.exists(CHUNK_MOVIE_IDS_PATH) and os.path.exists(
             CHUNK_METADATA_PATH
         ):
-            self.chunk_embeddings = np.load(CHUNK_EMBEDDINGS_PATH)
-            with open(CHUNK_METADATA_PATH, "r") as f:
-                data = json.load(f)
-                self.chunk_metadata = data["chunks"]
-            return self.chunk_embeddings
+            migrate_chunk_metadata()
+        if os.path.exists(CHUNK_MOVIE_IDS_PATH):
+            chunk_embeddings = load_normalized_embeddings(
+                CHUNK_EMBEDDINGS_PATH, mmap=self.storage != "float32"
+            )
+            chunk_movie_ids = np.load(CHUNK_MOVIE_IDS_PATH)
+            if len(chunk_embeddings) == len(chunk_movie_ids):
+                self.__set_chunks(
+                    self._load_storage(CHUNK_EMBEDDINGS_PATH, chunk_embeddings),
+                    chunk_movie_ids,
+                )
+                return self.chunk_embeddings
 
         return self.build_chunk_embeddings(documents)
 
+    def __set_chunks(
+        self, chunk_embeddings: np.ndarray, chunk_movie_ids: np.ndarray
+    ) -> None:
+        self.chunk_embeddings = chunk_embeddings
+        self.chunk_movie_ids = chunk_movie_ids
+        self.movie_chunk_starts = run_starts(chunk_movie_ids)
+
+    def top_movies(
+        self, query_embedding: np.ndarray, limit: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """The best chunk of each of the limit movies closest to the query,
+        and its score
+        """
+        # a movie can have several chunks among the candidates
+        rows, chunk_scores = self._candidates(
+            self.chunk_embeddings,
+            query_embedding,
+            limit * self._rescore_multiplier(),
+        )
+        if rows is None:
+            movie_scores, best_chunks = max_per_run(
+                chunk_scores, self.movie_chunk_starts
+            )
+        else:
+            movie_scores, best = max_per_run(
+                chunk_scores, run_starts(self.chunk_movie_ids[rows])
+            )
+            best_chunks = rows[best]
+        if not self.rescore or (self.quantized is None and rows is None):
+            top = top_k_indices(movie_scores, limit)
+            return best_chunks[top], movie_scores[top]
+
+        # rescore every chunk of the candidate movies, so that a movie's best
+        # chunk is found exactly even when the first stage skipped or misjudged
+        # it
+        candidates = top_k_indices(movie_scores, limit * self._rescore_multiplier())
+        movie_ids = np.sort(self.chunk_movie_ids[best_chunks[candidates]])
+        starts = np.searchsorted(self.chunk_movie_ids, movie_ids)
+        counts = np.searchsorted(self.chunk_movie_ids, movie_ids, side="right") - starts
+        rows = range_indices(starts, counts)
+        exact_scores, best_rows = max_per_run(
+            self.chunk_embeddings[rows] @ query_embedding, run_starts_of(counts)
+        )
+        top = top_k_indices(exact_scores, limit)
+        return rows[best_rows[top]], exact_scores[top]
+
     def search_chunks(self, query: str, limit: int = 10) -> list[dict]:
-        if self.chunk_embeddings is None or self.chunk_metadata is None:
+        if self.chunk_embeddings is None:
             raise ValueError(
                 "No chunk embeddings loaded. Call load_or_create_chunk_embeddings first."
             )
 
-        query_embedding = self.generate_embedding(query)
-
-        chunk_scores = []
-        for i, chunk_embedding in enumerate(self.chunk_embeddings):
-            similarity = cosine_similarity(query_embedding, chunk_embedding)
-            chunk_scores.append(
-                {
-                    "chunk_idx": i,
-                    "movie_idx": self.chunk_metadata[i]["movie_idx"],
-                    "score": similarity,
-                }
-            )
-
-        movie_scores = {}
-        for chunk_score in chunk_scores:
-            movie_idx = chunk_score["movie_idx"]
-            if (
-                movie_idx not in movie_scores
-                or chunk_score["score"] > movie_scores[movie_idx]
-            ):
-                movie_scores[movie_idx] = chunk_score["score"]
-
-        sorted_movies = sorted(movie_scores.items(), key=lambda x: x[1], reverse=True)
+        best_chunks, scores = self.top_movies(self.embed_query(query), limit)
+        movie_ids = self.chunk_movie_ids[best_chunks]
+        starts = np.searchsorted(self.chunk_movie_ids, movie_ids)
 
         results = []
-        for movie_idx, score in sorted_movies[:limit]:
-            doc = self.documents[movie_idx]
+        for movie_idx, chunk, start, score in zip(
+            movie_ids.tolist(),
+            best_chunks.tolist(),
+            starts.tolist(),
+            scores.tolist(),
+        ):
+            doc = self.documents.get(movie_idx)
             results.append(
                 format_search_result(
                     doc_id=doc["id"],
                     title=doc["title"],
                     document=doc["description"][:DOCUMENT_PREVIEW_LENGTH],
                     score=score,
+                    chunk_idx=chunk - start,
                 )
             )
 
         return results
 
 
+def run_starts(values: np.ndarray) -> np.ndarray:
+    """Where each run of equal values starts"""
+    if len(values) == 0:
+        return np.array([], dtype=np.int64)
+    return np.flatnonzero(np.diff(values, prepend=values[0] - 1))
+
+
+def run_starts_of(lengths: np.ndarray) -> np.ndarray:
+    """Where each of consecutive runs of the given lengths starts"""
+    return np.cumsum(lengths) - lengths
+
+
+def max_per_run(
+    scores: np.ndarray, starts: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Highest score of every run beginning at starts, and the position of
+    the first score that reaches it
+    """
+    if len(starts) == 0:
+        return scores[:0], np.array([], dtype=np.int64)
+    maxima = np.maximum.reduceat(scores, starts)
+    lengths = np.diff(starts, append=len(scores))
+    positions = np.arange(len(scores))
+    at_max = scores == np.repeat(maxima, lengths)
+    winners = np.minimum.reduceat(np.where(at_max, positions, len(scores)), starts)
+    return maxima, winners
+
+
+def migrate_chunk_metadata() -> None:
+    """Convert chunk_metadata.json from before chunks were sorted by movie into
+    chunk_movie_ids.npy, reordering the cached embeddings to match
+    """
+    with open(CHUNK_METADATA_PATH, "r") as f:
+        chunks = json.load(f)["chunks"]
+    chunk_movie_ids = np.array([chunk["movie_idx"] for chunk in chunks], dtype=np.int32)
+    order = np.argsort(chunk_movie_ids, kind="stable")
+    np.save(f"{CHUNK_EMBEDDINGS_PATH}.tmp.npy", np.load(CHUNK_EMBEDDINGS_PATH)[order])
+    np.save(f"{CHUNK_MOVIE_IDS_PATH}.tmp.npy", chunk_movie_ids[order])
+    os.replace(f"{CHUNK_EMBEDDINGS_PATH}.tmp.npy", CHUNK_EMBEDDINGS_PATH)
+    os.replace(f"{CHUNK_MOVIE_IDS_PATH}.tmp.npy", CHUNK_MOVIE_IDS_PATH)
+    os.remove(CHUNK_METADATA_PATH)
+
+
 def embed_chunks_command() -> np.ndarray:
-    movies = load_movies()
+    movies = load_document_store()
     searcher = ChunkedSemanticSearch()
     return searcher.load_or_create_chunk_embeddings(movies)
 
 
-def search_chunked_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
-    movies = load_movies()
-    searcher = ChunkedSemanticSearch()
+def search_chunked_command(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    storage: str = EMBEDDING_STORAGE,
+    rescore: bool = True,
+    index: str = VECTOR_INDEX,
+    nprobe: int = IVF_NPROBE,
+    ef_search: int = HNSW_EF_SEARCH,
+) -> dict:
+    movies = load_document_store()
+    searcher = ChunkedSemanticSearch(
+        storage=storage,
+        rescore=rescore,
+        index=index,
+        nprobe=nprobe,
+        ef_search=ef_search,
+    )
     searcher.load_or_create_chunk_embeddings(movies)
     results = searcher.search_chunks(query, limit)
     return {"query": query, "results": results}
+
+
+def chunk_recall_command(
+    storage: str = EMBEDDING_STORAGE,
+    rescore: bool = True,
+    index: str = VECTOR_INDEX,
+    nprobe: int = IVF_NPROBE,
+    ef_search: int = HNSW_EF_SEARCH,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    query_count: int = DEFAULT_RECALL_QUERIES,
+) -> dict:
+    """Recall of chunked search with the given storage and index against
+    exact float32 search, over queries made from a sample of movie titles
+    """
+    movies = load_document_store()
+    exact = ChunkedSemanticSearch(storage="float32", index="flat")
+    exact.load_or_create_chunk_embeddings(movies)
+    approximate = ChunkedSemanticSearch(
+        storage=storage,
+        rescore=rescore,
+        index=index,
+        nprobe=nprobe,
+        ef_search=ef_search,
+    )
+    approximate.load_or_create_chunk_embeddings(movies)
+
+    sample = np.unique(
+        np.linspace(0, len(movies.current_ids) - 1, num=query_count).astype(np.int64)
+    )
+    titles = [doc["title"] for doc in movies.get_many(movies.current_ids[sample])]
+    query_embeddings = normalize_embeddings(exact.model.encode(titles))
+
+    found = relevant = scanned = 0
+    exact_seconds = approximate_seconds = 0.0
+    for query_embedding in query_embeddings:
+        start = time.perf_counter()
+        expected, _ = exact.top_movies(query_embedding, limit)
+        exact_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        retrieved, _ = approximate.top_movies(query_embedding, limit)
+        approximate_seconds += time.perf_counter() - start
+
+        relevant += len(expected)
+        if approximate.ivf is not None:
+            scanned += len(approximate.ivf.probe(query_embedding, nprobe))
+        elif approximate.hnsw is None:
+            scanned += len(approximate.chunk_movie_ids)
+        found += len(
+            np.intersect1d(
+                exact.chunk_movie_ids[expected],
+                approximate.chunk_movie_ids[retrieved],
+            )
+        )
+
+    queries = max(len(titles), 1)
+    approximate_bytes = (
+        approximate.quantized.nbytes
+        if approximate.quantized is not None
+        else approximate.chunk_embeddings.nbytes
+    )
+    if approximate.ivf is not None:
+        approximate_bytes += approximate.ivf.nbytes
+    if approximate.hnsw is not None:
+        approximate_bytes += approximate.hnsw.nbytes
+    return {
+        "storage": storage,
+        "rescore": rescore,
+        "index": index,
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        "limit": limit,
+        "queries": len(titles),
+        "recall": found / relevant if relevant else 1.0,
+        "exact_ms": exact_seconds / queries * 1000,
+        "approximate_ms": approximate_seconds / queries * 1000,
+        # a graph search scores the neighbors it visits, not a share of rows
+        "scanned": (
+            None
+            if approximate.hnsw is not None
+            else scanned / queries / max(len(approximate.chunk_movie_ids), 1)
+        ),
+        "exact_bytes": exact.chunk_embeddings.nbytes,
+        "approximate_bytes": approximate_bytes,
+    }
@@ -0,0 +1,188 @@
+import json
+import os
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from .document_store import DocumentStore, load_document_store
+from .keyword_search import preprocess_text
+from .postings import range_indices
+from .search_utils import (
+    SPELLING_CONFIDENCE_RATIO,
+    SPELLING_DIR,
+    SPELLING_MAX_EDIT_DISTANCE,
+    SPELLING_MIN_WORD_LENGTH,
+    SPELLING_PREFIX_LENGTH,
+)
+
+
+class SymSpellIndex:
+    """Symmetric-delete spelling index over the words of the movies
+
+    Every word's prefix is stored under each string reachable by deleting up
+    to SPELLING_MAX_EDIT_DISTANCE characters. A misspelling's own deletes
+    then meet those of every word within that distance, so a lookup is a
+    few dozen binary searches plus an edit distance check per candidate.
+    Deletes are kept as sorted CRC32 hashes; collisions only add candidates.
+    """
+
+    ARRAY_NAMES = ("words", "word_counts", "delete_hashes", "delete_words")
+
+    def __init__(self, spelling_dir: str = SPELLING_DIR) -> None:
+        self.spelling_dir = spelling_dir
+        self.meta_path = os.path.join(spelling_dir, "meta.json")
+        self.store_generation: int | None = None
+        self.words = np.array([], dtype="S1")
+        self.word_counts = np.array([], dtype=np.int64)
+        self.delete_hashes = np.array([], dtype=np.uint32)
+        self.delete_words = np.array([], dtype=np.int32)
+
+    def build(self, store: DocumentStore) -> None:
+        word_counts: Counter = Counter()
+        for _, doc in store.current_documents():
+            word_counts.update(
+                preprocess_text(f"{doc['title']} {doc['description']}").split()
+            )
+        words = sorted(word_counts)
+
+        hashes, word_ids = [], []
+        for word_id, word in enumerate(words):
+            for delete in deletes(word[:SPELLING_PREFIX_LENGTH]):
+                hashes.append(zlib.crc32(delete.encode()))
+                word_ids.append(word_id)
+        hashes = np.array(hashes, dtype=np.uint32)
+        word_ids = np.array(word_ids, dtype=np.int32)
+        order = np.lexsort((word_ids, hashes))
+
+        self.store_generation = store.generation
+        self.words = np.array([word.encode() for word in words], dtype=np.bytes_)
+        self.word_counts = np.array([word_counts[word] for word in words])
+        self.delete_hashes = hashes[order]
+        self.delete_words = word_ids[order]
+
+    def save(self) -> None:
+        os.makedirs(self.spelling_dir, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(self.spelling_dir, f"{name}.npy"), getattr(self, name))
+        with open(self.meta_path, "w") as f:
+            json.dump({"store_generation": self.store_generation}, f, indent=2)
+
+    def load(self) -> None:
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        for name in self.ARRAY_NAMES:
+            path = os.path.join(self.spelling_dir, f"{name}.npy")
+            setattr(self, name, np.load(path, mmap_mode="r"))
+        self.store_generation = meta["store_generation"]
+
+    def __contains__(self, word: str) -> bool:
+        key = word.encode()
+        rank = int(np.searchsorted(self.words, key))
+        return rank < len(self.words) and self.words[rank] == key
+
+    def lookup(self, word: str) -> list[tuple[str, int, int]]:
+        """Words within SPELLING_MAX_EDIT_DISTANCE of word, as (word,
+        distance, count), closest and then most frequent first
+        """
+        query_hashes = np.array(
+            [
+                zlib.crc32(delete.encode())
+                for delete in deletes(word[:SPELLING_PREFIX_LENGTH])
+            ],
+            dtype=np.uint32,
+        )
+        starts = np.searchsorted(self.delete_hashes, query_hashes, side="left")
+        ends = np.searchsorted(self.delete_hashes, query_hashes, side="right")
+        word_ids = np.unique(self.delete_words[range_indices(starts, ends - starts)])
+
+        suggestions = []
+        for word_id, candidate in zip(word_ids.tolist(), self.words[word_ids].tolist()):
+            candidate = candidate.decode()
+            if abs(len(candidate) - len(word)) > SPELLING_MAX_EDIT_DISTANCE:
+                continue
+            distance = edit_distance(word, candidate, SPELLING_MAX_EDIT_DISTANCE)
+            if distance <= SPELLING_MAX_EDIT_DISTANCE:
+                count = int(self.word_counts[word_id])
+                suggestions.append((candidate, distance, count))
+        suggestions.sort(key=lambda suggestion: (suggestion[1], -suggestion[2]))
+        return suggestions
+
+    def correct(self, query: str) -> tuple[str, bool]:
+        """The query with unknown words replaced by their best suggestion
+
+        Also tells whether every correction was confident: a word with no
+        suggestion, or whose runner-up is as close and nearly as frequent,
+        is not.
+        """
+        corrected, confident = [], True
+        for original in query.split():
+            word = preprocess_text(original)
+            if (
+                len(word) < SPELLING_MIN_WORD_LENGTH
+                or any(character.isdigit() for character in word)
+                or word in self
+            ):
+                corrected.append(original)
+                continue
+            suggestions = self.lookup(word)
+            if not suggestions:
+                corrected.append(original)
+                confident = False
+                continue
+            best = suggestions[0]
+            if len(suggestions) > 1:
+                runner_up = suggestions[1]
+                if (
+                    runner_up[1] == best[1]
+                    and runner_up[2] * SPELLING_CONFIDENCE_RATIO > best[2]
+                ):
+                    confident = False
+            corrected.append(best[0])
+        return " ".join(corrected), confident
+
+
+def deletes(word: str, max_distance: int = SPELLING_MAX_EDIT_DISTANCE) -> set[str]:
+    """word and every string left after deleting up to max_distance characters"""
+    found = {word}
+    level = {word}
+    for _ in range(max_distance):
+        level = {
+            candidate[:i] + candidate[i + 1 :]
+            for candidate in level
+            for i in range(len(candidate))
+        }
+        found |= level
+    return found
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance, or max_distance + 1 when above it"""
+    two_rows_back: list[int] = []
+    previous_row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(
+                row[j - 1] + 1, previous_row[j] + 1, previous_row[j - 1] + cost
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], two_rows_back[j - 2] + 1)
+        # a transposition reaches back two rows, so both must be out of range
+        if min(row) > max_distance and min(previous_row) > max_distance:
+            return max_distance + 1
+        two_rows_back, previous_row = previous_row, row
+    return min(previous_row[len(b)], max_distance + 1)
+
+
+def load_spelling_index() -> SymSpellIndex:
+    """The spelling index, rebuilt when the document store has changed"""
+    store = load_document_store()
+    index = SymSpellIndex()
+    if os.path.exists(index.meta_path):
+        index.load()
+    if index.store_generation != store.generation:
+        index.build(store)
+        index.save()
+    return index
@@ -0,0 +1,206 @@
+import os
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+from .search_utils import TERM_BLOCK_SIZE
+
+WILDCARD_CHARACTERS = "*?"
+
+
+class TermDictionary:
+    """Sorted terms, front coded in blocks of TERM_BLOCK_SIZE
+
+    The first term of every block is kept whole in term_block_heads, which are
+    binary searched. The other terms are stored as the length of the prefix
+    they share with the previous term followed by their varint-sized suffix,
+    so a lookup decodes a single block.
+    """
+
+    ARRAY_NAMES = ("term_block_heads", "term_block_data_offsets", "term_data")
+
+    def __init__(
+        self,
+        term_block_heads: np.ndarray,
+        term_block_data_offsets: np.ndarray,
+        term_data: np.ndarray,
+    ) -> None:
+        self.term_block_heads = term_block_heads
+        self.term_block_data_offsets = term_block_data_offsets
+        self.term_data = term_data
+        self.term_count = 0
+        if len(term_block_heads):
+            last_block = len(term_block_heads) - 1
+            self.term_count = last_block * TERM_BLOCK_SIZE + len(
+                self.block_terms(last_block)
+            )
+
+    def __len__(self) -> int:
+        return self.term_count
+
+    @classmethod
+    def encode(cls, terms: list[str]) -> "TermDictionary":
+        heads = []
+        data = bytearray()
+        data_offsets = []
+        previous = b""
+        for i, term in enumerate(terms):
+            key = term.encode()
+            if i % TERM_BLOCK_SIZE == 0:
+                heads.append(key)
+                data_offsets.append(len(data))
+            else:
+                shared = min(_shared_prefix_length(previous, key), 255)
+                data.append(shared)
+                data.extend(_varint(len(key) - shared))
+                data.extend(key[shared:])
+            previous = key
+        data_offsets.append(len(data))
+        return cls(
+            term_block_heads=np.array(heads, dtype=np.bytes_ if heads else "S1"),
+            term_block_data_offsets=np.array(data_offsets, dtype=np.int64),
+            term_data=np.frombuffer(bytes(data), dtype=np.uint8),
+        )
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str) -> "TermDictionary":
+        arrays = {}
+        for name in cls.ARRAY_NAMES:
+            path = os.path.join(directory, f"{name}.npy")
+            arrays[name] = np.load(path, mmap_mode="r")
+        return cls(**arrays)
+
+    def block_terms(self, block: int) -> list[bytes]:
+        start, end = self.term_block_data_offsets[block : block + 2].tolist()
+        data = self.term_data[start:end].tobytes()
+        term = bytes(self.term_block_heads[block])
+        terms = [term]
+        position = 0
+        while position < len(data):
+            shared = data[position]
+            length = data[position + 1]
+            position += 2
+            if length >= 0x80:
+                length, position = _read_varint(data, position - 1)
+            term = term[:shared] + data[position : position + length]
+            terms.append(term)
+            position += length
+        return terms
+
+    def term_id(self, token: str) -> int | None:
+        key = token.encode()
+        block = int(np.searchsorted(self.term_block_heads, key, side="right")) - 1
+        if block < 0:
+            return None
+        terms = self.block_terms(block)
+        rank = bisect_left(terms, key)
+        if rank < len(terms) and terms[rank] == key:
+            return block * TERM_BLOCK_SIZE + rank
+        return None
+
+    def term_ids(self, tokens: list[str]) -> np.ndarray:
+        """term_id of every token, -1 when missing, decoding each block once"""
+        term_ids = np.full(len(tokens), -1, dtype=np.int64)
+        if not tokens or not self.term_count:
+            return term_ids
+        keys = [token.encode() for token in tokens]
+        blocks = np.searchsorted(self.term_block_heads, np.array(keys), side="right")
+        block_terms = {}
+        for i, (key, block) in enumerate(zip(keys, (blocks - 1).tolist())):
+            if block < 0:
+                continue
+            if block not in block_terms:
+                block_terms[block] = self.block_terms(block)
+            terms = block_terms[block]
+            rank = bisect_left(terms, key)
+            if rank < len(terms) and terms[rank] == key:
+                term_ids[i] = block * TERM_BLOCK_SIZE + rank
+        return term_ids
+
+    def lower_bound(self, key: bytes) -> int:
+        """Id of the first term that is not below key"""
+        block = int(np.searchsorted(self.term_block_heads, key, side="right")) - 1
+        if block < 0:
+            return 0
+        return block * TERM_BLOCK_SIZE + bisect_left(self.block_terms(block), key)
+
+    def prefix_range(self, prefix: str) -> tuple[int, int]:
+        key = prefix.encode()
+        # 0xff never occurs in UTF-8, so it sorts after every completion
+        return self.lower_bound(key), self.lower_bound(key + b"\xff")
+
+    def terms(self, start: int = 0, end: int | None = None) -> list[str]:
+        end = self.term_count if end is None else end
+        if start >= end:
+            return []
+        first_block = start // TERM_BLOCK_SIZE
+        terms = []
+        for block in range(first_block, (end - 1) // TERM_BLOCK_SIZE + 1):
+            terms.extend(self.block_terms(block))
+        offset = first_block * TERM_BLOCK_SIZE
+        return [term.decode() for term in terms[start - offset : end - offset]]
+
+    def expand(self, pattern: str) -> np.ndarray:
+        """Ids of the terms matching a pattern where * is any run of
+        characters and ? a single one
+        """
+        prefix = re.split(f"[{re.escape(WILDCARD_CHARACTERS)}]", pattern, 1)[0]
+        start, end = self.prefix_range(prefix)
+        if pattern == f"{prefix}*":
+            return np.arange(start, end, dtype=np.int64)
+        regex = wildcard_regex(pattern)
+        return np.array(
+            [
+                start + i
+                for i, term in enumerate(self.terms(start, end))
+                if regex.fullmatch(term)
+            ],
+            dtype=np.int64,
+        )
+
+
+def is_wildcard(word: str) -> bool:
+    return any(character in word for character in WILDCARD_CHARACTERS)
+
+
+def wildcard_regex(pattern: str) -> re.Pattern:
+    parts = re.split(r"([*?])", pattern)
+    wildcards = {"*": ".*", "?": "."}
+    return re.compile(
+        "".join(wildcards.get(part, re.escape(part)) for part in parts), re.DOTALL
+    )
+
+
+def _shared_prefix_length(a: bytes, b: bytes) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _read_varint(data: bytes, position: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
@@ -0,0 +1,45 @@
+import argparse
+
+from lib.search_client import SearchDaemonUnavailable, request
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search Daemon CLI")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    subparsers.add_parser(
+        "serve", help="Load the models and indexes and serve searches until stopped"
+    )
+    subparsers.add_parser("status", help="Check whether the search daemon is running")
+    subparsers.add_parser("stop", help="Stop the running search daemon")
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "serve":
+            from lib.search_daemon import serve_command
+
+            serve_command()
+        case "status":
+            try:
+                status = request("ping")
+            except SearchDaemonUnavailable:
+                print("Search daemon is not running")
+                return
+            print(
+                f"Search daemon running (pid {status['pid']}, "
+                f"up {status['uptime']:.0f}s)"
+            )
+        case "stop":
+            try:
+                status = request("stop")
+            except SearchDaemonUnavailable:
+                print("Search daemon is not running")
+                return
+            print(f"Stopped search daemon (pid {status['pid']})")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
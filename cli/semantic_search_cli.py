@@ -2,7 +2,17 @@
 
 import argparse
 
+from lib.quantization import EMBEDDING_STORAGES
+from lib.search_utils import (
+    DEFAULT_RECALL_QUERIES,
+    EMBEDDING_STORAGE,
+    HNSW_EF_SEARCH,
+    IVF_NPROBE,
+    VECTOR_INDEX,
+)
 from lib.semantic_search import (
+    VECTOR_INDEXES,
+    chunk_recall_command,
     chunk_text,
     embed_chunks_command,
     embed_query_text,
@@ -15,6 +25,39 @@ from lib.semantic_search import (
 )
 
 
+def add_vector_search_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--storage",
+        choices=EMBEDDING_STORAGES,
+        default=EMBEDDING_STORAGE,
+        help=f"How the scanned embeddings are stored (default={EMBEDDING_STORAGE})",
+    )
+    parser.add_argument(
+        "--no-rescore",
+        dest="rescore",
+        action="store_false",
+        help="Skip rescoring the best approximate matches at full precision",
+    )
+    parser.add_argument(
+        "--index",
+        choices=VECTOR_INDEXES,
+        default=VECTOR_INDEX,
+        help=f"Index that picks the embeddings to scan (default={VECTOR_INDEX})",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        default=IVF_NPROBE,
+        help=f"IVF lists to scan per query (default={IVF_NPROBE})",
+    )
+    parser.add_argument(
+        "--ef-search",
+        type=int,
+        default=HNSW_EF_SEARCH,
+        help=f"Width of the HNSW graph search (default={HNSW_EF_SEARCH})",
+    )
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Semantic Search CLI")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
@@ -42,6 +85,7 @@ def main() -> None:
     search_parser.add_argument(
         "--limit", type=int, default=5, help="Number of results to return"
     )
+    add_vector_search_arguments(search_parser)
 
     chunk_parser = subparsers.add_parser(
         "chunk", help="Split text into fixed-size chunks with optional overlap"
@@ -85,6 +129,22 @@ def main() -> None:
     search_chunked_parser.add_argument(
         "--limit", type=int, default=5, help="Number of results to return"
     )
+    add_vector_search_arguments(search_chunked_parser)
+
+    chunk_recall_parser = subparsers.add_parser(
+        "chunk_recall",
+        help="Measure chunked search recall against exact float32 search",
+    )
+    chunk_recall_parser.add_argument(
+        "--limit", type=int, default=5, help="Number of results per query"
+    )
+    chunk_recall_parser.add_argument(
+        "--queries",
+        type=int,
+        default=DEFAULT_RECALL_QUERIES,
+        help=f"Movie titles to query with (default={DEFAULT_RECALL_QUERIES})",
+    )
+    add_vector_search_arguments(chunk_recall_parser)
 
     args = parser.parse_args()
 
@@ -98,7 +158,15 @@ def main() -> None:
         case "embedquery":
             embed_query_text(args.query)
         case "search":
-            semantic_search(args.query, args.limit)
+            semantic_search(
+                args.query,
+                args.limit,
+                args.storage,
+                args.rescore,
+                args.index,
+                args.nprobe,
+                args.ef_search,
+            )
         case "chunk":
             chunk_text(args.text, args.chunk_size, args.overlap)
         case "semantic_chunk":
@@ -107,12 +175,51 @@ def main() -> None:
             embeddings = embed_chunks_command()
             print(f"Generated {len(embeddings)} chunked embeddings")
         case "search_chunked":
-            result = search_chunked_command(args.query, args.limit)
+            result = search_chunked_command(
+                args.query,
+                args.limit,
+                args.storage,
+                args.rescore,
+                args.index,
+                args.nprobe,
+                args.ef_search,
+            )
             print(f"Query: {result['query']}")
             print("Results:")
             for i, res in enumerate(result["results"], 1):
                 print(f"\n{i}. {res['title']} (score: {res['score']:.4f})")
                 print(f"   {res['document']}...")
+        case "chunk_recall":
+            result = chunk_recall_command(
+                args.storage,
+                args.rescore,
+                args.index,
+                args.nprobe,
+                args.ef_search,
+                args.limit,
+                args.queries,
+            )
+            rescore = "with" if result["rescore"] else "without"
+            index = result["index"]
+            if index == "ivf":
+                index = f"ivf (nprobe {result['nprobe']})"
+            elif index == "hnsw":
+                index = f"hnsw (ef_search {result['ef_search']})"
+            print(
+                f"{result['storage']} {index} {rescore} rescoring, "
+                f"{result['queries']} queries, top {result['limit']}:"
+            )
+            print(f"  recall:  {result['recall']:.4f}")
+            if result["scanned"] is not None:
+                print(f"  scanned: {result['scanned']:.1%} of chunks")
+            print(
+                f"  latency: {result['approximate_ms']:.2f} ms "
+                f"(float32 {result['exact_ms']:.2f} ms)"
+            )
+            print(
+                f"  memory:  {result['approximate_bytes'] / 2**20:.1f} MiB "
+                f"(float32 {result['exact_bytes'] / 2**20:.1f} MiB)"
+            )
         case _:
             parser.print_help()
 
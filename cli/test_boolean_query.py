@@ -0,0 +1,23 @@
+from lib.boolean_query import BooleanQueryParser
+
+
+def parse(query: str):
+    return BooleanQueryParser(lambda word: [word.lower()]).parse(query)
+
+
+def test_not_after_word_is_anded():
+    assert parse("dark NOT knight") == (
+        "and",
+        [("term", "dark"), ("not", ("term", "knight"))],
+    )
+
+
+def test_or_not_stays_ored():
+    assert parse("dark OR NOT knight") == (
+        "or",
+        [("term", "dark"), ("not", ("term", "knight"))],
+    )
+
+
+def test_adjacent_words_are_ored():
+    assert parse("dark knight") == ("or", [("term", "dark"), ("term", "knight")])
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from lib.dynamic_pruning import TermPostings, block_max_top_k, select_top_k
+from lib.postings import CompressedPostings
+
+DOC_COUNT = 5_000
+
+
+def random_index(seed: int) -> tuple[CompressedPostings, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    doc_freqs = rng.integers(1, DOC_COUNT // 2, size=6)
+    doc_numbers = np.concatenate(
+        [np.sort(rng.choice(DOC_COUNT, size=n, replace=False)) for n in doc_freqs]
+    )
+    term_offsets = np.zeros(len(doc_freqs) + 1, dtype=np.int64)
+    np.cumsum(doc_freqs, out=term_offsets[1:])
+    postings = CompressedPostings.encode(
+        term_offsets, doc_numbers, np.ones(len(doc_numbers), dtype=np.int64)
+    )
+    # few distinct impacts, so that plenty of scores tie
+    impacts = rng.integers(1, 8, size=len(doc_numbers)).astype(np.uint8)
+    block_max_impacts = np.maximum.reduceat(
+        impacts, postings.block_posting_offsets[:-1]
+    )
+    return postings, impacts, block_max_impacts
+
+
+def exhaustive_top_k(
+    postings: CompressedPostings,
+    impacts: np.ndarray,
+    weights: dict[int, float],
+    limit: int,
+    deleted: np.ndarray,
+    tie_breakers: np.ndarray,
+) -> list[tuple[int, float]]:
+    scores = np.zeros(DOC_COUNT)
+    for term_id, weight in weights.items():
+        positions, doc_numbers, _ = postings.decode_term(term_id)
+        scores[doc_numbers] += impacts[positions] * weight
+    docs = np.flatnonzero((scores > 0) & ~deleted)
+    order = np.lexsort((tie_breakers[docs], -scores[docs]))[:limit]
+    return [(int(docs[i]), float(scores[docs[i]])) for i in order]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("limit", [1, 10, 100])
+def test_pruned_top_k_matches_exhaustive_scoring(seed, limit):
+    postings, impacts, block_max_impacts = random_index(seed)
+    rng = np.random.default_rng(seed)
+    weights = {term_id: float(rng.uniform(0.1, 2)) for term_id in (0, 2, 3, 5)}
+    deleted = rng.random(DOC_COUNT) < 0.1
+    tie_breakers = rng.permutation(DOC_COUNT)
+
+    pruned = block_max_top_k(
+        [
+            TermPostings(postings, term_id, impacts, block_max_impacts, weight)
+            for term_id, weight in weights.items()
+        ],
+        limit,
+        deleted,
+        tie_breakers,
+    )
+
+    expected = exhaustive_top_k(
+        postings, impacts, weights, limit, deleted, tie_breakers
+    )
+    assert [doc for doc, _ in pruned] == [doc for doc, _ in expected]
+    np.testing.assert_allclose(
+        [score for _, score in pruned], [score for _, score in expected]
+    )
+
+
+def test_select_top_k_breaks_ties_on_the_tie_breaker():
+    doc_ids = np.array([4, 1, 3, 2])
+    scores = np.array([1.0, 2.0, 1.0, 1.0])
+
+    assert select_top_k(doc_ids, scores, 3) == [(1, 2.0), (2, 1.0), (3, 1.0)]
+    assert select_top_k(doc_ids, scores, 3, np.array([0, 0, 2, 1])) == [
+        (1, 2.0),
+        (4, 1.0),
+        (2, 1.0),
+    ]
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from lib.hnsw_index import HNSWIndex
+from lib.search_utils import HNSW_EF_SEARCH
+from lib.semantic_search import top_k_indices
+
+GRAPH_ROWS = 800
+
+
+def graph_recall(
+    index: HNSWIndex, embeddings: np.ndarray, queries: np.ndarray, k: int = 10
+) -> float:
+    found = 0
+    for query in queries:
+        exact = top_k_indices(embeddings @ query, k)
+        rows = index.search(embeddings, query, HNSW_EF_SEARCH)
+        found += len(np.intersect1d(exact, rows))
+    return found / (k * len(queries))
+
+
+@pytest.fixture
+def add_calls(monkeypatch):
+    """The graph size at every call of HNSWIndex.add, 0 meaning a rebuild"""
+    calls = []
+    add = HNSWIndex.add
+
+    def recording_add(self, embeddings):
+        calls.append(len(self))
+        add(self, embeddings)
+
+    monkeypatch.setattr(HNSWIndex, "add", recording_add)
+    return calls
+
+
+def test_hnsw_recall_against_exact_search(
+    clustered_embeddings, load_searcher, recall_at_k
+):
+    embeddings, queries = clustered_embeddings
+    embeddings = embeddings[:GRAPH_ROWS]
+
+    searcher = load_searcher(embeddings, index="hnsw")
+
+    assert len(searcher.hnsw) == GRAPH_ROWS
+    assert recall_at_k(searcher, embeddings, queries) >= 0.95
+
+
+def test_rows_added_later_are_found(clustered_embeddings, tmp_path):
+    embeddings, queries = clustered_embeddings
+    embeddings = embeddings[:GRAPH_ROWS]
+    index = HNSWIndex(str(tmp_path / "hnsw"))
+
+    index.add(embeddings[:500])
+    levels = np.array(index.levels)
+    index.add(embeddings)
+
+    assert len(index) == GRAPH_ROWS
+    np.testing.assert_array_equal(index.levels[:500], levels)
+    assert np.all((index.neighbors >= 0).any(axis=1))
+    assert graph_recall(index, embeddings, queries) >= 0.95
+    # every added row finds itself
+    for row in range(500, GRAPH_ROWS, 50):
+        assert row in index.search(embeddings, embeddings[row], HNSW_EF_SEARCH)
+
+
+def test_load_or_create_extends_appended_embeddings(
+    clustered_embeddings, tmp_path, add_calls
+):
+    embeddings, queries = clustered_embeddings
+    embeddings = embeddings[:GRAPH_ROWS]
+    path = str(tmp_path / "embeddings.npy")
+    np.save(path, embeddings[:500])
+    HNSWIndex.load_or_create(path, np.load(path, mmap_mode="r"))
+
+    HNSWIndex.load_or_create(path, np.load(path, mmap_mode="r"))
+    np.save(path, embeddings)
+    index = HNSWIndex.load_or_create(path, np.load(path, mmap_mode="r"))
+
+    assert add_calls == [0, 500]
+    assert len(index) == GRAPH_ROWS
+    assert graph_recall(index, embeddings, queries) >= 0.95
+
+
+def test_load_or_create_rebuilds_changed_embeddings(
+    clustered_embeddings, tmp_path, add_calls
+):
+    embeddings, _ = clustered_embeddings
+    embeddings = np.array(embeddings[:500])
+    path = str(tmp_path / "embeddings.npy")
+    np.save(path, embeddings)
+    HNSWIndex.load_or_create(path, np.load(path, mmap_mode="r"))
+
+    # a row the fingerprint does not sample
+    embeddings[5] = embeddings[6]
+    np.save(path, embeddings)
+    HNSWIndex.load_or_create(path, np.load(path, mmap_mode="r"))
+    # other graph parameters
+    HNSWIndex.load_or_create(path, np.load(path, mmap_mode="r"), m=8)
+
+    assert add_calls == [0, 0, 0]
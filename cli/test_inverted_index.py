@@ -0,0 +1,171 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import lib.keyword_search as keyword_search
+import lib.search_utils as search_utils
+from lib.document_store import DocumentStore
+from lib.keyword_search import InvertedIndex
+
+WORDS = [
+    "dark",
+    "knight",
+    "space",
+    "pirate",
+    "ghost",
+    "robot",
+    "island",
+    "heist",
+    "dragon",
+    "winter",
+    "detective",
+    "ocean",
+]
+
+
+def make_movies(count: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    movies = []
+    for doc_id in range(1, count + 1):
+        title = " ".join(rng.choice(WORDS, size=2))
+        description = " ".join(rng.choice(WORDS, size=int(rng.integers(5, 30))))
+        movies.append({"id": doc_id, "title": title, "description": description})
+    return movies
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """Points the index at tmp_path, returning a function that writes the
+    movies file and a function that opens an index over it
+    """
+    data_path = tmp_path / "movies.json"
+    monkeypatch.setattr(search_utils, "DATA_PATH", str(data_path))
+    monkeypatch.setattr(keyword_search, "INVERTED_INDEX_DIR", str(tmp_path / "index"))
+
+    def write(movies: list[dict]) -> list[dict]:
+        with open(data_path, "w") as f:
+            json.dump({"movies": movies}, f)
+        return movies
+
+    def open_index(read_only: bool = False) -> InvertedIndex:
+        return InvertedIndex(DocumentStore(str(tmp_path / "documents")), read_only)
+
+    return write, open_index
+
+
+def loaded(open_index, read_only: bool = True) -> InvertedIndex:
+    index = open_index(read_only)
+    index.load()
+    return index
+
+
+def test_old_snapshot_phrase_search_survives_merge(corpus):
+    write, open_index = corpus
+    write(make_movies(300))
+    open_index().build(positions=True)
+    open_index().upsert(make_movies(20, seed=1))
+
+    snapshot = loaded(open_index)
+    segment_dirs = [segment.segment_dir for segment in snapshot.segments]
+    expected = loaded(open_index).phrase_search("dark knight", limit=1000)
+
+    open_index().merge()
+
+    assert not any(os.path.exists(path) for path in segment_dirs)
+    assert expected
+    assert snapshot.phrase_search("dark knight", limit=1000) == expected
+
+
+def test_update_keeps_bm25_scores_of_unchanged_movies(corpus):
+    write, open_index = corpus
+    movies = write(make_movies(500))
+    open_index().build()
+    before = loaded(open_index).bm25_search("dark knight", limit=500)
+
+    # new text that leaves the document frequencies of the query terms alone
+    changed = [
+        dict(movie, description=f"{movie['description']} robot")
+        for movie in movies[:10]
+    ]
+    open_index().upsert(changed)
+    index = loaded(open_index)
+    after = index.bm25_search("dark knight", limit=500)
+
+    assert len(index.segments) == 2
+    unchanged = {movie["id"] for movie in movies[10:]}
+    assert [r for r in after if r["id"] in unchanged] == [
+        r for r in before if r["id"] in unchanged
+    ]
+
+
+def test_pruned_bm25_search_matches_exhaustive_search(corpus):
+    write, open_index = corpus
+    movies = write(make_movies(1000))
+    open_index().build()
+    open_index().upsert(make_movies(30, seed=2))
+    open_index().delete([movie["id"] for movie in movies[500:520]])
+    index = loaded(open_index)
+
+    for query in ("dark knight", "ghost ocean heist", "winter winter dragon"):
+        # limits above BM25_PRUNING_MAX_LIMIT score every posting
+        exhaustive = index.bm25_search(query, limit=1000)
+        for limit in (1, 10, 100):
+            assert index.bm25_search(query, limit) == exhaustive[:limit]
+
+
+QUERIES = ["dark knight", "ghost ocean heist", "winter dragon robot"]
+
+
+def search_results(index: InvertedIndex) -> dict:
+    """Everything the tests compare, ranked results as id lists"""
+    return {
+        "doc_count": index.doc_count,
+        "documents": {term: index.get_documents(term) for term in WORDS},
+        "boolean": [
+            [r["id"] for r in index.boolean_search(query, limit=1000)]
+            for query in ("dark AND NOT knight", "(ghost OR robot) AND ocean")
+        ],
+        "phrase": [index.phrase_search(query, limit=1000) for query in QUERIES],
+        "proximity": [
+            index.phrase_search(query, within=3, limit=1000) for query in QUERIES
+        ],
+        "bm25_matches": [
+            sorted(r["id"] for r in index.bm25_search(query, limit=1000))
+            for query in QUERIES
+        ],
+    }
+
+
+def test_update_delete_and_merge_match_a_fresh_build(corpus, tmp_path, monkeypatch):
+    write, open_index = corpus
+    movies = write(make_movies(400))
+    open_index().build(positions=True)
+
+    # edit, drop and add movies, then apply the changes incrementally
+    edited = [dict(movie, title="the dark knight returns") for movie in movies[:25]]
+    current = write(edited + movies[25:350] + make_movies(450, seed=3)[400:])
+    updated, deleted = open_index().update(current)
+    open_index().delete([current[-1]["id"]])
+    current = write(current[:-1])
+    incremental = loaded(open_index)
+
+    monkeypatch.setattr(keyword_search, "INVERTED_INDEX_DIR", str(tmp_path / "fresh"))
+    fresh_index = InvertedIndex(DocumentStore(str(tmp_path / "fresh_documents")))
+    fresh_index.build(positions=True)
+    fresh = InvertedIndex(DocumentStore(str(tmp_path / "fresh_documents")), True)
+    fresh.load()
+
+    assert (updated, deleted) == (75, 50)
+    assert len(incremental.segments) == 2
+    assert search_results(incremental) == search_results(fresh)
+
+    monkeypatch.setattr(keyword_search, "INVERTED_INDEX_DIR", str(tmp_path / "index"))
+    open_index().merge()
+    merged = loaded(open_index)
+
+    assert len(merged.segments) == 1
+    assert search_results(merged) == search_results(fresh)
+    for query in QUERIES:
+        assert merged.bm25_search(query, limit=50) == fresh.bm25_search(query, 50)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from lib.ivf_index import IVFIndex
+
+
+def test_ivf_recall_against_exact_search(
+    clustered_embeddings, load_searcher, recall_at_k
+):
+    embeddings, queries = clustered_embeddings
+
+    searcher = load_searcher(embeddings, index="ivf")
+    assert searcher.nprobe < len(searcher.ivf.centroids)
+    assert recall_at_k(searcher, embeddings, queries) >= 0.95
+
+    searcher.nprobe = len(searcher.ivf.centroids)
+    assert recall_at_k(searcher, embeddings, queries) == 1.0
+
+
+def test_every_row_joins_one_list(clustered_embeddings, tmp_path):
+    embeddings, queries = clustered_embeddings
+    index = IVFIndex(str(tmp_path / "ivf"))
+
+    index.build(embeddings[:500], list_count=20)
+
+    np.testing.assert_array_equal(np.sort(index.list_rows), np.arange(500))
+    assert index.list_offsets[-1] == 500
+    rows = index.probe(queries[0], nprobe=3)
+    assert np.all(np.diff(rows) > 0)
+    assert 0 < len(rows) < 500
+
+
+def test_load_or_create_rebuilds_when_the_embeddings_change(
+    clustered_embeddings, tmp_path
+):
+    embeddings, _ = clustered_embeddings
+    path = str(tmp_path / "embeddings.npy")
+    np.save(path, embeddings[:400])
+    IVFIndex.load_or_create(path, embeddings[:400])
+
+    # an unchanged file keeps the saved index, whatever array is passed in
+    assert len(IVFIndex.load_or_create(path, embeddings[:600])) == 400
+
+    np.save(path, embeddings[:600])
+    assert len(IVFIndex.load_or_create(path, embeddings[:600])) == 600
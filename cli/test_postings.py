@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from lib.postings import (
+    CompressedPostings,
+    intersect_sorted,
+    range_indices,
+    subtract_sorted,
+)
+from lib.search_utils import POSTINGS_BLOCK_SIZE
+
+
+def random_postings(
+    doc_freqs: list[int], seed: int = 0
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    doc_numbers, tfs = [], []
+    for doc_freq in doc_freqs:
+        doc_numbers.append(np.sort(rng.choice(100_000, size=doc_freq, replace=False)))
+        tfs.append(rng.integers(1, 300, size=doc_freq))
+    term_offsets = np.zeros(len(doc_freqs) + 1, dtype=np.int64)
+    np.cumsum(doc_freqs, out=term_offsets[1:])
+    return term_offsets, np.concatenate(doc_numbers), np.concatenate(tfs)
+
+
+@pytest.mark.parametrize(
+    "doc_freq",
+    [POSTINGS_BLOCK_SIZE - 1, POSTINGS_BLOCK_SIZE, POSTINGS_BLOCK_SIZE + 1],
+)
+def test_round_trip_at_block_boundaries(doc_freq, tmp_path):
+    term_offsets, doc_numbers, tfs = random_postings([3, doc_freq, 1, doc_freq])
+    encoded = CompressedPostings.encode(term_offsets, doc_numbers, tfs)
+    encoded.save(str(tmp_path))
+
+    for postings in (encoded, CompressedPostings.load(str(tmp_path))):
+        for term_id in range(len(term_offsets) - 1):
+            start, end = term_offsets[term_id], term_offsets[term_id + 1]
+            positions, decoded_docs, decoded_tfs = postings.decode_term(term_id)
+            np.testing.assert_array_equal(positions, np.arange(start, end))
+            np.testing.assert_array_equal(decoded_docs, doc_numbers[start:end])
+            np.testing.assert_array_equal(decoded_tfs, tfs[start:end])
+
+
+def test_blocks_decode_in_the_order_asked():
+    term_offsets, doc_numbers, tfs = random_postings([300, 5, 200])
+    postings = CompressedPostings.encode(term_offsets, doc_numbers, tfs)
+    blocks = np.array([5, 0, 3])
+
+    positions, decoded_docs, decoded_tfs = postings.decode(blocks)
+
+    expected = np.concatenate(
+        [
+            np.arange(
+                postings.block_posting_offsets[block],
+                postings.block_posting_offsets[block + 1],
+            )
+            for block in blocks
+        ]
+    )
+    np.testing.assert_array_equal(positions, expected)
+    np.testing.assert_array_equal(decoded_docs, doc_numbers[expected])
+    np.testing.assert_array_equal(decoded_tfs, tfs[expected])
+
+
+def test_sorted_array_helpers():
+    a = np.array([1, 3, 5, 7, 9])
+    b = np.array([3, 4, 5, 10])
+    np.testing.assert_array_equal(intersect_sorted(a, b), [3, 5])
+    np.testing.assert_array_equal(subtract_sorted(a, b), [1, 7, 9])
+    np.testing.assert_array_equal(
+        range_indices(np.array([4, 0, 9]), np.array([2, 0, 3])), [4, 5, 9, 10, 11]
+    )
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+from lib.quantization import BinaryEmbeddings, ProductQuantizer, QuantizedEmbeddings
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_rescoring_recovers_exact_recall(
+    storage, clustered_embeddings, load_searcher, recall_at_k
+):
+    embeddings, queries = clustered_embeddings
+
+    approximate = load_searcher(embeddings, storage=storage, rescore=False)
+    rescored = load_searcher(embeddings, storage=storage, rescore=True)
+
+    assert recall_at_k(approximate, embeddings, queries) >= 0.95
+    assert recall_at_k(rescored, embeddings, queries) == 1.0
+
+
+def test_rescored_scores_are_exact(clustered_embeddings, load_searcher):
+    embeddings, queries = clustered_embeddings
+    searcher = load_searcher(embeddings, storage="int8")
+
+    rows, scores = searcher.top_documents(queries[0], 10)
+
+    np.testing.assert_allclose(scores, embeddings[rows] @ queries[0], rtol=1e-6)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_int8_codes_stay_within_half_a_step(clustered_embeddings):
+    embeddings, _ = clustered_embeddings
+
+    quantized = QuantizedEmbeddings.quantize(embeddings, "int8")
+
+    errors = np.abs(quantized.codes * quantized.scales - embeddings)
+    assert np.all(errors <= quantized.scales / 2 + 1e-7)
+    assert quantized.nbytes < embeddings.nbytes / 3
+
+
+def test_cached_quantization_is_reused_until_the_embeddings_change(
+    clustered_embeddings, tmp_path
+):
+    embeddings, _ = clustered_embeddings
+    path = str(tmp_path / "embeddings.npy")
+    np.save(path, embeddings[:100])
+    QuantizedEmbeddings.load_or_create(path, embeddings[:100], "int8")
+
+    # the file has not changed, so the array passed in is not looked at
+    cached = QuantizedEmbeddings.load_or_create(path, embeddings[:300], "int8")
+    assert len(cached) == 100
+
+    np.save(path, embeddings[:300])
+    assert (
+        len(QuantizedEmbeddings.load_or_create(path, embeddings[:300], "int8")) == 300
+    )
+
+
+def test_product_quantization_rescoring_recovers_exact_recall(
+    clustered_embeddings, load_searcher, recall_at_k
+):
+    embeddings, queries = clustered_embeddings
+    searcher = load_searcher(embeddings, storage="pq")
+
+    searcher.rescore = False
+    approximate = recall_at_k(searcher, embeddings, queries)
+    searcher.rescore = True
+    rescored = recall_at_k(searcher, embeddings, queries)
+
+    assert approximate >= 0.5
+    assert rescored >= 0.98
+
+
+def test_product_quantization_scores_are_reconstructed_dot_products(
+    clustered_embeddings,
+):
+    embeddings, queries = clustered_embeddings
+    quantizer = ProductQuantizer.quantize(embeddings[:500], subquantizers=8)
+
+    subspaces = np.arange(len(quantizer.codebooks))[:, None]
+    reconstructed = quantizer.codebooks[subspaces, quantizer.codes]
+    reconstructed = reconstructed.transpose(1, 0, 2).reshape(500, -1)
+
+    np.testing.assert_allclose(
+        quantizer.scores(queries[0]), reconstructed @ queries[0], atol=1e-5
+    )
+    rows = np.array([3, 1, 400])
+    np.testing.assert_allclose(
+        quantizer.scores(queries[0], rows), reconstructed[rows] @ queries[0], atol=1e-5
+    )
+
+
+def test_product_quantization_needs_whole_subspaces(clustered_embeddings):
+    embeddings, _ = clustered_embeddings
+    with pytest.raises(ValueError):
+        ProductQuantizer.quantize(embeddings[:, :100], subquantizers=48)
+
+
+def test_binary_rescoring_recovers_exact_recall(
+    clustered_embeddings, load_searcher, recall_at_k
+):
+    embeddings, queries = clustered_embeddings
+    searcher = load_searcher(embeddings, storage="binary")
+
+    searcher.rescore = False
+    approximate = recall_at_k(searcher, embeddings, queries)
+    searcher.rescore = True
+    rescored = recall_at_k(searcher, embeddings, queries)
+
+    assert approximate >= 0.4
+    assert rescored >= 0.98
+
+
+def test_binary_distances_count_differing_sign_bits(clustered_embeddings):
+    embeddings, queries = clustered_embeddings
+    # 100 dimensions leave the second word of every row partly padding
+    vectors = embeddings[:300, :100]
+
+    binary = BinaryEmbeddings.quantize(vectors)
+
+    signs = vectors - binary.center > 0
+    query_signs = queries[0, :100] - binary.center > 0
+    np.testing.assert_array_equal(
+        binary.distances(queries[0, :100]), (signs != query_signs).sum(axis=1)
+    )
+    rows = np.array([7, 0, 299])
+    np.testing.assert_array_equal(
+        binary.distances(queries[0, :100], rows),
+        (signs[rows] != query_signs).sum(axis=1),
+    )